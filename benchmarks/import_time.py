@@ -0,0 +1,82 @@
+"""
+Import time benchmark of the MOTAF packages
+
+usage : python benchmarks/import_time.py [--repeat n] [--target seconds] [--modules module [module ...]]
+
+Each import is measured in a fresh interpreter (best wall time of repeat runs), the
+heavy optional dependencies (pandas, dateutil, matplotlib) loaded by the import are
+reported. The core packages (library.model and library.kdd) must start up under the
+target time without loading any of them, the exit status is 1 otherwise.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the worker side of a stay point detection : model and all the kdd algorithms
+CORE_MODULES=["library.model",
+              "library.kdd.preprocessing.cleaning",
+              "library.kdd.preprocessing.compression",
+              "library.kdd.preprocessing.segmentation",
+              "library.kdd.mining.poi_detection",
+              "library.kdd.mining.co_location",
+              "library.kdd.mining.od_analysis",
+              "library.kdd.mining.similarity",
+              "library.kdd.pipeline"]
+
+HEAVY_MODULES=["pandas","dateutil","matplotlib"]
+
+# numpy alone takes most of it
+TARGET_SECONDS=0.15
+
+_PROBE="""
+import json,sys,time
+starting_time=time.time()
+for module in sys.argv[1:] : __import__(module)
+seconds=time.time()-starting_time
+print json.dumps({"seconds":seconds,"modules":len(sys.modules),"heavy":sorted(set(name.split('.')[0] for name in sys.modules if name.split('.')[0] in %r))})
+""" % (HEAVY_MODULES,)
+
+def measure_import(modules,repeat=5) :
+    """
+    Import modules in fresh interpreters.
+
+    Returns
+    -------
+    measure : dict
+        seconds (best of repeat imports), modules (the number of loaded modules) and
+        heavy (the heavy dependencies loaded)
+    """
+
+    measures=[]
+    for run_index in range(repeat) :
+        output=subprocess.check_output([sys.executable,"-c",_PROBE]+list(modules),cwd=ROOT)
+        measures.append(json.loads(output))
+    return min(measures,key=lambda measure : measure["seconds"])
+
+def _baseline(repeat) :
+    # interpreter start up and numpy, which every package needs
+    return measure_import(["numpy"],repeat)["seconds"]
+
+
+if __name__=='__main__' :
+    parser=argparse.ArgumentParser(description="Benchmark the import time of the MOTAF packages")
+    parser.add_argument("--repeat",type=int,default=5)
+    parser.add_argument("--target",type=float,default=TARGET_SECONDS,help="the import time target of the core packages")
+    parser.add_argument("--modules",nargs='+',help="other modules to measure")
+    arguments=parser.parse_args()
+
+    print "{0:48s} {1:.4f} s".format("numpy (baseline)",_baseline(arguments.repeat))
+    core=measure_import(CORE_MODULES,arguments.repeat)
+    print "{0:48s} {1:.4f} s, {2} modules, heavy dependencies : {3}".format("library.model + library.kdd",core["seconds"],core["modules"],", ".join(core["heavy"]) or "none")
+    for module in arguments.modules or [] :
+        measure=measure_import([module],arguments.repeat)
+        print "{0:48s} {1:.4f} s, {2} modules, heavy dependencies : {3}".format(module,measure["seconds"],measure["modules"],", ".join(measure["heavy"]) or "none")
+
+    if (core["heavy"] or core["seconds"]>arguments.target) :
+        print "FAILED : the core packages must import in less than {0} s without {1}".format(arguments.target,", ".join(HEAVY_MODULES))
+        sys.exit(1)
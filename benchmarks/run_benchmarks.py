@@ -0,0 +1,255 @@
+"""
+Benchmark suite of the MOTAF algorithms on synthetic workloads
+
+usage : python benchmarks/run_benchmarks.py [--quick] [--output results.json] [--compare previous.json]
+                                            [--only name [name ...]] [--sizes n [n ...]] [--max-events n] [--repeat n]
+                                            [--timeout seconds]
+
+Each benchmark is run at increasing numbers of events (10^3 to 10^7, or 10^3 and 10^4
+in quick mode) on realistic synthetic traces (see Synthetic_generator), each measure is done in a fresh process which reports the best wall
+time of the runs and its peak resident memory (a process killed, e.g. by the OOM killer, or exceeding
+--timeout seconds is reported as an error). The filters are measured on both representations of a
+trace : columnar (Columnar_trace) and object (Trace, names suffixed by /trace). The results (throughput, peak memory
+and scaling exponent of each benchmark) are saved as JSON, --compare prints the
+throughput ratios with a previous result file.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Process,Queue
+from Queue import Empty
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from library.kdd.preprocessing.cleaning import Mean_filter,Median_filter
+from library.kdd.preprocessing.compression import RDP_compression
+from library.kdd.preprocessing.segmentation import Segmentation_by_time
+from library.kdd.mining.poi_detection import Stay_points
+from library.data_management.csv_trace_reader import read_trace_from_CSV
+from library.data_management.synthetic_generator import stay_points_scores,segmentation_scores
+from workloads import synthetic_workload,write_synthetic_CSV
+
+FULL_SIZES=[10**3,10**4,10**5,10**6,10**7]
+QUICK_SIZES=[10**3,10**4]
+
+
+def _estimator_benchmark(estimator,representation,scores=None) :
+    """
+    Return the (setup, run, score, teardown) functions of the benchmark of estimator.fit
+    on a synthetic trace, scores(result, ground_truth) returns the (precision, recall)
+    of the result.
+    """
+
+    def setup(events) :
+        return synthetic_workload(events,representation)
+    def run(workload) :
+        return estimator.fit(workload[0])
+    def score(result,workload) :
+        precision,recall=scores(result,workload[1])
+        return {"precision":precision,"recall":recall}
+    return setup,run,score if scores is not None else None,None
+
+def _csv_benchmark() :
+    directory=tempfile.mkdtemp()
+    def setup(events) :
+        path=os.path.join(directory,"trace_{0}.csv".format(events))
+        write_synthetic_CSV(path,events)
+        return path
+    def run(path) :
+        return read_trace_from_CSV(path)
+    def teardown() :
+        shutil.rmtree(directory,ignore_errors=True)
+    return setup,run,None,teardown
+
+# name -> (benchmark factory, largest number of events of the full run)
+# the object based algorithms (Trace input) are limited to the sizes they run in minutes
+BENCHMARKS=[
+    ("mean_filter/number",lambda : _estimator_benchmark(Mean_filter(10,'centered','number'),'columnar'),10**7),
+    ("mean_filter/time",lambda : _estimator_benchmark(Mean_filter(60,'centered','time'),'columnar'),10**7),
+    ("median_filter/complete/number",lambda : _estimator_benchmark(Median_filter(10,'centered','number','complete'),'columnar'),10**7),
+    ("median_filter/complete/time",lambda : _estimator_benchmark(Median_filter(60,'centered','time','complete'),'columnar'),10**7),
+    ("median_filter/weiszfeld/number",lambda : _estimator_benchmark(Median_filter(10,'centered','number','weiszfeld'),'columnar'),10**7),
+    ("median_filter/weiszfeld/time",lambda : _estimator_benchmark(Median_filter(60,'centered','time','weiszfeld'),'columnar'),10**7),
+    ("mean_filter/number/trace",lambda : _estimator_benchmark(Mean_filter(10,'centered','number'),'trace'),10**5),
+    ("mean_filter/time/trace",lambda : _estimator_benchmark(Mean_filter(60,'centered','time'),'trace'),10**5),
+    ("median_filter/complete/number/trace",lambda : _estimator_benchmark(Median_filter(10,'centered','number','complete'),'trace'),10**5),
+    ("median_filter/complete/time/trace",lambda : _estimator_benchmark(Median_filter(60,'centered','time','complete'),'trace'),10**5),
+    ("median_filter/weiszfeld/number/trace",lambda : _estimator_benchmark(Median_filter(10,'centered','number','weiszfeld'),'trace'),10**5),
+    ("median_filter/weiszfeld/time/trace",lambda : _estimator_benchmark(Median_filter(60,'centered','time','weiszfeld'),'trace'),10**5),
+    ("rdp_compression",lambda : _estimator_benchmark(RDP_compression(0.0001),'trace'),10**5),
+    ("segmentation_by_time",lambda : _estimator_benchmark(Segmentation_by_time(300),'columnar',segmentation_scores),10**7),
+    ("stay_points",lambda : _estimator_benchmark(Stay_points(0.0003,1200),'trace',stay_points_scores),10**5),
+    ("read_trace_from_CSV",_csv_benchmark,10**6),
+]
+
+
+def _peak_memory_mb() :
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/(1024.*1024.) if sys.platform=='darwin' else peak/1024.
+
+def _measure(factory,events,repeat,results) :
+    setup,run,score,teardown=factory()
+    try :
+        data=setup(events)
+        input_memory=_peak_memory_mb()
+        best=float('inf')
+        for run_index in range(repeat) :
+            starting_time=time.time()
+            result=run(data)
+            best=min(best,time.time()-starting_time)
+        point={"events":events,"seconds":best,"events_per_second":events/max(best,1e-9),
+               "input_peak_memory_mb":input_memory,"peak_memory_mb":_peak_memory_mb()}
+        if (score is not None) : point["accuracy"]=score(result,data)
+        results.put(point)
+    except Exception as error :
+        results.put({"events":events,"error":repr(error)})
+    finally :
+        if (teardown is not None) : teardown()
+
+def measure(factory,events,repeat=1,timeout=3600) :
+    """
+    Run a benchmark at a number of events in a fresh process.
+
+    Parameters
+    ----------
+    timeout : float, optional
+        the time in seconds after which the process is terminated, default value is 3600
+
+    Returns
+    -------
+    point : dict
+        events, seconds (best of repeat runs), events_per_second, input_peak_memory_mb (peak
+        memory after the creation of the input), peak_memory_mb and accuracy (precision and
+        recall against the ground truth of the workload, for the benchmarks having one), or error
+        (exception of the benchmark, process killed or timeout)
+    """
+
+    results=Queue()
+    process=Process(target=_measure,args=(factory,events,repeat,results))
+    process.start()
+    deadline=time.time()+timeout
+    point=None
+    while (point is None) :
+        try :
+            point=results.get(timeout=1.)
+        except Empty :
+            if (not process.is_alive()) :
+                # the point may have been sent just before the exit
+                try :
+                    point=results.get(timeout=1.)
+                except Empty :
+                    point={"events":events,"error":"the benchmark process exited with code {0}".format(process.exitcode)}
+            elif (time.time()>deadline) :
+                process.terminate()
+                point={"events":events,"error":"timeout after {0} s".format(timeout)}
+    process.join(60.)
+    if (process.is_alive()) :
+        process.terminate()
+        process.join()
+    if (process.exitcode!=0 and "error" not in point) :
+        point={"events":events,"error":"the benchmark process exited with code {0}".format(process.exitcode)}
+    return point
+
+def scaling_exponent(points) :
+    """
+    Return the slope of log(seconds) against log(events) : 1 for a linear algorithm,
+    2 for a quadratic one (None with less than 2 measures).
+    """
+
+    points=[point for point in points if "seconds" in point and point["seconds"]>0]
+    if (len(points)<2) : return None
+    return float(np.polyfit(np.log([point["events"] for point in points]),np.log([point["seconds"] for point in points]),1)[0])
+
+def run_benchmarks(sizes,names=None,max_events=None,repeat=1,timeout=3600,log=sys.stderr) :
+    """
+    Run the benchmarks.
+
+    Parameters
+    ----------
+    sizes : list<int>
+        the numbers of events
+
+    names : list<string>, optional
+        the benchmarks to run (a name selects all the benchmarks it prefixes), all by default
+
+    max_events : int, optional
+        skip the sizes above max_events (in addition to the limit of each benchmark)
+
+    repeat : int, optional
+        the number of runs of each measure, default value is 1
+
+    timeout : float, optional
+        the time in seconds allowed to each measure (see measure), default value is 3600
+
+    Returns
+    -------
+    results : dict
+        metadata and, for each benchmark, its measures (points) and its scaling exponent
+    """
+
+    results={"metadata":{"date":datetime.datetime.utcnow().isoformat(),"python":platform.python_version(),
+                         "numpy":np.__version__,"platform":platform.platform(),"sizes":sizes,"repeat":repeat,"timeout":timeout},
+             "benchmarks":{}}
+    for name,factory,limit in BENCHMARKS :
+        if (names and not any(name.startswith(selected) for selected in names)) : continue
+        points=[]
+        for events in sizes :
+            if (events>limit or (max_events is not None and events>max_events)) : continue
+            point=measure(factory,events,repeat,timeout)
+            points.append(point)
+            log.write("{0:40s} {1:>9d} events : {2}\n".format(name,events,
+                      "{0:.4f} s, {1:.0f} events/s, {2:.1f} MB{3}".format(point["seconds"],point["events_per_second"],point["peak_memory_mb"],
+                      ", precision {precision:.2f}, recall {recall:.2f}".format(**point["accuracy"]) if "accuracy" in point else "") if "seconds" in point else point["error"]))
+        results["benchmarks"][name]={"points":points,"scaling_exponent":scaling_exponent(points)}
+    return results
+
+def compare(previous,current) :
+    """
+    Return the lines comparing the throughputs of two result files (current/previous ratios).
+    """
+
+    lines=[]
+    for name,benchmark in sorted(current["benchmarks"].items()) :
+        if (name not in previous["benchmarks"]) : continue
+        previous_points=dict((point["events"],point) for point in previous["benchmarks"][name]["points"] if "events_per_second" in point)
+        for point in benchmark["points"] :
+            if ("events_per_second" not in point or point["events"] not in previous_points) : continue
+            ratio=point["events_per_second"]/previous_points[point["events"]]["events_per_second"]
+            lines.append("{0:40s} {1:>9d} events : x{2:.2f}{3}".format(name,point["events"],ratio," (regression)" if ratio<0.8 else ""))
+    return lines
+
+
+if __name__=='__main__' :
+    parser=argparse.ArgumentParser(description="Benchmark the MOTAF algorithms on synthetic workloads")
+    parser.add_argument("--quick",action='store_true',help="only 10^3 and 10^4 events (pre-merge check)")
+    parser.add_argument("--sizes",type=int,nargs='+',help="the numbers of events")
+    parser.add_argument("--max-events",type=int)
+    parser.add_argument("--only",nargs='+',help="the benchmarks to run (prefixes of their names)")
+    parser.add_argument("--repeat",type=int,default=1)
+    parser.add_argument("--timeout",type=float,default=3600,help="the time in seconds allowed to each measure")
+    parser.add_argument("--output",default="benchmark_results.json")
+    parser.add_argument("--compare",help="a previous result file")
+    arguments=parser.parse_args()
+
+    sizes=arguments.sizes or (QUICK_SIZES if arguments.quick else FULL_SIZES)
+    results=run_benchmarks(sizes,names=arguments.only,max_events=arguments.max_events,repeat=arguments.repeat,timeout=arguments.timeout)
+    results["metadata"]["quick"]=arguments.quick
+    with open(arguments.output,'w') as output_file :
+        json.dump(results,output_file,indent=2,sort_keys=True)
+    for name,benchmark in sorted(results["benchmarks"].items()) :
+        print "{0:40s} scaling exponent : {1}".format(name,benchmark["scaling_exponent"])
+    if (arguments.compare) :
+        with open(arguments.compare) as previous_file :
+            for line in compare(json.load(previous_file),results) :
+                print line
@@ -0,0 +1,47 @@
+"""
+Synthetic workloads of the benchmarks (see Synthetic_generator)
+"""
+
+from library.model import timestamp_to_datetime
+from library.data_management.synthetic_generator import Synthetic_generator
+
+
+def synthetic_workload(events,representation='columnar',seed=0) :
+    """
+    Return a synthetic trace of a device (stays, moves, noise, outliers and dropouts)
+    and its ground truth.
+
+    Parameters
+    ----------
+    events : int
+        the number of events
+
+    representation : {'columnar','trace'}, optional
+        return the trace as a Columnar_trace or as a Trace, default value is 'columnar'
+
+    seed : int, optional
+        the seed of the generation
+
+    Returns
+    -------
+    trace : Columnar_trace or Trace
+        the trace
+
+    ground_truth : Synthetic_ground_truth
+        its ground truth
+    """
+
+    trace,ground_truth=Synthetic_generator(events=events,seed=seed).generate_device(0)
+    return (trace if representation=='columnar' else trace.to_trace()),ground_truth
+
+def write_synthetic_CSV(path,events,seed=0) :
+    """
+    Write a synthetic trace in the CSV format read by read_trace_from_CSV.
+    """
+
+    trace,ground_truth=synthetic_workload(events,seed=seed)
+    timestamps,latitudes,longitudes=trace.to_arrays()
+    with open(path,'w') as csv_file :
+        csv_file.write("recorded_at;latitude;longitude\n")
+        for timestamp,latitude,longitude in zip(timestamps.tolist(),latitudes.tolist(),longitudes.tolist()) :
+            csv_file.write("{0};{1:.7f};{2:.7f}\n".format(timestamp_to_datetime(timestamp).isoformat(" "),latitude,longitude))
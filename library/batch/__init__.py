@@ -0,0 +1,2 @@
+from batch_driver import Batch_driver,read_manifest,load_result
+from chunked_executor import Chunked_executor
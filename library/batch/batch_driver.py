@@ -0,0 +1,242 @@
+"""
+Multi-core batch driver
+"""
+
+import hashlib,json,os,pickle,shutil,tempfile,time,traceback,urllib
+from multiprocessing import Pool,cpu_count
+
+import numpy as np
+
+from ..model import Columnar_trace,Trace_collection
+from ..kdd.pipeline import Pipeline
+from ..data_management.csv_trace_reader import read_trace_from_CSV
+
+_MANIFEST_FILE="manifest.jsonl"
+_COLUMNS=("timestamps","latitudes","longitudes")
+
+
+def _write_shared_columns(collection,directory) :
+    """
+    Write the concatenated columns of a Trace_collection in memory-mapped .npy files.
+
+    Returns
+    -------
+    tasks : list<(id,int,int)>
+        for each device, its identifier and the bounds [start,end) of its events in the columns
+    """
+
+    device_ids,offsets,timestamps,latitudes,longitudes=collection.to_arrays()
+    for name,column in zip(_COLUMNS,(timestamps,latitudes,longitudes)) :
+        shared_column=np.lib.format.open_memmap(os.path.join(directory,name+".npy"),mode='w+',dtype=np.float64,shape=column.shape)
+        shared_column[:]=column
+        shared_column.flush()
+        del shared_column
+    return [(device_id,int(offsets[k]),int(offsets[k+1])) for k,device_id in enumerate(device_ids)]
+
+def _file_name(identifier) :
+    """
+    Return the file name (without extension) of an identifier : the URL-quoted identifier
+    (no '/', ':' or other special character and no leading '.', thus, the file stays in
+    its directory and is not hidden), a long identifier is truncated and suffixed with
+    its hash (distinct identifiers keep distinct file names).
+    """
+
+    text=identifier.encode('utf-8') if isinstance(identifier,unicode) else str(identifier)
+    name=urllib.quote(text,safe='')
+    if (name.startswith(".")) : name="%2E"+name[1:]
+    if (len(name)>128) : name=name[:96]+"-"+hashlib.sha1(text).hexdigest()
+    return name
+
+# state of the current worker process, set once by _initialize_worker
+_worker_pipeline=None
+_worker_columns=None
+_worker_output_directory=None
+
+def _initialize_worker(pipeline,columns_directory,output_directory) :
+    global _worker_pipeline,_worker_columns,_worker_output_directory
+    _worker_pipeline=pipeline
+    _worker_output_directory=output_directory
+    if (columns_directory is not None) :
+        _worker_columns=[np.load(os.path.join(columns_directory,name+".npy"),mmap_mode='r') for name in _COLUMNS]
+
+def _process_task(task) :
+    """
+    Load the trace of a device (memory-mapped columns or CSV file), run the pipeline
+    and write its result, return the manifest entry of the device.
+    """
+
+    device_id,source=task
+    starting_time=time.time()
+    entry={"device_id":device_id,"status":"ok","events":None,"elapsed":None,"result":None,"error":None}
+    try :
+        if (isinstance(source,tuple)) :
+            start,end=source
+            timestamps,latitudes,longitudes=(column[start:end] for column in _worker_columns)
+            trace=Columnar_trace(timestamps,latitudes,longitudes,copy=False)
+        else :
+            trace=read_trace_from_CSV(source)
+        entry["events"]=len(trace)
+        result=_worker_pipeline.fit(trace)
+        result_path=os.path.join(_worker_output_directory,"results","{0}.pkl".format(_file_name(device_id)))
+        with open(result_path,"wb") as result_file :
+            pickle.dump(result,result_file,pickle.HIGHEST_PROTOCOL)
+        entry["result"]=result_path
+    except Exception :
+        entry["status"]="error"
+        entry["error"]=traceback.format_exc()
+    entry["elapsed"]=time.time()-starting_time
+    return entry
+
+def read_manifest(output_directory) :
+    """
+    Read the manifest of a batch run, when a device appears several times
+    (e.g. failed then resumed) its last entry is kept.
+
+    Parameters
+    ----------
+    output_directory : string
+        the output directory of the batch run
+
+    Returns
+    -------
+    manifest : OrderedDict<id,dict>
+        the manifest entry of each processed device
+    """
+
+    from collections import OrderedDict
+    manifest=OrderedDict()
+    path=os.path.join(output_directory,_MANIFEST_FILE)
+    if (os.path.exists(path)) :
+        with open(path) as manifest_file :
+            for line in manifest_file :
+                if (line.strip()) :
+                    entry=json.loads(line)
+                    manifest[entry["device_id"]]=entry
+    return manifest
+
+def load_result(entry) :
+    """
+    Load the result of a device from its manifest entry.
+    """
+
+    with open(entry["result"],"rb") as result_file :
+        return pickle.load(result_file)
+
+
+class Batch_driver :
+    """
+    Run a pipeline of MOTAF stages on many devices over a pool of worker processes.
+
+    The traces of a Trace_collection are written once in memory-mapped column files
+    which are opened by every worker, a task only carries the bounds of the events of
+    its device, thus, the trace arrays are never pickled. The traces of a directory are
+    read by the workers themselves (one CSV file per device, see read_trace_from_CSV).
+
+    The tasks are sent longest first (by number of events, or by file size for a
+    directory) and one by one, so the load is balanced between the workers. Each result
+    is written to output_directory/results/<device id>.pkl (the device identifier is
+    URL-quoted, see _file_name) and its manifest entry, recording the path of the result,
+    is appended to output_directory/manifest.jsonl as soon as the device is processed,
+    a run interrupted (or having failed devices) is resumed by running it again.
+
+    Parameters
+    ----------
+    pipeline : Pipeline or list<estimator>
+        the stages to run on each trace (see Pipeline)
+
+    output_directory : string
+        the directory of the results and of the manifest (created if it does not exist)
+
+    processes : int, optional
+        the number of worker processes, default value is the number of CPUs
+
+    resume : bool, optional
+        if True (default), the devices already processed successfully are skipped
+
+    Attributes
+    ----------
+    manifest_ : list<dict>
+        the manifest entry of each device of the last run : device_id, status ('ok',
+        'error' or 'skipped'), events (number of events), elapsed (seconds), result
+        (path of the pickled result) and error (traceback)
+    """
+
+    def __init__(self,pipeline,output_directory,processes=None,resume=True) :
+        self.pipeline=pipeline if isinstance(pipeline,Pipeline) else Pipeline(pipeline)
+        self.output_directory=output_directory
+        self.processes=processes
+        self.resume=resume
+
+    def _directory_tasks(self,directory) :
+        tasks=[]
+        for file_name in sorted(os.listdir(directory)) :
+            path=os.path.join(directory,file_name)
+            if (os.path.isfile(path) and file_name.lower().endswith(".csv")) :
+                tasks.append((os.path.getsize(path),(os.path.splitext(file_name)[0],path)))
+        return tasks
+
+    def run(self,source) :
+        """
+        Process all the devices of the source.
+
+        Parameters
+        ----------
+        source : string or Trace_collection
+            a directory of CSV files (the device identifier is the file name without
+            extension) or a Trace_collection (or a dict device_id -> trace)
+
+        Returns
+        -------
+        manifest_ : list<dict>
+            the manifest entry of each device (see Attributes)
+        """
+
+        results_directory=os.path.join(self.output_directory,"results")
+        if (not os.path.isdir(results_directory)) : os.makedirs(results_directory)
+        done=read_manifest(self.output_directory) if self.resume else {}
+        done=dict((device_id,entry) for device_id,entry in done.items() if entry["status"]=="ok")
+
+        columns_directory=None
+        try :
+            if (isinstance(source,(Trace_collection,dict))) :
+                collection=source if isinstance(source,Trace_collection) else Trace_collection(source)
+                skipped_ids=[device_id for device_id in collection if device_id in done]
+                pending=Trace_collection([(device_id,collection[device_id]) for device_id in collection if device_id not in done])
+                columns_directory=tempfile.mkdtemp(prefix="motaf_columns_")
+                weighted_tasks=[(end-start,(device_id,(start,end))) for device_id,start,end in _write_shared_columns(pending,columns_directory)]
+            else :
+                weighted_tasks=self._directory_tasks(source)
+                skipped_ids=[task[0] for weight,task in weighted_tasks if task[0] in done]
+                weighted_tasks=[(weight,task) for weight,task in weighted_tasks if task[0] not in done]
+
+            manifest=[]
+            for device_id in skipped_ids :
+                entry=dict(done[device_id])
+                entry["status"]="skipped"
+                manifest.append(entry)
+            tasks=[task for weight,task in sorted(weighted_tasks,key=lambda weighted_task : -weighted_task[0])]
+            manifest.extend(self._run_tasks(tasks,columns_directory))
+        finally :
+            if (columns_directory is not None) : shutil.rmtree(columns_directory,ignore_errors=True)
+
+        self.manifest_=manifest
+        return self.manifest_
+
+    def _run_tasks(self,tasks,columns_directory) :
+        """
+        Process the tasks over the pool and checkpoint each finished device in the manifest.
+        """
+
+        entries=[]
+        if (not tasks) : return entries
+        pool=Pool(self.processes or cpu_count(),initializer=_initialize_worker,initargs=(self.pipeline,columns_directory,self.output_directory))
+        try :
+            with open(os.path.join(self.output_directory,_MANIFEST_FILE),"a") as manifest_file :
+                for entry in pool.imap_unordered(_process_task,tasks,chunksize=1) :
+                    manifest_file.write(json.dumps(entry)+"\n")
+                    manifest_file.flush()
+                    entries.append(entry)
+        finally :
+            pool.close()
+            pool.join()
+        return entries
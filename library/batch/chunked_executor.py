@@ -0,0 +1,229 @@
+"""
+Out-of-core chunked processing with halo overlap
+"""
+
+import numpy as np
+
+from ..model import Columnar_trace
+from ..kdd.preprocessing.cleaning import Mean_filter,Median_filter
+from ..kdd.preprocessing.cleaning.mean_filter import _kernel_shape
+from ..kdd.preprocessing.segmentation import Segmentation_by_time
+from ..data_management.csv_trace_reader import read_trace_blocks_from_CSV
+
+
+def _concatenate(*traces) :
+    """
+    Return the concatenation of columnar traces as a new Columnar_trace.
+    """
+
+    traces=[trace for trace in traces if len(trace)>0]
+    if (len(traces)==1) : return traces[0]
+    if (not traces) : return Columnar_trace()
+    columns=[trace.to_arrays() for trace in traces]
+    return Columnar_trace(*(np.concatenate(column) for column in zip(*columns)),copy=False)
+
+def _blocks(source,chunk_size) :
+    """
+    Return an iterator over the blocks of a source : a CSV file (see read_trace_blocks_from_CSV),
+    a trace (cut in blocks of chunk_size events) or an iterable of traces (the blocks themselves).
+    """
+
+    if (isinstance(source,str)) : return read_trace_blocks_from_CSV(source,block_size=chunk_size)
+    if (hasattr(source,'to_arrays')) :
+        trace=Columnar_trace.from_trace(source)
+        return (trace.segment(start,start+chunk_size) for start in range(0,len(trace),chunk_size))
+    return (Columnar_trace.from_trace(block) for block in source)
+
+
+class _Halo_buffer :
+    """
+    Incremental windowed filtering (Mean_filter or Median_filter) of a trace received
+    by blocks. The buffer keeps the left halo (the already filtered events needed by the
+    next windows) and the pending events, a pending event is filtered once all the events
+    of its window are received.
+
+    Parameters
+    ----------
+    estimator : Mean_filter or Median_filter
+        the filter
+
+    chunk_size : int, optional
+        the number of events filtered at once, None to filter all the ready events
+        as soon as possible. Default value is None
+    """
+
+    def __init__(self,estimator,chunk_size=None) :
+        self.estimator=estimator
+        self.chunk_size=chunk_size
+        self.left,self.right=_kernel_shape(estimator.window_size,estimator.window_type)
+        self.by_time=estimator.neighbooring_type=='time'
+        self.context=Columnar_trace()
+        self.pending=Columnar_trace()
+
+    def _ready_count(self) :
+        # number of pending events having a complete window (an event with the
+        # same timestamp as the last one may still arrive)
+        if (self.by_time) : return int(np.searchsorted(self.pending.timestamps,self.pending.timestamps[-1]-self.right,side='left')) if len(self.pending) else 0
+        return max(len(self.pending)-int(self.right)-1,0)
+
+    def _right_halo_end(self,count) :
+        # index (in pending) following the last event needed by the windows of the count first events
+        if (self.by_time) : return int(np.searchsorted(self.pending.timestamps,self.pending.timestamps[count-1]+self.right,side='right'))
+        return count+int(self.right)
+
+    def _filter(self,count,end) :
+        window=_concatenate(self.context,self.pending.segment(0,end))
+        filtered=self.estimator.fit(window).segment(len(self.context),len(self.context)+count)
+
+        done=_concatenate(self.context,self.pending.segment(0,count))
+        self.pending=self.pending.segment(count,len(self.pending))
+        if (self.by_time) :
+            # the next event to filter is not before the last filtered one
+            next_timestamp=self.pending.timestamps[0] if len(self.pending) else done.timestamps[-1]
+            context_start=int(np.searchsorted(done.timestamps,next_timestamp+self.left,side='left'))
+        else :
+            context_start=max(len(done)+int(self.left),0)
+        self.context=done.segment(context_start,len(done))
+        return filtered
+
+    def push(self,block) :
+        """
+        Add the next block of the trace.
+
+        Returns
+        -------
+        chunks : list<Columnar_trace>
+            the consecutive chunks of the filtered trace that became ready
+        """
+
+        self.pending=_concatenate(self.pending,block)
+        chunks=[]
+        while (True) :
+            ready=self._ready_count()
+            count=ready if self.chunk_size is None else self.chunk_size
+            if (ready==0 or ready<count) : break
+            chunks.append(self._filter(count,self._right_halo_end(count)))
+        return chunks
+
+    def flush(self) :
+        """
+        Filter the remaining events (the trace is over).
+
+        Returns
+        -------
+        chunks : list<Columnar_trace>
+            the last chunks of the filtered trace
+        """
+
+        if (len(self.pending)==0) : return []
+        return [self._filter(len(self.pending),len(self.pending))]
+
+
+class Chunked_executor :
+    """
+    Run a windowed stage (Mean_filter, Median_filter or Segmentation_by_time) on a
+    trace streamed by blocks, the trace is never entirely in memory.
+
+    The filters process chunks of chunk_size events, each chunk is extended by a halo :
+    the neighboor events (before and after the chunk) used by the windows of the chunk
+    events, thus, the filtered events are the ones obtained by filtering the whole trace.
+    The segmentation only keeps the last timestamp between two blocks.
+
+    Parameters
+    ----------
+    estimator : Mean_filter, Median_filter or Segmentation_by_time
+        the stage to run
+
+    chunk_size : int, optional
+        the number of events of a chunk, default value is 100000
+
+    Notes
+    -----
+    The peak memory is proportional to chunk_size plus the size of the halo (the window
+    size), whatever the length of the trace.
+    The median filter and the segmentation give exactly the results of the whole trace,
+    the mean filter gives them up to the rounding of its cumulated sums (about 1e-11 degree).
+    """
+
+    def __init__(self,estimator,chunk_size=100000) :
+        if (not isinstance(estimator,(Mean_filter,Median_filter,Segmentation_by_time))) :
+            raise Exception("stage dosen't support chunked processing")
+        self.estimator=estimator
+        self.chunk_size=chunk_size
+
+    def run(self,source) :
+        """
+        Stream the results of the stage.
+
+        Parameters
+        ----------
+        source : string, Trace or iterable<Columnar_trace>
+            a CSV file path (read by blocks of chunk_size events), a trace, or the
+            consecutive blocks of a trace
+
+        Returns
+        -------
+        results : generator
+            for the filters, the consecutive chunks (Columnar_trace) of the filtered trace;
+            for the segmentation, tuples (segment index, Columnar_trace) where the pieces of
+            a same segment are consecutive
+        """
+
+        blocks=_blocks(source,self.chunk_size)
+        if (isinstance(self.estimator,Segmentation_by_time)) : return self._run_segmentation(blocks)
+        return self._run_filter(blocks)
+
+    def fit(self,source) :
+        """
+        Run the stage and gather its results (in memory).
+
+        Parameters
+        ----------
+        source : string, Trace or iterable<Columnar_trace>
+            see run
+
+        Returns
+        -------
+        result : Columnar_trace or list<Columnar_trace>
+            the filtered trace, or the segments of the trace
+        """
+
+        if (isinstance(self.estimator,Segmentation_by_time)) :
+            segments=[]
+            for segment_index,piece in self.run(source) :
+                if (segment_index==len(segments)) : segments.append([])
+                segments[segment_index].append(piece)
+            return [_concatenate(*pieces) for pieces in segments]
+        return _concatenate(*list(self.run(source)))
+
+    def _run_filter(self,blocks) :
+        """
+        Filter the chunks with their halo.
+        """
+
+        buffer=_Halo_buffer(self.estimator,chunk_size=self.chunk_size)
+        for block in blocks :
+            for chunk in buffer.push(block) :
+                yield chunk
+        for chunk in buffer.flush() :
+            yield chunk
+
+    def _run_segmentation(self,blocks) :
+        """
+        Cut the blocks at the segment boundaries.
+        """
+
+        maximum_time_difference=self.estimator.maximum_time_difference
+        segment_index=-1
+        last_timestamp=None
+        for block in blocks :
+            if (len(block)==0) : continue
+            timestamps=block.timestamps
+            starts=[0]+list(np.flatnonzero(np.diff(timestamps)>maximum_time_difference)+1)
+            ends=starts[1:]+[len(block)]
+            # the first piece continues the open segment of the previous block if the gap is small
+            continues=last_timestamp is not None and timestamps[0]-last_timestamp<=maximum_time_difference
+            for piece_index,(start,end) in enumerate(zip(starts,ends)) :
+                if (piece_index>0 or not continues) : segment_index+=1
+                yield segment_index,block.segment(start,end)
+            last_timestamp=timestamps[-1]
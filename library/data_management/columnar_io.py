@@ -0,0 +1,135 @@
+"""
+Binary columnar storage of traces and of stage results (numpy .npz files)
+"""
+
+import calendar
+import datetime
+
+import numpy as np
+
+from ..model import Event,Trace,Columnar_trace,Stay_point
+
+_EPOCH=datetime.datetime(1970,1,1)
+
+
+def _to_microseconds(datetimes) :
+    """
+    Return the exact number of microseconds since the epoch of each datetime
+    (naive datetimes are considered as UTC).
+    """
+
+    return np.fromiter((calendar.timegm(date_time.utctimetuple())*1000000+date_time.microsecond for date_time in datetimes),dtype=np.int64,count=len(datetimes))
+
+def _from_microseconds(microseconds) :
+    return [_EPOCH+datetime.timedelta(microseconds=int(value)) for value in microseconds]
+
+def _trace_columns(trace,prefix="") :
+    """
+    Return the columns of a trace, the datetimes of a Trace are stored exactly (in microseconds).
+    """
+
+    if (isinstance(trace,Columnar_trace)) :
+        timestamps,latitudes,longitudes=trace.to_arrays()
+        return {prefix+"timestamps":timestamps,prefix+"latitudes":latitudes,prefix+"longitudes":longitudes}
+    events=list(trace)
+    return {prefix+"microseconds":_to_microseconds([event.datetime for event in events]),
+            prefix+"latitudes":np.array([event.latitude for event in events],dtype=np.float64),
+            prefix+"longitudes":np.array([event.longitude for event in events],dtype=np.float64)}
+
+def _trace_from_columns(columns,prefix="",start=0,end=None) :
+    latitudes=columns[prefix+"latitudes"][start:end]
+    longitudes=columns[prefix+"longitudes"][start:end]
+    if (prefix+"timestamps" in columns) :
+        return Columnar_trace(columns[prefix+"timestamps"][start:end],latitudes,longitudes,copy=False)
+    trace=Trace()
+    datetimes=_from_microseconds(columns[prefix+"microseconds"][start:end])
+    trace.add_events(*[Event(date_time,latitude,longitude) for date_time,latitude,longitude in zip(datetimes,latitudes.tolist(),longitudes.tolist())])
+    return trace
+
+def write_columnar(columnar_file,result,extra_columns=None) :
+    """
+    Write a trace or a stage result in the binary columnar format (an uncompressed
+    .npz file holding one array per column).
+
+    Parameters
+    ----------
+    columnar_file : string or file
+        the output file
+
+    result : Trace, Columnar_trace, list<Event>, list<Trace> or list<Stay_point>
+        the trace, the filtered events of a trace (see Mean_filter and Median_filter),
+        the segments of a trace (see Segmentation_by_time) or the stay points of a
+        trace (see Stay_points)
+
+    extra_columns : dict<string,numpy.ndarray>, optional
+        additional columns stored with the result (e.g. metadata), they are ignored
+        by read_columnar (read them with numpy.load)
+
+    Notes
+    -----
+    A Trace is read back as a Trace, a Columnar_trace as a Columnar_trace and a list<Event>
+    as a list<Event> (stored as the columns of a Trace), the datetimes of a Trace, of the
+    events and of the stay points are kept to the microsecond (as naive UTC datetimes).
+    """
+
+    if (hasattr(result,'to_arrays')) :
+        columns=_trace_columns(result)
+        columns["kind"]=np.array("trace")
+    elif (isinstance(result,list) and all(hasattr(trace,'to_arrays') for trace in result) and result) :
+        traces=[_trace_columns(trace) for trace in result]
+        names=set(name for trace in traces for name in trace)
+        if (len(names)!=3) : raise Exception("traces of different types")
+        columns=dict((name,np.concatenate([trace[name] for trace in traces])) for name in names)
+        columns["offsets"]=np.concatenate(([0],np.cumsum([len(trace) for trace in result]))).astype(np.int64)
+        columns["kind"]=np.array("traces")
+    elif (isinstance(result,list) and all(isinstance(stay_point,Stay_point) for stay_point in result)) :
+        columns={"latitudes":np.array([stay_point.latitude for stay_point in result],dtype=np.float64),
+                 "longitudes":np.array([stay_point.longitude for stay_point in result],dtype=np.float64),
+                 "starting_times":_to_microseconds([stay_point.starting_time for stay_point in result]),
+                 "ending_times":_to_microseconds([stay_point.ending_time for stay_point in result]),
+                 # the labels are stored as UTF-8 bytes, the unicode ones are flagged to be decoded back
+                 "labels":np.array([stay_point.label.encode('utf-8') if isinstance(stay_point.label,unicode) else str(stay_point.label) for stay_point in result],dtype=np.string_),
+                 "unicode_labels":np.array([isinstance(stay_point.label,unicode) for stay_point in result],dtype=np.bool_),
+                 "kind":np.array("stay_points")}
+    elif (isinstance(result,list) and all(isinstance(event,Event) for event in result)) :
+        columns=_trace_columns(result)
+        columns["kind"]=np.array("events")
+    else :
+        raise Exception("result type dosen't supported by the columnar format")
+    if (extra_columns) : columns.update(extra_columns)
+    np.savez(columnar_file,**columns)
+
+def read_columnar(columnar_file) :
+    """
+    Read a trace or a stage result written by write_columnar.
+
+    Parameters
+    ----------
+    columnar_file : string or file
+        the input file
+
+    Returns
+    -------
+    result : Trace, Columnar_trace, list<Event>, list<Trace> or list<Stay_point>
+        the result as it was written
+    """
+
+    with np.load(columnar_file) as data :
+        columns=dict((name,data[name]) for name in data.files)
+    kind=str(columns.pop("kind"))
+    if (kind=="trace") : return _trace_from_columns(columns)
+    if (kind=="events") : return list(_trace_from_columns(columns))
+    if (kind=="traces") :
+        offsets=columns["offsets"]
+        return [_trace_from_columns(columns,start=offsets[index],end=offsets[index+1]) for index in range(len(offsets)-1)]
+    if (kind=="stay_points") :
+        if ("unicode_labels" in columns) :
+            labels=[label.decode('utf-8') if is_unicode else label for label,is_unicode in zip(columns["labels"].tolist(),columns["unicode_labels"].tolist())]
+        else :
+            # files written with unicode labels, the ASCII ones are read back as str
+            labels=[label.encode('ascii') if all(ord(character)<128 for character in label) else label for label in columns["labels"].tolist()]
+        return [Stay_point(latitude,longitude,starting_time,ending_time,label=label)
+                for latitude,longitude,starting_time,ending_time,label in zip(columns["latitudes"].tolist(),columns["longitudes"].tolist(),
+                                                                              _from_microseconds(columns["starting_times"]),_from_microseconds(columns["ending_times"]),
+                                                                              labels)]
+    raise Exception("columnar file kind dosen't exists")
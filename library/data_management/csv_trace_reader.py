@@ -1,11 +1,41 @@
-from pandas import read_csv
-from dateutil import parser
-from ..model import Trace,Event
+import numpy as np
+from ..model import Trace,Event,Columnar_trace
+from ..instrumentation import stage
 
 def read_trace_from_CSV(csv_file) :
+    # pandas and dateutil are imported on the first read only (they are slow to import)
+    from pandas import read_csv
+    from dateutil import parser
     data=read_csv(filepath_or_buffer=csv_file,delimiter=';',encoding='utf-8')
     values=data[["recorded_at","latitude","longitude"]].values
-    trace=Trace()
-    for value in values :
-        trace.add_event(Event(parser.parse(value[0]),value[1],value[2]))
+    with stage("read_trace_from_CSV",len(values)) as record :
+        trace=Trace()
+        for value in values :
+            trace.add_event(Event(parser.parse(value[0]),value[1],value[2]))
+        record.events_out=len(trace)
     return trace
+
+def read_trace_blocks_from_CSV(csv_file,block_size=100000) :
+    """
+    Read a trace from a CSV file by blocks of events, only one block
+    is in memory at a time.
+
+    Parameters
+    ----------
+    csv_file : string or file
+        the CSV file (';' delimited with the columns recorded_at, latitude and longitude)
+
+    block_size : int, optional
+        the number of events of a block, default value is 100000
+
+    Returns
+    -------
+    blocks : generator<Columnar_trace>
+        the consecutive blocks of the trace (the datetimes are converted
+        to seconds since the epoch, naive datetimes are considered as UTC)
+    """
+
+    from pandas import read_csv,to_datetime
+    for data in read_csv(filepath_or_buffer=csv_file,delimiter=';',encoding='utf-8',usecols=["recorded_at","latitude","longitude"],chunksize=block_size) :
+        datetimes=to_datetime(data["recorded_at"],utc=True).values.astype('datetime64[us]').astype(np.int64)
+        yield Columnar_trace(datetimes/1000000.,data["latitude"].values,data["longitude"].values,copy=False)
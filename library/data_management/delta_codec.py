@@ -0,0 +1,267 @@
+"""
+Delta encoded compressed storage of traces
+
+usage : python -m library.data_management.delta_codec <csv file> (prints the codec report of the trace)
+"""
+
+import struct
+import sys
+import time
+from cStringIO import StringIO
+
+import numpy as np
+
+from ..model import Columnar_trace,datetime_to_timestamp,timestamp_to_datetime
+
+_MAGIC="MOTAFDC1"
+_FILE_HEADER=struct.Struct("<8sqq")
+# events count, min and max time (in time units), sizes of the timestamps, latitudes and longitudes streams
+_BLOCK_HEADER=struct.Struct("<IqqIII")
+_SHIFTS=np.arange(0,64,7,dtype=np.uint64)
+
+
+def _zigzag_encode(values) :
+    return ((values<<1)^(values>>63)).view(np.uint64)
+
+def _zigzag_decode(values) :
+    return (values>>np.uint64(1)).view(np.int64)^-(values&np.uint64(1)).view(np.int64)
+
+def _varint_encode(values) :
+    """
+    Return the LEB128 encoding of unsigned integers (7 bits per byte, the high
+    bit of a byte tells that the integer continues in the next byte).
+    """
+
+    if (len(values)==0) : return np.empty(0,dtype=np.uint8)
+    shifted=values[:,None]>>_SHIFTS
+    counts=np.maximum((shifted!=0).sum(axis=1),1)
+    positions=np.arange(len(_SHIFTS))
+    continued=(positions<(counts-1)[:,None]).astype(np.uint64)<<np.uint64(7)
+    encoded=((shifted&np.uint64(0x7f))|continued).astype(np.uint8)
+    return encoded[positions<counts[:,None]]
+
+def _varint_decode(data) :
+    """
+    Return the unsigned integers of a LEB128 encoded byte array.
+    """
+
+    if (len(data)==0) : return np.empty(0,dtype=np.uint64)
+    ends=np.flatnonzero(data<0x80)
+    starts=np.concatenate(([0],ends[:-1]+1))
+    positions=np.arange(len(data))-np.repeat(starts,ends-starts+1)
+    parts=(data&0x7f).astype(np.uint64)<<(7*positions).astype(np.uint64)
+    return np.bitwise_or.reduceat(parts,starts)
+
+def _delta_encode(values,order) :
+    """
+    Return the deltas (order 1) or the deltas of deltas (order 2) of integers,
+    the first value (and the first delta for order 2) are kept.
+    """
+
+    deltas=np.concatenate((values[:1],np.diff(values)))
+    if (order==2) : deltas=np.concatenate((deltas[:2],np.diff(deltas[1:])))
+    return deltas
+
+def _delta_decode(deltas,order) :
+    values=deltas.copy()
+    if (order==2) : values[1:]=np.cumsum(values[1:])
+    return np.cumsum(values)
+
+
+class Delta_codec :
+    """
+    Lossless (at a fixed precision) compressed encoding of traces : the timestamps are
+    encoded as deltas of deltas and the coordinates in fixed point as deltas, all the
+    integers are zigzag and varint encoded. A regularly sampled smooth trace needs
+    about 1 byte per timestamp and 2 bytes per coordinate.
+
+    The events are framed in blocks, each block header holds the number of events and
+    the min/max time of the block, thus, a time range is read without decoding (and
+    even reading) the other blocks. The decoding is vectorized (numpy) and produces a
+    Columnar_trace.
+
+    Parameters
+    ----------
+    time_resolution : int, optional
+        the number of time units per second, default value is 1000000 (microseconds)
+
+    coordinate_resolution : int, optional
+        the number of coordinate units per degree, default value is 10000000
+        (1e-7 degree, approximately 1 centimeter)
+
+    block_size : int, optional
+        the number of events of a block, default value is 65536
+
+    Notes
+    -----
+    The decoded timestamps and coordinates are the nearest floats to the multiples of
+    the resolutions, the coordinates read from a CSV file with at most 7 decimals (and
+    the datetimes with at most microseconds) are decoded exactly.
+    """
+
+    def __init__(self,time_resolution=1000000,coordinate_resolution=10000000,block_size=65536) :
+        self.time_resolution=time_resolution
+        self.coordinate_resolution=coordinate_resolution
+        self.block_size=block_size
+
+    def _encode_block(self,timestamps,latitudes,longitudes) :
+        times=np.round(timestamps*self.time_resolution).astype(np.int64)
+        streams=[_varint_encode(_zigzag_encode(_delta_encode(times,2))).tostring()]
+        for coordinates in (latitudes,longitudes) :
+            fixed=np.round(coordinates*self.coordinate_resolution).astype(np.int64)
+            streams.append(_varint_encode(_zigzag_encode(_delta_encode(fixed,1))).tostring())
+        header=_BLOCK_HEADER.pack(len(times),times.min(),times.max(),*[len(stream) for stream in streams])
+        return header+"".join(streams)
+
+    def write(self,output_file,trace) :
+        """
+        Encode a trace in a file.
+
+        Parameters
+        ----------
+        output_file : file
+            a file object opened in binary mode
+
+        trace : Trace
+            A Trace object (see Trace in Model) or a Columnar_trace
+        """
+
+        output_file.write(_FILE_HEADER.pack(_MAGIC,self.time_resolution,self.coordinate_resolution))
+        timestamps,latitudes,longitudes=Columnar_trace.from_trace(trace).to_arrays()
+        for start in range(0,len(timestamps),self.block_size) :
+            end=start+self.block_size
+            output_file.write(self._encode_block(timestamps[start:end],latitudes[start:end],longitudes[start:end]))
+
+    def encode(self,trace) :
+        """
+        Return the encoding of a trace (see write) as a string.
+        """
+
+        output=StringIO()
+        self.write(output,trace)
+        return output.getvalue()
+
+
+def read_delta(input_file,starting_time=None,ending_time=None) :
+    """
+    Decode a trace encoded by Delta_codec, only the blocks intersecting the
+    time range are read.
+
+    Parameters
+    ----------
+    input_file : file
+        a file object opened in binary mode
+
+    starting_time, ending_time : datetime.datetime or float, optional
+        the time range (datetimes or seconds since the epoch, bounds included), unbounded by default
+
+    Returns
+    -------
+    trace : Columnar_trace
+        the events in the time range
+    """
+
+    magic,time_resolution,coordinate_resolution=_FILE_HEADER.unpack(input_file.read(_FILE_HEADER.size))
+    if (magic!=_MAGIC) : raise Exception("file isn't delta encoded")
+    bounds=[]
+    for bound,default in ((starting_time,-2**63),(ending_time,2**63-1)) :
+        if (bound is None) : bounds.append(default)
+        else : bounds.append(datetime_to_timestamp(bound) if hasattr(bound,'utctimetuple') else float(bound))
+    first_time,last_time=bounds
+
+    columns=([],[],[])
+    while (True) :
+        header=input_file.read(_BLOCK_HEADER.size)
+        if (len(header)<_BLOCK_HEADER.size) : break
+        events_count,min_time,max_time,times_size,latitudes_size,longitudes_size=_BLOCK_HEADER.unpack(header)
+        if (max_time<first_time*time_resolution or min_time>last_time*time_resolution) :
+            input_file.seek(times_size+latitudes_size+longitudes_size,1)
+            continue
+        data=np.frombuffer(input_file.read(times_size+latitudes_size+longitudes_size),dtype=np.uint8)
+        streams=(data[:times_size],data[times_size:times_size+latitudes_size],data[times_size+latitudes_size:])
+        columns[0].append(_delta_decode(_zigzag_decode(_varint_decode(streams[0])),2)/float(time_resolution))
+        for column,stream in zip(columns[1:],streams[1:]) :
+            column.append(_delta_decode(_zigzag_decode(_varint_decode(stream)),1)/float(coordinate_resolution))
+
+    if (not columns[0]) : return Columnar_trace()
+    timestamps,latitudes,longitudes=(np.concatenate(column) for column in columns)
+    kept=(timestamps>=first_time)&(timestamps<=last_time)
+    if (kept.all()) : return Columnar_trace(timestamps,latitudes,longitudes,copy=False)
+    return Columnar_trace(timestamps[kept],latitudes[kept],longitudes[kept],copy=False)
+
+def decode(data,starting_time=None,ending_time=None) :
+    """
+    Decode a trace encoded as a string (see Delta_codec.encode and read_delta).
+    """
+
+    return read_delta(StringIO(data),starting_time,ending_time)
+
+def _csv_size(trace) :
+    """
+    Return the size of the trace in the CSV format (see read_trace_from_CSV) with 7 decimals coordinates.
+    """
+
+    timestamps,latitudes,longitudes=Columnar_trace.from_trace(trace).to_arrays()
+    lines=("{0};{1:.7f};{2:.7f}\n".format(timestamp_to_datetime(timestamp).isoformat(" "),latitude,longitude)
+           for timestamp,latitude,longitude in zip(timestamps.tolist(),latitudes.tolist(),longitudes.tolist()))
+    return len("recorded_at;latitude;longitude\n")+sum(len(line) for line in lines)
+
+def codec_report(trace,codec=None,repeat=3) :
+    """
+    Measure the codec on a trace.
+
+    Parameters
+    ----------
+    trace : Trace
+        A Trace object (see Trace in Model) or a Columnar_trace
+
+    codec : Delta_codec, optional
+        the codec, default value is Delta_codec()
+
+    repeat : int, optional
+        the timings are the best of repeat runs, default value is 3
+
+    Returns
+    -------
+    report : dict
+        the number of events, the sizes (raw float64 columns, CSV, encoded) in bytes, the
+        compression ratios, the encode and decode throughputs (events per second and raw
+        MB per second) and whether the decoded trace equals the trace at the codec precision
+    """
+
+    codec=codec or Delta_codec()
+    trace=Columnar_trace.from_trace(trace)
+    encode_time=decode_time=float('inf')
+    for run in range(repeat) :
+        starting_time=time.time()
+        data=codec.encode(trace)
+        encode_time=min(encode_time,time.time()-starting_time)
+        starting_time=time.time()
+        decoded=decode(data)
+        decode_time=min(decode_time,time.time()-starting_time)
+
+    events=len(trace)
+    raw_size=24*events
+    csv_size=_csv_size(trace)
+    exact=len(decoded)==events
+    for original,result,resolution in zip(trace.to_arrays(),decoded.to_arrays(),(codec.time_resolution,codec.coordinate_resolution,codec.coordinate_resolution)) :
+        exact=exact and np.array_equal(np.round(original*resolution),np.round(result*resolution))
+    return {"events":events,
+            "raw_bytes":raw_size,
+            "csv_bytes":csv_size,
+            "encoded_bytes":len(data),
+            "ratio_vs_raw":raw_size/float(max(len(data),1)),
+            "ratio_vs_csv":csv_size/float(max(len(data),1)),
+            "encode_events_per_second":events/max(encode_time,1e-9),
+            "decode_events_per_second":events/max(decode_time,1e-9),
+            "encode_raw_MB_per_second":raw_size/1e6/max(encode_time,1e-9),
+            "decode_raw_MB_per_second":raw_size/1e6/max(decode_time,1e-9),
+            "lossless":bool(exact)}
+
+
+if __name__=='__main__' :
+    import json
+    from csv_trace_reader import read_trace_blocks_from_CSV
+    blocks=list(read_trace_blocks_from_CSV(sys.argv[1]))
+    trace=Columnar_trace(*(np.concatenate(column) for column in zip(*[block.to_arrays() for block in blocks])))
+    print json.dumps(codec_report(trace),indent=2,sort_keys=True)
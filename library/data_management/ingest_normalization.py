@@ -0,0 +1,255 @@
+"""
+Ingest normalization : ordering, deduplication and merging of late events
+"""
+
+import numpy as np
+
+from ..model import Trace,Event,Columnar_trace
+from ..instrumentation import stage,count
+
+DUPLICATE_RULES=('first','last','mean','keep')
+
+
+def disorder(timestamps) :
+    """
+    Return the number of events older than their previous event (one vectorized pass),
+    0 if the timestamps are ordered.
+    """
+
+    return int(np.count_nonzero(timestamps[1:]<timestamps[:-1]))
+
+def sorting_order(timestamps) :
+    """
+    Return the stable sorting order of the timestamps, None if they are already ordered
+    (the sort is done only when needed).
+    """
+
+    if (disorder(timestamps)==0) : return None
+    return np.argsort(timestamps,kind='mergesort')
+
+def _insertion(timestamps,late_timestamps) :
+    """
+    Return the stable sorting order of the late events (O(k log k)) and the positions
+    where they are inserted in the ordered timestamps, after the events having the same
+    timestamp (O(k log n)).
+    """
+
+    late_order=sorting_order(late_timestamps)
+    if (late_order is None) : late_order=np.arange(len(late_timestamps))
+    return late_order,np.searchsorted(timestamps,late_timestamps[late_order],side='right')
+
+def merging_order(size,timestamps,late_timestamps) :
+    """
+    Return the order merging late events in an ordered trace : the indices of the events
+    in the concatenation of the trace (indices [0,size)) and the late events (indices
+    [size,size+k)). The late events are sorted then inserted in the order of the trace
+    (O(n+k log k)), the trace is never sorted again.
+
+    Parameters
+    ----------
+    size : int
+        the number of events of the trace
+
+    timestamps : numpy.ndarray<float>
+        the ordered timestamps of the trace
+
+    late_timestamps : numpy.ndarray<float>
+        the timestamps of the late events (in any order)
+    """
+
+    late_order,positions=_insertion(timestamps,late_timestamps)
+    return np.insert(np.arange(size),positions,size+late_order)
+
+def merge_columns(columns,late_columns) :
+    """
+    Merge late events in ordered columns (see merging_order) without index arrays :
+    each column is copied once with the late values inserted.
+
+    Parameters
+    ----------
+    columns : 3-tuple<numpy.ndarray>
+        the ordered (timestamps, latitudes, longitudes)
+
+    late_columns : 3-tuple<numpy.ndarray>
+        the (timestamps, latitudes, longitudes) of the late events (in any order)
+
+    Returns
+    -------
+    timestamps, latitudes, longitudes : numpy.ndarray
+        the merged columns
+    """
+
+    late_order,positions=_insertion(columns[0],late_columns[0])
+    return tuple(np.insert(column,positions,late_column[late_order]) for column,late_column in zip(columns,late_columns))
+
+def _collapse(timestamps,latitudes,longitudes,duplicates) :
+    """
+    Collapse the events of ordered columns having the same timestamp.
+
+    Returns
+    -------
+    kept : numpy.ndarray<int> or None
+        the index of the event kept for each timestamp (the first one of the group
+        for 'mean'), None if there is no duplicate or for 'keep'
+
+    latitudes, longitudes : numpy.ndarray<float>
+        the coordinates of the kept events (the mean of each group for 'mean')
+
+    collapsed : numpy.ndarray<bool> or None
+        True for the kept events which replace several events
+    """
+
+    if (duplicates=='keep' or len(timestamps)<2) : return None,latitudes,longitudes,None
+    starts=np.flatnonzero(np.concatenate(([True],timestamps[1:]!=timestamps[:-1])))
+    if (len(starts)==len(timestamps)) : return None,latitudes,longitudes,None
+    sizes=np.diff(np.append(starts,len(timestamps)))
+    collapsed=sizes>1
+    if (duplicates=='first') : kept=starts
+    elif (duplicates=='last') : kept=starts+sizes-1
+    else :
+        kept=starts
+        return kept,np.add.reduceat(latitudes,starts)/sizes,np.add.reduceat(longitudes,starts)/sizes,collapsed
+    return kept,latitudes[kept],longitudes[kept],collapsed
+
+def _object_array(events) :
+    array=np.empty(len(events),dtype=object)
+    array[:]=events
+    return array
+
+def _normalize(trace,order,duplicates) :
+    """
+    Return the trace ordered by order (indices of the events of trace, None for the
+    identity) with its duplicates collapsed, and the number of removed events. A Trace
+    gives a Trace sharing the Event objects of trace (except the means of duplicates).
+    """
+
+    timestamps,latitudes,longitudes=trace.to_arrays()
+    if (order is not None) : timestamps,latitudes,longitudes=timestamps[order],latitudes[order],longitudes[order]
+    if (isinstance(trace,Columnar_trace)) : return _normalize_columns(timestamps,latitudes,longitudes,duplicates)
+    events=_object_array(list(trace))
+    if (order is not None) : events=events[order]
+    return _normalize_events(events,timestamps,latitudes,longitudes,duplicates)
+
+def _normalize_events(events,timestamps,latitudes,longitudes,duplicates) :
+    """
+    Return the Trace of ordered events (an object array) with its duplicates collapsed,
+    and the number of removed events. The events are selected with array operations on
+    their columns, an Event is created only for the means of duplicates.
+    """
+
+    size=len(events)
+    kept,latitudes,longitudes,collapsed=_collapse(timestamps,latitudes,longitudes,duplicates)
+    if (kept is not None) :
+        events=events[kept]
+        if (duplicates=='mean') :
+            for index in np.flatnonzero(collapsed).tolist() :
+                events[index]=Event(events[index].datetime,latitudes[index],longitudes[index])
+    normalized_trace=Trace()
+    normalized_trace.add_events(*events.tolist())
+    return normalized_trace,size-len(normalized_trace)
+
+def _normalize_columns(timestamps,latitudes,longitudes,duplicates) :
+    kept,latitudes,longitudes,collapsed=_collapse(timestamps,latitudes,longitudes,duplicates)
+    removed=0
+    if (kept is not None) :
+        removed=len(timestamps)-len(kept)
+        timestamps=timestamps[kept]
+    return Columnar_trace(timestamps,latitudes,longitudes,copy=False),removed
+
+class Ingest_normalization :
+    """
+    Normalize the traces at the ingestion : the events are ordered by increasing
+    datetime (the algorithms expect it, see Trace) and the events having the same
+    datetime are collapsed.
+
+    Parameters
+    ----------
+    duplicates : {'first', 'last', 'mean', 'keep'}, optional
+        the rule collapsing the events having the same datetime
+        'first' (default) : the first received event is kept
+        'last' : the last received event is kept
+        'mean' : the events are replaced by their mean position
+        'keep' : all the events are kept
+
+    Attributes
+    ----------
+    normalized_trace_ : Trace
+        the normalized trace (the Event objects of a Trace are shared with it)
+
+    disorder_ : int
+        the number of events which were older than their previous event
+
+    removed_ : int
+        the number of events removed by the collapse of the duplicates
+
+    Notes
+    -----
+        - The disorder is detected in one vectorized pass, an ordered trace is never sorted,
+          otherwise the sort is stable (the received order of the duplicates is kept).
+        - The computational complexity is O(n) for an ordered trace, O(n log n) otherwise
+          and O(n+k log k) to merge k late events (see merge).
+        - A Columnar_trace gives a Columnar_trace.
+    """
+
+    def __init__(self,duplicates='first') :
+        if (duplicates not in DUPLICATE_RULES) : raise Exception("duplicates rule dosen't exists")
+        self.duplicates=duplicates
+
+    def fit(self,trace) :
+        """
+        Normalize the trace.
+
+        Parameters
+        ----------
+        trace : Trace
+            A Trace object (see Trace in Model) or a Columnar_trace
+
+        Returns
+        -------
+        normalized_trace_ : Trace
+            the normalized trace
+        """
+
+        with stage("Ingest_normalization",len(trace)) as record :
+            timestamps=trace.to_arrays()[0]
+            self.disorder_=disorder(timestamps)
+            order=sorting_order(timestamps)
+            self.normalized_trace_,self.removed_=_normalize(trace,order,self.duplicates)
+            record.events_out=len(self.normalized_trace_)
+        count("ingest_normalization.disorder",self.disorder_)
+        count("ingest_normalization.removed",self.removed_)
+        return self.normalized_trace_
+
+    def merge(self,trace,late_trace) :
+        """
+        Merge late events in a normalized trace (the trace is not sorted again).
+
+        Parameters
+        ----------
+        trace : Trace
+            the normalized trace (ordered by increasing datetime)
+
+        late_trace : Trace
+            the late events, of the same type as trace (in any order)
+
+        Returns
+        -------
+        normalized_trace_ : Trace
+            the normalized merged trace, on the same datetime, the events of trace come
+            before the late events (see duplicates)
+        """
+
+        with stage("Ingest_normalization.merge",len(late_trace)) as record :
+            columns,late_columns=trace.to_arrays(),late_trace.to_arrays()
+            self.disorder_=disorder(late_columns[0])
+            late_order,positions=_insertion(columns[0],late_columns[0])
+            timestamps,latitudes,longitudes=(np.insert(column,positions,late_column[late_order]) for column,late_column in zip(columns,late_columns))
+            if (isinstance(trace,Columnar_trace)) :
+                self.normalized_trace_,self.removed_=_normalize_columns(timestamps,latitudes,longitudes,self.duplicates)
+            else :
+                # the late events are inserted in the events of trace as in the columns (no other pass)
+                events=np.insert(_object_array(list(trace)),positions,_object_array(list(late_trace))[late_order])
+                self.normalized_trace_,self.removed_=_normalize_events(events,timestamps,latitudes,longitudes,self.duplicates)
+            record.events_out=len(self.normalized_trace_)
+        count("ingest_normalization.removed",self.removed_)
+        return self.normalized_trace_
@@ -0,0 +1,347 @@
+"""
+Trace dataset partitioned by device and by day
+"""
+
+import datetime
+import errno
+import fcntl
+import os
+import urllib
+
+import numpy as np
+
+from ..model import Columnar_trace,Trace_collection,datetime_to_timestamp
+from columnar_io import write_columnar,read_columnar
+from csv_trace_reader import read_trace_blocks_from_CSV
+from ingest_normalization import sorting_order
+
+_DAY=86400.
+_COMPACTED_SUFFIX=".compacted.npz"
+_TEMPORARY_SUFFIX=".tmp"
+_LOCK_FILE="compaction.lock"
+
+
+def _to_timestamp(date_time) :
+    """
+    Convert a datetime (or a number of seconds since the epoch) to a timestamp,
+    None is kept as None (unbounded interval).
+    """
+
+    if (date_time is None) : return None
+    if (isinstance(date_time,datetime.datetime)) : return datetime_to_timestamp(date_time)
+    return float(date_time)
+
+def _day_name(day) :
+    return (datetime.date(1970,1,1)+datetime.timedelta(days=int(day))).strftime("day=%Y-%m-%d")
+
+def _day_from_name(name) :
+    return (datetime.datetime.strptime(name[len("day="):],"%Y-%m-%d").date()-datetime.date(1970,1,1)).days
+
+def _part_index(name) :
+    return int(name[len("part-"):].split(".")[0])
+
+def _merged_parts(path) :
+    """
+    Return the names of the parts merged in a compacted part.
+    """
+
+    with np.load(path) as data :
+        return data["merged_parts"].tolist()
+
+def _list_parts(directory) :
+    """
+    Return the live parts and the superseded parts of a day partition (file names
+    ordered by index) : a compacted part replaces the parts merged in it.
+    """
+
+    while (True) :
+        names=sorted((name for name in os.listdir(directory) if name.startswith("part-") and name.endswith(".npz")),key=_part_index)
+        try :
+            merged=set(merged_name for name in names if name.endswith(_COMPACTED_SUFFIX) for merged_name in _merged_parts(os.path.join(directory,name)))
+        except (IOError,OSError) :
+            # a compacted part removed by a concurrent compaction (superseded), list again
+            continue
+        return [name for name in names if name not in merged],[name for name in names if name in merged]
+
+def _reserve_part(directory) :
+    """
+    Reserve the next index of a partition directory : the temporary file part-<n>.tmp
+    is created exclusively, thus, concurrent writers never get the same index, and n is
+    greater than the index of all the other files of the directory.
+
+    Returns
+    -------
+    index : int
+        the reserved index
+
+    temporary_path : string
+        the path of the temporary file (renamed to the part once written)
+
+    descriptor : int
+        the file descriptor of the temporary file (opened for writing)
+    """
+
+    while (True) :
+        indices=[_part_index(name) for name in os.listdir(directory) if name.startswith("part-")]
+        index=max(indices)+1 if indices else 0
+        temporary_name="part-{0}{1}".format(index,_TEMPORARY_SUFFIX)
+        temporary_path=os.path.join(directory,temporary_name)
+        try :
+            descriptor=os.open(temporary_path,os.O_CREAT|os.O_EXCL|os.O_WRONLY,0o644)
+        except OSError as error :
+            if (error.errno!=errno.EEXIST) : raise
+            continue
+        # the index may have been taken (and published) between the listing and the reservation
+        indices=[_part_index(name) for name in os.listdir(directory) if name.startswith("part-") and name!=temporary_name]
+        if (not indices or max(indices)<index) : return index,temporary_path,descriptor
+        os.close(descriptor)
+        os.remove(temporary_path)
+
+
+class _Compaction_lock :
+    """
+    Exclusive lock of the compaction of a partition directory (released when the
+    process ends, even if it crashes).
+    """
+
+    def __init__(self,directory) :
+        self.path=os.path.join(directory,_LOCK_FILE)
+
+    def __enter__(self) :
+        self._lock_file=open(self.path,'a')
+        fcntl.flock(self._lock_file.fileno(),fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self,exception_type,exception,traceback) :
+        fcntl.flock(self._lock_file.fileno(),fcntl.LOCK_UN)
+        self._lock_file.close()
+        return False
+
+
+class Partitioned_dataset :
+    """
+    Dataset of traces stored in the binary columnar format (see write_columnar) and
+    partitioned by device and by (UTC) day :
+
+        root/device=<device id>/day=YYYY-MM-DD/part-<n>.npz
+
+    The dataset is append-only : appending events writes new part files and never
+    modifies the existing ones. The reader selects the partitions from the directory
+    names only, thus, the partitions of other devices or outside the time range are
+    never opened. The compaction merges the parts of a day partition in one file
+    part-<n>.compacted.npz which replaces the merged parts (see compact).
+
+    Parameters
+    ----------
+    root : string
+        the root directory of the dataset (created if it does not exist)
+
+    Notes
+    -----
+    The device identifiers are stored in the directory names (URL-quoted), they
+    are read back as strings.
+    """
+
+    def __init__(self,root) :
+        self.root=root
+        if (not os.path.isdir(root)) : os.makedirs(root)
+
+    def _device_directory(self,device_id) :
+        return os.path.join(self.root,"device="+urllib.quote(str(device_id),safe=''))
+
+    def _write_part(self,directory,trace,merged_parts=None) :
+        """
+        Write a trace as the next part of a partition directory (atomically), or as a
+        compacted part replacing the merged_parts when they are given.
+        """
+
+        try :
+            os.makedirs(directory)
+        except OSError :
+            if (not os.path.isdir(directory)) : raise
+        index,temporary_path,descriptor=_reserve_part(directory)
+        extra_columns=None
+        if (merged_parts is not None) : extra_columns={"merged_parts":np.array(merged_parts,dtype=np.string_)}
+        try :
+            with os.fdopen(descriptor,'wb') as temporary_file :
+                write_columnar(temporary_file,trace,extra_columns=extra_columns)
+        except Exception :
+            os.remove(temporary_path)
+            raise
+        path=os.path.join(directory,"part-{0}{1}".format(index,_COMPACTED_SUFFIX if merged_parts is not None else ".npz"))
+        os.rename(temporary_path,path)
+        return path
+
+    def append(self,device_id,trace) :
+        """
+        Append events of a device (one new part in each day partition of the events).
+
+        Parameters
+        ----------
+        device_id : object
+            the identifier of the device
+
+        trace : Trace
+            A Trace object (see Trace in Model) or a Columnar_trace, the events
+            (ordered by increasing datetime)
+
+        Returns
+        -------
+        paths : list<string>
+            the written part files
+        """
+
+        trace=Columnar_trace.from_trace(trace)
+        if (len(trace)==0) : return []
+        days=np.floor(trace.timestamps/_DAY).astype(np.int64)
+        boundaries=np.concatenate(([0],np.flatnonzero(np.diff(days))+1,[len(trace)]))
+        device_directory=self._device_directory(device_id)
+        paths=[]
+        for start,end in zip(boundaries[:-1],boundaries[1:]) :
+            paths.append(self._write_part(os.path.join(device_directory,_day_name(days[start])),trace.segment(start,end)))
+        return paths
+
+    def import_CSV(self,device_id,csv_file,block_size=100000) :
+        """
+        Append the trace of a CSV file (see read_trace_blocks_from_CSV) read by blocks.
+        """
+
+        for block in read_trace_blocks_from_CSV(csv_file,block_size=block_size) :
+            self.append(device_id,block)
+
+    def device_ids(self) :
+        """
+        Return the identifiers of the devices of the dataset.
+        """
+
+        return sorted(urllib.unquote(name[len("device="):]) for name in os.listdir(self.root) if name.startswith("device="))
+
+    def partitions(self,device_ids=None,starting_time=None,ending_time=None) :
+        """
+        Return the day partitions of the given devices intersecting the time range (no file is read).
+
+        Parameters
+        ----------
+        device_ids : list, optional
+            the devices, all the devices by default
+
+        starting_time, ending_time : datetime.datetime or float, optional
+            the time range (datetimes or seconds since the epoch), unbounded by default
+
+        Returns
+        -------
+        partitions : list<(string,string,list<string>)>
+            the device identifier, the day partition directory and its live part files
+            (the parts replaced by a compacted part are left out)
+
+        Notes
+        -----
+        The partitions are selected from the directory names, only the lists of merged
+        parts of the compacted parts are read.
+        """
+
+        starting_time,ending_time=_to_timestamp(starting_time),_to_timestamp(ending_time)
+        first_day=None if starting_time is None else int(np.floor(starting_time/_DAY))
+        last_day=None if ending_time is None else int(np.floor(ending_time/_DAY))
+        device_ids=self.device_ids() if device_ids is None else [str(device_id) for device_id in device_ids]
+        partitions=[]
+        for device_id in device_ids :
+            device_directory=self._device_directory(device_id)
+            if (not os.path.isdir(device_directory)) : continue
+            for name in sorted(os.listdir(device_directory)) :
+                if (not name.startswith("day=")) : continue
+                day=_day_from_name(name)
+                if ((first_day is not None and day<first_day) or (last_day is not None and day>last_day)) : continue
+                directory=os.path.join(device_directory,name)
+                parts,superseded=_list_parts(directory)
+                partitions.append((device_id,directory,[os.path.join(directory,part) for part in parts]))
+        return partitions
+
+    def read(self,device_ids=None,starting_time=None,ending_time=None) :
+        """
+        Read the traces of the given devices in the time range.
+
+        Parameters
+        ----------
+        device_ids : list, optional
+            the devices, all the devices by default
+
+        starting_time, ending_time : datetime.datetime or float, optional
+            the time range (datetimes or seconds since the epoch, bounds included), unbounded by default
+
+        Returns
+        -------
+        traces : Trace_collection
+            the trace (Columnar_trace) of each device having events in the range
+        """
+
+        starting_time,ending_time=_to_timestamp(starting_time),_to_timestamp(ending_time)
+        columns={}
+        for device_id,directory,parts in self.partitions(device_ids,starting_time,ending_time) :
+            columns.setdefault(device_id,[]).extend(read_columnar(part).to_arrays() for part in parts)
+
+        traces=Trace_collection()
+        for device_id,device_columns in columns.items() :
+            timestamps,latitudes,longitudes=(np.concatenate(column) for column in zip(*device_columns))
+            # the parts of a day may overlap when late events were appended (sorted only then)
+            order=sorting_order(timestamps)
+            if (order is not None) : timestamps,latitudes,longitudes=timestamps[order],latitudes[order],longitudes[order]
+            start=0 if starting_time is None else np.searchsorted(timestamps,starting_time,side='left')
+            end=len(timestamps) if ending_time is None else np.searchsorted(timestamps,ending_time,side='right')
+            if (end>start) : traces.add_trace(device_id,Columnar_trace(timestamps[start:end],latitudes[start:end],longitudes[start:end],copy=False))
+        return traces
+
+    def read_trace(self,device_id,starting_time=None,ending_time=None) :
+        """
+        Read the trace of a device in the time range (see read), an empty trace if there is no event.
+        """
+
+        traces=self.read([device_id],starting_time,ending_time)
+        return traces[str(device_id)] if str(device_id) in traces else Columnar_trace()
+
+    def compact(self,device_ids=None,minimum_parts=2) :
+        """
+        Merge the parts of each day partition having at least minimum_parts parts in one
+        part (ordered by increasing datetime).
+
+        Parameters
+        ----------
+        device_ids : list, optional
+            the devices, all the devices by default
+
+        minimum_parts : int, optional
+            the number of parts from which a day partition is compacted, default value is 2
+
+        Returns
+        -------
+        compacted : int
+            the number of compacted day partitions
+
+        Notes
+        -----
+        The merged part is written atomically (renamed) as a compacted part recording the
+        names of the parts it merged, from then on the readers ignore these parts, which
+        are removed afterwards (by increasing index, thus, a compacted part is removed after
+        the parts it replaces). Thus, an interrupted compaction never duplicates nor loses
+        events : the parts it left are ignored by the readers and removed by the next
+        compaction. The parts appended during a compaction are not merged and stay live.
+        The compactions of a day partition are serialized by a lock file (compaction.lock).
+        A reader listing the parts just before their removal may fail to open one of them
+        (and must retry).
+        """
+
+        compacted=0
+        for device_id,directory,parts in self.partitions(device_ids) :
+            with _Compaction_lock(directory) :
+                parts,superseded=_list_parts(directory)
+                if (len(parts)>=max(minimum_parts,2)) :
+                    columns=[read_columnar(os.path.join(directory,part)).to_arrays() for part in parts]
+                    timestamps,latitudes,longitudes=(np.concatenate(column) for column in zip(*columns))
+                    order=sorting_order(timestamps)
+                    if (order is not None) : timestamps,latitudes,longitudes=timestamps[order],latitudes[order],longitudes[order]
+                    self._write_part(directory,Columnar_trace(timestamps,latitudes,longitudes,copy=False),merged_parts=parts)
+                    superseded.extend(parts)
+                    compacted+=1
+                for part in sorted(superseded,key=_part_index) :
+                    os.remove(os.path.join(directory,part))
+        return compacted
@@ -0,0 +1,324 @@
+"""
+Vectorized generation of realistic synthetic traces with their ground truth
+"""
+
+import numpy as np
+
+from ..model import Columnar_trace,Trace_collection,Stay_point,timestamp_to_datetime
+
+# the repository works in the euclidean space of the degrees (0.0001 is approximately 11.132 meters)
+_METERS_PER_DEGREE=111320.
+
+
+class Synthetic_ground_truth :
+    """
+    The ground truth of a synthetic trace.
+
+    Attributes
+    ----------
+    stay_points : list<Stay_point>
+        the stays of the device left before the last event (true position, arrival
+        and departure times)
+
+    dropouts : numpy.ndarray<float>
+        the (start, end) times of the dropouts (no event is recorded), shape (k,2)
+
+    segment_starts : numpy.ndarray<int>
+        the indices of the events following a dropout (the segment boundaries)
+
+    outliers : numpy.ndarray<int>
+        the indices of the outlier events
+
+    true_trace : Columnar_trace
+        the true positions of the device at the times of the events (no noise, no outliers)
+    """
+
+    def __init__(self,stay_points,dropouts,segment_starts,outliers,true_trace) :
+        self.stay_points=stay_points
+        self.dropouts=dropouts
+        self.segment_starts=segment_starts
+        self.outliers=outliers
+        self.true_trace=true_trace
+
+
+class Synthetic_generator :
+    """
+    Generate synthetic traces of devices alternating stays and moves (numpy, a few
+    seconds for millions of events).
+
+    A device stays at a place for a random duration then moves in a straight line to
+    the next place, the speed varies along a move (it accelerates from 0 and brakes to 0,
+    the mean speed is drawn for each move). The positions are sampled at irregular
+    intervals, with GPS noise, outliers and dropouts.
+
+    Parameters
+    ----------
+    devices : int, optional
+        the number of devices, default value is 1
+
+    events : int, optional
+        the number of events of each device, default value is 10000
+
+    sampling_period : float, optional
+        the mean time between two events in seconds, default value is 5
+
+    sampling_jitter : float, optional
+        the relative variation of the time between two events (uniform in
+        sampling_period*[1-jitter,1+jitter]), default value is 0.5
+
+    stay_duration : 2-tuple, optional
+        the range of the stay durations in seconds, default value is (1800,7200)
+
+    move_duration : 2-tuple, optional
+        the range of the move durations in seconds, default value is (300,1800)
+
+    speed : 2-tuple, optional
+        the range of the mean speed of a move in meters per second, default value is (1,15)
+
+    noise : float, optional
+        the standard deviation of the GPS noise in meters, default value is 5
+
+    outlier_rate : float, optional
+        the fraction of outlier events, default value is 0.001
+
+    outlier_distance : float, optional
+        the mean distance of an outlier to the true position in meters, default value is 500
+
+    dropout_rate : float, optional
+        the mean number of dropouts per day, default value is 2
+
+    dropout_duration : 2-tuple, optional
+        the range of the dropout durations in seconds, default value is (600,3600)
+
+    origin : 2-tuple, optional
+        the (latitude, longitude) of the first stay, default value is (45.75,4.85)
+
+    starting_time : float, optional
+        the time of the first event in seconds since the epoch, default value is 1.5e9
+
+    seed : int, optional
+        the seed of the generation (a device is generated the same way whatever the number of devices)
+    """
+
+    def __init__(self,devices=1,events=10000,sampling_period=5.,sampling_jitter=0.5,stay_duration=(1800,7200),
+                 move_duration=(300,1800),speed=(1,15),noise=5.,outlier_rate=0.001,outlier_distance=500.,
+                 dropout_rate=2.,dropout_duration=(600,3600),origin=(45.75,4.85),starting_time=1.5e9,seed=0) :
+        self.devices=devices
+        self.events=events
+        self.sampling_period=sampling_period
+        self.sampling_jitter=sampling_jitter
+        self.stay_duration=stay_duration
+        self.move_duration=move_duration
+        self.speed=speed
+        self.noise=noise
+        self.outlier_rate=outlier_rate
+        self.outlier_distance=outlier_distance
+        self.dropout_rate=dropout_rate
+        self.dropout_duration=dropout_duration
+        self.origin=origin
+        self.starting_time=starting_time
+        self.seed=seed
+
+    def _timestamps(self,random_state) :
+        """
+        Return the times of the events (relative to starting_time) and the dropouts.
+        """
+
+        span=self.events*self.sampling_period*1.5+np.mean(self.dropout_duration)*self.dropout_rate*self.events*self.sampling_period/86400.
+        while (True) :
+            steps=self.sampling_period*(1+self.sampling_jitter*random_state.uniform(-1,1,int(span/self.sampling_period)+2))
+            times=np.cumsum(steps)-steps[0]
+            dropouts_count=random_state.poisson(self.dropout_rate*times[-1]/86400.)
+            starts=np.sort(random_state.uniform(0,times[-1],dropouts_count))
+            dropouts=np.column_stack((starts,starts+random_state.uniform(self.dropout_duration[0],self.dropout_duration[1],dropouts_count)))
+            # an event is dropped if it is in a dropout (the dropouts may overlap)
+            started=np.searchsorted(dropouts[:,0],times,side='right')
+            latest_end=np.concatenate(([-np.inf],np.maximum.accumulate(dropouts[:,1]))) if dropouts_count else np.array([-np.inf])
+            kept=times>=latest_end[started]
+            if (kept.sum()>=self.events) : break
+            span*=2
+        times=times[kept][:self.events]
+        dropouts=dropouts[dropouts[:,0]<times[-1]]
+        return times,dropouts
+
+    def _legs(self,random_state,duration) :
+        """
+        Return the stays and moves covering [0,duration] : the boundaries of the legs (a stay
+        then a move and so on) and the place of each stay.
+        """
+
+        mean_leg=np.mean(self.stay_duration)+np.mean(self.move_duration)
+        legs_count=int(duration/mean_leg*1.5)+4
+        durations=np.empty(2*legs_count)
+        durations[0::2]=random_state.uniform(self.stay_duration[0],self.stay_duration[1],legs_count)
+        durations[1::2]=random_state.uniform(self.move_duration[0],self.move_duration[1],legs_count)
+        # the trace starts at a random moment of the first stay
+        boundaries=np.concatenate(([0.],np.cumsum(durations)))-random_state.uniform(0,durations[0])
+        while (boundaries[-1]<duration) :
+            boundaries=np.concatenate((boundaries,boundaries[-1]+np.cumsum(durations)))
+        stays_count=(len(boundaries))//2
+        distances=random_state.uniform(self.speed[0],self.speed[1],stays_count)*(boundaries[2::2][:stays_count]-boundaries[1::2][:stays_count])/_METERS_PER_DEGREE
+        directions=random_state.uniform(0,2*np.pi,stays_count)
+        # the place reached by the last move is the place of a last stay
+        places=np.empty((stays_count+1,2))
+        places[0]=self.origin
+        places[1:,0]=self.origin[0]+np.cumsum(distances*np.cos(directions))
+        places[1:,1]=self.origin[1]+np.cumsum(distances*np.sin(directions))
+        return boundaries,places
+
+    def _positions(self,times,boundaries,places) :
+        """
+        Return the true positions at the given times.
+        """
+
+        legs=np.searchsorted(boundaries,times,side='right')-1
+        stays=legs//2
+        moving=legs%2==1
+        latitudes=places[stays,0].copy()
+        longitudes=places[stays,1].copy()
+        # on a move, the traveled fraction of the distance for a speed profile 1-cos (stop to stop)
+        progress=(times[moving]-boundaries[legs[moving]])/(boundaries[legs[moving]+1]-boundaries[legs[moving]])
+        fraction=progress-np.sin(2*np.pi*progress)/(2*np.pi)
+        latitudes[moving]+=fraction*(places[stays[moving]+1,0]-places[stays[moving],0])
+        longitudes[moving]+=fraction*(places[stays[moving]+1,1]-places[stays[moving],1])
+        return latitudes,longitudes
+
+    def generate_device(self,device) :
+        """
+        Generate the trace of a device.
+
+        Parameters
+        ----------
+        device : int
+            the index of the device
+
+        Returns
+        -------
+        trace : Columnar_trace
+            the trace of the device
+
+        ground_truth : Synthetic_ground_truth
+            its ground truth
+        """
+
+        random_state=np.random.RandomState([self.seed,device])
+        times,dropouts=self._timestamps(random_state)
+        boundaries,places=self._legs(random_state,times[-1])
+        true_latitudes,true_longitudes=self._positions(times,boundaries,places)
+
+        noise=self.noise/_METERS_PER_DEGREE
+        latitudes=true_latitudes+random_state.normal(0,noise,len(times))
+        longitudes=true_longitudes+random_state.normal(0,noise,len(times))
+        outliers=np.flatnonzero(random_state.uniform(0,1,len(times))<self.outlier_rate)
+        distances=random_state.exponential(self.outlier_distance/_METERS_PER_DEGREE,len(outliers))
+        directions=random_state.uniform(0,2*np.pi,len(outliers))
+        latitudes[outliers]+=distances*np.cos(directions)
+        longitudes[outliers]+=distances*np.sin(directions)
+
+        timestamps=self.starting_time+times
+        stay_points=[]
+        for stay in range(len(places)-1) :
+            # a stay which is not left before the last event can not be detected
+            arrival,departure=max(boundaries[2*stay],0.),boundaries[2*stay+1]
+            if (departure>=times[-1]) : break
+            stay_points.append(Stay_point(places[stay,0],places[stay,1],timestamp_to_datetime(self.starting_time+arrival),
+                                          timestamp_to_datetime(self.starting_time+departure),label="stay point {0}".format(len(stay_points)+1)))
+        segment_starts=np.unique(np.searchsorted(times,dropouts[:,1]))
+        segment_starts=segment_starts[(segment_starts>0)&(segment_starts<len(times))]
+        ground_truth=Synthetic_ground_truth(stay_points,self.starting_time+dropouts,segment_starts,outliers,
+                                            Columnar_trace(timestamps,true_latitudes,true_longitudes,copy=False))
+        return Columnar_trace(timestamps,latitudes,longitudes,copy=False),ground_truth
+
+    def generate(self) :
+        """
+        Generate the traces of all the devices.
+
+        Returns
+        -------
+        traces : Trace_collection
+            the trace (Columnar_trace) of each device (identified by its index)
+
+        ground_truths : dict<int,Synthetic_ground_truth>
+            the ground truth of each device
+        """
+
+        traces=Trace_collection()
+        ground_truths={}
+        for device in range(self.devices) :
+            trace,ground_truth=self.generate_device(device)
+            traces.add_trace(device,trace)
+            ground_truths[device]=ground_truth
+        return traces,ground_truths
+
+
+def stay_points_scores(stay_points,ground_truth,dist_thres=0.0005,time_thres=600) :
+    """
+    Return the precision and the recall of detected stay points : a detected stay point
+    matches a true one when it is within dist_thres (in euclidean space) of it and their
+    arrival and departure times differ by less than time_thres seconds (a true stay point
+    is matched at most once).
+
+    Parameters
+    ----------
+    stay_points : list<Stay_point>
+        the detected stay points
+
+    ground_truth : Synthetic_ground_truth
+        the ground truth of the trace
+
+    dist_thres : float, optional
+        the distance threshold, default value is 0.0005 (approximately 55 meters)
+
+    time_thres : float, optional
+        the time threshold in seconds, default value is 600
+
+    Returns
+    -------
+    precision, recall : float
+        the fraction of the detected stay points which are true ones and the fraction of
+        the true stay points which are detected (1 when there is nothing to detect)
+    """
+
+    truth=ground_truth.stay_points
+    matched=set()
+    true_positives=0
+    for stay_point in stay_points :
+        for index,true_stay_point in enumerate(truth) :
+            if (index in matched) : continue
+            if (stay_point.euclidean_distance(true_stay_point)<=dist_thres and
+                abs((stay_point.starting_time-true_stay_point.starting_time).total_seconds())<time_thres and
+                abs((stay_point.ending_time-true_stay_point.ending_time).total_seconds())<time_thres) :
+                matched.add(index)
+                true_positives+=1
+                break
+    precision=true_positives/float(len(stay_points)) if stay_points else 1.
+    recall=true_positives/float(len(truth)) if truth else 1.
+    return precision,recall
+
+def segmentation_scores(segments,ground_truth) :
+    """
+    Return the precision and the recall of the boundaries of a segmentation (the indices
+    of the first event of each segment but the first) against the segment starts of the
+    ground truth (the events following a dropout).
+
+    Parameters
+    ----------
+    segments : list<Trace>
+        the consecutive segments of the trace (see Segmentation_by_time)
+
+    ground_truth : Synthetic_ground_truth
+        the ground truth of the trace
+
+    Returns
+    -------
+    precision, recall : float
+        the fraction of the boundaries which are true ones and the fraction of the
+        true boundaries which are found (1 when there is nothing to find)
+    """
+
+    boundaries=set(np.cumsum([len(segment) for segment in segments])[:-1].tolist())
+    truth=set(ground_truth.segment_starts.tolist())
+    true_positives=len(boundaries&truth)
+    precision=true_positives/float(len(boundaries)) if boundaries else 1.
+    recall=true_positives/float(len(truth)) if truth else 1.
+    return precision,recall
@@ -0,0 +1 @@
+from instrumentation import Sink,Registry_sink,Logging_sink,Prometheus_sink,enable,disable,is_enabled,flush,stage,count,observe
@@ -0,0 +1,301 @@
+"""
+Per-stage instrumentation : wall time, events in and out, allocations and algorithm counters
+"""
+
+import gc
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+class _State :
+    enabled=False
+    sinks=[]
+    track_allocations=False
+
+_state=_State()
+
+
+def _allocations() :
+    # number of allocated memory blocks (Python 3.4+), live garbage collected objects otherwise
+    if (hasattr(sys,'getallocatedblocks')) : return sys.getallocatedblocks()
+    return len(gc.get_objects())
+
+
+class Sink :
+    """
+    Base class of the instrumentation sinks, a sink receives the records of the stages,
+    the counters and the observations (all the methods do nothing by default).
+    """
+
+    def record_stage(self,name,seconds,events_in,events_out,allocations) :
+        pass
+
+    def record_count(self,name,value) :
+        pass
+
+    def record_observation(self,name,value) :
+        pass
+
+    def flush(self) :
+        pass
+
+
+class Registry_sink(Sink) :
+    """
+    Sink aggregating the records in memory.
+
+    Attributes
+    ----------
+    stages : dict<string,dict>
+        for each stage : calls, seconds, events_in, events_out and allocations (sums over the calls)
+
+    counters : dict<string,float>
+        the sum of each counter
+
+    observations : dict<string,dict>
+        for each observed quantity : count, sum, min and max of the observed values
+    """
+
+    def __init__(self) :
+        self._lock=threading.Lock()
+        self.clear()
+
+    def clear(self) :
+        self.stages={}
+        self.counters={}
+        self.observations={}
+
+    def record_stage(self,name,seconds,events_in,events_out,allocations) :
+        with self._lock :
+            record=self.stages.setdefault(name,{"calls":0,"seconds":0.,"events_in":0,"events_out":0,"allocations":0})
+            record["calls"]+=1
+            record["seconds"]+=seconds
+            record["events_in"]+=events_in or 0
+            record["events_out"]+=events_out or 0
+            record["allocations"]+=allocations or 0
+
+    def record_count(self,name,value) :
+        with self._lock :
+            self.counters[name]=self.counters.get(name,0)+value
+
+    def record_observation(self,name,value) :
+        with self._lock :
+            record=self.observations.get(name)
+            if (record is None) :
+                self.observations[name]={"count":1,"sum":value,"min":value,"max":value}
+            else :
+                record["count"]+=1
+                record["sum"]+=value
+                record["min"]=min(record["min"],value)
+                record["max"]=max(record["max"],value)
+
+
+class Logging_sink(Sink) :
+    """
+    Sink logging each stage record (the counters and the observations are logged at debug level).
+
+    Parameters
+    ----------
+    logger : logging.Logger, optional
+        the logger, default value is the 'motaf' logger
+
+    level : int, optional
+        the level of the stage records, default value is logging.INFO
+    """
+
+    def __init__(self,logger=None,level=logging.INFO) :
+        self.logger=logger or logging.getLogger("motaf")
+        self.level=level
+
+    def record_stage(self,name,seconds,events_in,events_out,allocations) :
+        self.logger.log(self.level,"stage %s : %.6f s, events in %s, events out %s, allocations %s",name,seconds,events_in,events_out,allocations)
+
+    def record_count(self,name,value) :
+        self.logger.debug("counter %s += %s",name,value)
+
+    def record_observation(self,name,value) :
+        self.logger.debug("observation %s = %s",name,value)
+
+
+def _label(value) :
+    return str(value).replace("\\","\\\\").replace('"','\\"').replace("\n","\\n")
+
+class Prometheus_sink(Registry_sink) :
+    """
+    Sink aggregating the records (see Registry_sink) and dumping them in a file in the
+    Prometheus text format (e.g. for the textfile collector of the node exporter), the
+    file is written at each flush (see flush and disable).
+
+    Parameters
+    ----------
+    path : string
+        the path of the dump file
+
+    prefix : string, optional
+        the prefix of the metric names, default value is 'motaf'
+    """
+
+    def __init__(self,path,prefix="motaf") :
+        Registry_sink.__init__(self)
+        self.path=path
+        self.prefix=prefix
+
+    def dumps(self) :
+        """
+        Return the records in the Prometheus text format.
+        """
+
+        lines=[]
+        with self._lock :
+            for field,kind in (("calls","counter"),("seconds","counter"),("events_in","counter"),("events_out","counter"),("allocations","counter")) :
+                metric="{0}_stage_{1}_total".format(self.prefix,field)
+                lines.append("# TYPE {0} {1}".format(metric,kind))
+                for name,record in sorted(self.stages.items()) :
+                    lines.append('{0}{{stage="{1}"}} {2!r}'.format(metric,_label(name),record[field]))
+            metric="{0}_counter_total".format(self.prefix)
+            lines.append("# TYPE {0} counter".format(metric))
+            for name,value in sorted(self.counters.items()) :
+                lines.append('{0}{{name="{1}"}} {2!r}'.format(metric,_label(name),value))
+            for field,kind in (("count","counter"),("sum","counter"),("min","gauge"),("max","gauge")) :
+                metric="{0}_observation_{1}".format(self.prefix,field)
+                lines.append("# TYPE {0} {1}".format(metric,kind))
+                for name,record in sorted(self.observations.items()) :
+                    lines.append('{0}{{name="{1}"}} {2!r}'.format(metric,_label(name),record[field]))
+        return "\n".join(lines)+"\n"
+
+    def flush(self) :
+        directory=os.path.dirname(os.path.abspath(self.path))
+        descriptor,temporary_path=tempfile.mkstemp(suffix=".tmp",dir=directory)
+        with os.fdopen(descriptor,'w') as temporary_file :
+            temporary_file.write(self.dumps())
+        os.rename(temporary_path,self.path)
+
+
+class _Stage :
+    """
+    Record of a running stage (see stage), events_out may be set before the end of the stage.
+    """
+
+    def __init__(self,name,events_in) :
+        self.name=name
+        self.events_in=events_in
+        self.events_out=None
+
+    def __enter__(self) :
+        self._allocations=_allocations() if _state.track_allocations else None
+        self._starting_time=time.time()
+        return self
+
+    def __exit__(self,exception_type,exception,traceback) :
+        seconds=time.time()-self._starting_time
+        allocations=_allocations()-self._allocations if self._allocations is not None else None
+        for sink in _state.sinks :
+            sink.record_stage(self.name,seconds,self.events_in,self.events_out,allocations)
+        return False
+
+class _No_stage :
+    """
+    Stage used when the instrumentation is disabled (does nothing).
+    """
+
+    events_out=None
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self,exception_type,exception,traceback) :
+        return False
+
+    def __setattr__(self,name,value) :
+        pass
+
+_NO_STAGE=_No_stage()
+
+
+def enable(*sinks,**options) :
+    """
+    Enable the instrumentation.
+
+    Parameters
+    ----------
+    sinks : Sink
+        the sinks receiving the records (Registry_sink, Logging_sink, Prometheus_sink, ...)
+
+    track_allocations : bool, optional (keyword)
+        also count the allocations of each stage (allocated memory blocks on Python 3.4+, live
+        garbage collected objects otherwise, which costs a traversal of the objects at the
+        beginning and at the end of each stage), default value is False
+    """
+
+    _state.sinks=list(sinks)
+    _state.track_allocations=options.get("track_allocations",False)
+    _state.enabled=True
+
+def disable() :
+    """
+    Disable the instrumentation (the sinks are flushed).
+    """
+
+    flush()
+    _state.enabled=False
+    _state.sinks=[]
+
+def is_enabled() :
+    return _state.enabled
+
+def flush() :
+    """
+    Flush the sinks (e.g. write the dump file of a Prometheus_sink).
+    """
+
+    for sink in _state.sinks :
+        sink.flush()
+
+def stage(name,events_in=None) :
+    """
+    Return a context manager recording the wall time of a stage.
+
+    Parameters
+    ----------
+    name : string
+        the name of the stage
+
+    events_in : int, optional
+        the number of input events
+
+    Returns
+    -------
+    stage : context manager
+        set its events_out attribute to record the number of output events
+
+    Examples
+    --------
+    with stage("Median_filter",len(trace)) as record :
+        filtered_trace=...
+        record.events_out=len(filtered_trace)
+    """
+
+    if (not _state.enabled) : return _NO_STAGE
+    return _Stage(name,events_in)
+
+def count(name,value=1) :
+    """
+    Add value to a counter (nothing is done when the instrumentation is disabled).
+    """
+
+    if (not _state.enabled) : return
+    for sink in _state.sinks :
+        sink.record_count(name,value)
+
+def observe(name,value) :
+    """
+    Record a value of an observed quantity (nothing is done when the instrumentation is disabled).
+    """
+
+    if (not _state.enabled) : return
+    for sink in _state.sinks :
+        sink.record_observation(name,value)
@@ -0,0 +1 @@
+from spatio_temporal_index import Spatio_temporal_index
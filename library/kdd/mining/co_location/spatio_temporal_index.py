@@ -0,0 +1,380 @@
+"""
+Spatio-temporal index for co-location queries
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import datetime
+
+import numpy as np
+
+from ....model import datetime_to_timestamp
+
+
+def _to_timestamp(date_time) :
+    """
+    Convert a datetime (or a number of seconds since the epoch) to a timestamp,
+    None is kept as None (unbounded interval).
+    """
+
+    if (date_time is None) : return None
+    if (isinstance(date_time,datetime.datetime)) : return datetime_to_timestamp(date_time)
+    return float(date_time)
+
+def _ranges_to_indices(starts,ends) :
+    """
+    Concatenate the index ranges [starts[k],ends[k]) in one array without any python loop.
+
+    Parameters
+    ----------
+    starts : numpy.ndarray<int>
+        the first index of each range
+
+    ends : numpy.ndarray<int>
+        the index following the last index of each range
+
+    Returns
+    -------
+    indices : numpy.ndarray<int>
+        the concatenation of all the ranges
+    """
+
+    lengths=ends-starts
+    non_empty=lengths>0
+    starts,lengths=starts[non_empty],lengths[non_empty]
+    total=lengths.sum()
+    if (total==0) : return np.empty(0,dtype=np.int64)
+    offsets=np.cumsum(lengths)-lengths
+    return np.repeat(starts-offsets,lengths)+np.arange(total)
+
+
+class Spatio_temporal_index :
+    """
+    Time-bucketed spatial grid built over a set of traces. The index answers
+    range, radius and pairwise-encounter (co-location) queries.
+
+    All the events of all the traces are sorted by (time bucket, latitude cell,
+    longitude cell). A key is associated to each cell so that the events of
+    consecutive longitude cells are contiguous, thus, any rectangle of the grid
+    in a given time bucket is read with one binary search per latitude row.
+    The encounter query sweeps the cells by increasing time and only compares
+    the events with those of the neighbooring cells in the following time buckets.
+
+    Parameters
+    ----------
+    cell_size : float, optional
+        the size of a grid cell (in euclidean space),
+        default value is 0.001 (approximately 111.32 meters)
+
+    time_bucket : float, optional
+        the duration of a time bucket in seconds, default value is 300
+
+    Attributes
+    ----------
+    trace_ids_ : list
+        the identifiers of the indexed traces
+
+    timestamps_ : numpy.ndarray<float>
+        timestamps of the indexed events (seconds since the epoch) in index order
+
+    latitudes_ : numpy.ndarray<float>
+        latitudes of the indexed events in index order
+
+    longitudes_ : numpy.ndarray<float>
+        longitudes of the indexed events in index order
+
+    owners_ : numpy.ndarray<int>
+        for each indexed event, the position in trace_ids_ of its trace
+
+    event_indices_ : numpy.ndarray<int>
+        for each indexed event, its index in its trace
+
+    keys_ : numpy.ndarray<int>
+        sorted cell key of each indexed event
+
+    Notes
+    -----
+        - The used distance is the euclidean distance.
+        - Building the index costs O(n log(n)), a query costs O(log(n)) per visited
+          grid row plus the number of events in the visited cells.
+    """
+
+    def __init__(self,cell_size=0.001,time_bucket=300) :
+        self.cell_size=cell_size
+        self.time_bucket=time_bucket
+
+    def fit(self,traces) :
+        """
+        Build the index over a set of traces.
+
+        Parameters
+        ----------
+        traces : dict<id,Trace> or list<Trace>
+            the traces to index, when a list is given the identifier of
+            a trace is its position in the list
+
+        Returns
+        -------
+        self : Spatio_temporal_index
+            the built index
+        """
+
+        if (isinstance(traces,dict)) : items=list(traces.items())
+        else : items=list(enumerate(traces))
+
+        self.trace_ids_=[trace_id for trace_id,trace in items]
+        timestamps,latitudes,longitudes,owners,event_indices=[],[],[],[],[]
+        for owner,(trace_id,trace) in enumerate(items) :
+            trace_timestamps,trace_latitudes,trace_longitudes=trace.to_arrays()
+            timestamps.append(trace_timestamps)
+            latitudes.append(trace_latitudes)
+            longitudes.append(trace_longitudes)
+            owners.append(np.full(len(trace_timestamps),owner,dtype=np.int64))
+            event_indices.append(np.arange(len(trace_timestamps),dtype=np.int64))
+
+        timestamps=np.concatenate(timestamps) if timestamps else np.empty(0)
+        latitudes=np.concatenate(latitudes) if latitudes else np.empty(0)
+        longitudes=np.concatenate(longitudes) if longitudes else np.empty(0)
+        owners=np.concatenate(owners) if owners else np.empty(0,dtype=np.int64)
+        event_indices=np.concatenate(event_indices) if event_indices else np.empty(0,dtype=np.int64)
+
+        if (len(timestamps)>0) :
+            self._origin=(timestamps.min(),latitudes.min(),longitudes.min())
+        else :
+            self._origin=(0.,0.,0.)
+        buckets,rows,columns=self._cells(timestamps,latitudes,longitudes)
+        self._rows_count=int(rows.max())+1 if len(rows) else 1
+        self._columns_count=int(columns.max())+1 if len(columns) else 1
+        self._buckets_count=int(buckets.max())+1 if len(buckets) else 1
+
+        keys=self._keys(buckets,rows,columns)
+        order=np.argsort(keys,kind='mergesort')
+        self.keys_=keys[order]
+        self.timestamps_=timestamps[order]
+        self.latitudes_=latitudes[order]
+        self.longitudes_=longitudes[order]
+        self.owners_=owners[order]
+        self.event_indices_=event_indices[order]
+        return self
+
+    def _cells(self,timestamps,latitudes,longitudes) :
+        """
+        Return the (time bucket, latitude row, longitude column) of each given event.
+        """
+
+        origin_time,origin_latitude,origin_longitude=self._origin
+        buckets=np.floor((np.asarray(timestamps)-origin_time)/self.time_bucket).astype(np.int64)
+        rows=np.floor((np.asarray(latitudes)-origin_latitude)/self.cell_size).astype(np.int64)
+        columns=np.floor((np.asarray(longitudes)-origin_longitude)/self.cell_size).astype(np.int64)
+        return buckets,rows,columns
+
+    def _keys(self,buckets,rows,columns) :
+        """
+        Return the key of each given cell, consecutive columns of a row have consecutive keys.
+        """
+
+        return (buckets*self._rows_count+rows)*self._columns_count+columns
+
+    def _window(self,first_buckets,last_buckets,first_rows,last_rows,first_columns,last_columns) :
+        """
+        Return the indices (in index order) of the events in the given windows of the grid,
+        the k-th window covers the buckets [first_buckets[k],last_buckets[k]], the rows
+        [first_rows[k],last_rows[k]] and the columns [first_columns[k],last_columns[k]].
+        """
+
+        first_buckets=np.maximum(first_buckets,0)
+        last_buckets=np.minimum(last_buckets,self._buckets_count-1)
+        first_rows=np.maximum(first_rows,0)
+        last_rows=np.minimum(last_rows,self._rows_count-1)
+        first_columns=np.maximum(first_columns,0)
+        last_columns=np.minimum(last_columns,self._columns_count-1)
+
+        bucket_spans=np.maximum(last_buckets-first_buckets+1,0)
+        row_spans=np.maximum(last_rows-first_rows+1,0)
+        column_valid=last_columns>=first_columns
+        spans=bucket_spans*row_spans*column_valid
+        if (spans.sum()==0) : return np.empty(0,dtype=np.int64)
+
+        windows=np.repeat(np.arange(len(spans)),spans)
+        offsets=np.arange(spans.sum())-np.repeat(np.cumsum(spans)-spans,spans)
+        row_spans=row_spans[windows]
+        buckets=first_buckets[windows]+offsets//row_spans
+        rows=first_rows[windows]+offsets%row_spans
+
+        starts=np.searchsorted(self.keys_,self._keys(buckets,rows,first_columns[windows]),side='left')
+        ends=np.searchsorted(self.keys_,self._keys(buckets,rows,last_columns[windows]),side='right')
+        return _ranges_to_indices(starts,ends)
+
+    def _group(self,indices) :
+        """
+        Group the indices (in index order) by trace.
+        """
+
+        indices=indices[np.lexsort((self.event_indices_[indices],self.owners_[indices]))]
+        boundaries=np.flatnonzero(np.diff(self.owners_[indices]))+1
+        result={}
+        for group in np.split(indices,boundaries) :
+            if (len(group)) : result[self.trace_ids_[self.owners_[group[0]]]]=self.event_indices_[group]
+        return result
+
+    def range_query(self,min_latitude,min_longitude,max_latitude,max_longitude,starting_time=None,ending_time=None) :
+        """
+        Return the events located in a rectangle during a time interval.
+
+        Parameters
+        ----------
+        min_latitude, min_longitude, max_latitude, max_longitude : float
+            the bounds of the rectangle
+
+        starting_time, ending_time : datetime.datetime or float, optional
+            the bounds of the time interval (datetime or seconds since the epoch),
+            None means unbounded
+
+        Returns
+        -------
+        events : dict<id,numpy.ndarray<int>>
+            for each trace having events in the rectangle during the interval,
+            the sorted indices of these events in the trace
+        """
+
+        indices=self._range_indices(min_latitude,min_longitude,max_latitude,max_longitude,_to_timestamp(starting_time),_to_timestamp(ending_time))
+        return self._group(indices)
+
+    def _range_indices(self,min_latitude,min_longitude,max_latitude,max_longitude,starting_time,ending_time) :
+        """
+        Return the indices (in index order) of the events in a rectangle during a time interval.
+        """
+
+        if (len(self.keys_)==0) : return np.empty(0,dtype=np.int64)
+        if (starting_time is None) : starting_time=self.timestamps_.min()
+        if (ending_time is None) : ending_time=self.timestamps_.max()
+        cells=self._cells([starting_time,ending_time],[min_latitude,max_latitude],[min_longitude,max_longitude])
+        (first_bucket,last_bucket),(first_row,last_row),(first_column,last_column)=cells
+        indices=self._window(np.array([first_bucket]),np.array([last_bucket]),np.array([first_row]),np.array([last_row]),np.array([first_column]),np.array([last_column]))
+        latitudes,longitudes,timestamps=self.latitudes_[indices],self.longitudes_[indices],self.timestamps_[indices]
+        inside=((latitudes>=min_latitude)&(latitudes<=max_latitude)&(longitudes>=min_longitude)&(longitudes<=max_longitude)&
+                (timestamps>=starting_time)&(timestamps<=ending_time))
+        return indices[inside]
+
+    def radius_query(self,latitude,longitude,radius,starting_time=None,ending_time=None) :
+        """
+        Return the events located at a distance at most radius of a position during a time interval.
+
+        Parameters
+        ----------
+        latitude, longitude : float
+            the queried position
+
+        radius : float
+            the maximal distance (in euclidean space) to the queried position
+
+        starting_time, ending_time : datetime.datetime or float, optional
+            the bounds of the time interval (datetime or seconds since the epoch),
+            None means unbounded
+
+        Returns
+        -------
+        events : dict<id,numpy.ndarray<int>>
+            for each trace having events in the disc during the interval,
+            the sorted indices of these events in the trace
+        """
+
+        indices=self._range_indices(latitude-radius,longitude-radius,latitude+radius,longitude+radius,_to_timestamp(starting_time),_to_timestamp(ending_time))
+        latitude_differences=self.latitudes_[indices]-latitude
+        longitude_differences=self.longitudes_[indices]-longitude
+        inside=latitude_differences*latitude_differences+longitude_differences*longitude_differences<=radius*radius
+        return self._group(indices[inside])
+
+    def encounters(self,radius,maximum_time_difference=60,trace_id=None,starting_time=None,ending_time=None) :
+        """
+        Return the encounters, i.e. the pairs of events of two different traces which
+        are at a distance at most radius and which time difference is at most
+        maximum_time_difference.
+
+        The grid is swept by increasing cell key, the events of a cell are only compared
+        with the events which follow them in the index and which are in the neighbooring
+        cells of the same and the following time buckets. Thus each pair is generated once
+        and the cost depends on the local density and on the output size, not on the product
+        of the traces lengths.
+
+        Parameters
+        ----------
+        radius : float
+            the maximal distance (in euclidean space) between the two events
+
+        maximum_time_difference : float, optional
+            the maximal time difference in seconds between the two events, default value is 60
+
+        trace_id : id, optional
+            if given, only the encounters with this trace are returned (contact tracing)
+
+        starting_time, ending_time : datetime.datetime or float, optional
+            the bounds of the time interval (datetime or seconds since the epoch),
+            None means unbounded
+
+        Returns
+        -------
+        encounters : list<tuple>
+            a list of tuples (trace_id_a, event_index_a, trace_id_b, event_index_b, distance)
+            sorted by the time of the first event, when trace_id is given trace_id_a is always trace_id
+        """
+
+        events_count=len(self.keys_)
+        if (events_count==0) : return []
+
+        starting_time,ending_time=_to_timestamp(starting_time),_to_timestamp(ending_time)
+        selected=np.ones(events_count,dtype=bool)
+        if (starting_time is not None) : selected&=self.timestamps_>=starting_time
+        if (ending_time is not None) : selected&=self.timestamps_<=ending_time
+
+        if (trace_id is not None) :
+            if (trace_id not in self.trace_ids_) : return []
+            queried_owner=self.trace_ids_.index(trace_id)
+            sources=selected&(self.owners_==queried_owner)
+        else :
+            queried_owner=None
+            sources=selected
+
+        buckets_range=int(np.ceil(float(maximum_time_difference)/self.time_bucket))
+        cells_range=int(np.ceil(float(radius)/self.cell_size))
+        radius_sqr=radius*radius
+
+        source_indices=np.flatnonzero(sources)
+        source_keys=self.keys_[source_indices]
+        boundaries=np.flatnonzero(np.diff(source_keys))+1
+        groups=np.split(source_indices,boundaries)
+        group_keys=source_keys[np.concatenate(([0],boundaries))]
+        group_columns=group_keys%self._columns_count
+        group_rows=(group_keys//self._columns_count)%self._rows_count
+        group_buckets=group_keys//(self._columns_count*self._rows_count)
+
+        first_event_ids,second_event_ids,distances=[],[],[]
+        for group,bucket,row,column in zip(groups,group_buckets,group_rows,group_columns) :
+            first_bucket=bucket if queried_owner is None else bucket-buckets_range
+            candidates=self._window(np.array([first_bucket]),np.array([bucket+buckets_range]),
+                                    np.array([row-cells_range]),np.array([row+cells_range]),
+                                    np.array([column-cells_range]),np.array([column+cells_range]))
+            candidates=candidates[selected[candidates]]
+            if (len(candidates)==0) : continue
+
+            latitude_differences=self.latitudes_[group][:,None]-self.latitudes_[candidates][None,:]
+            longitude_differences=self.longitudes_[group][:,None]-self.longitudes_[candidates][None,:]
+            distances_sqr=latitude_differences*latitude_differences+longitude_differences*longitude_differences
+            matches=((distances_sqr<=radius_sqr)&
+                     (np.abs(self.timestamps_[group][:,None]-self.timestamps_[candidates][None,:])<=maximum_time_difference)&
+                     (self.owners_[group][:,None]!=self.owners_[candidates][None,:]))
+            if (queried_owner is None) : matches&=group[:,None]<candidates[None,:]
+            first,second=np.nonzero(matches)
+            first_event_ids.append(group[first])
+            second_event_ids.append(candidates[second])
+            distances.append(np.sqrt(distances_sqr[first,second]))
+
+        if (not first_event_ids) : return []
+        first_event_ids=np.concatenate(first_event_ids)
+        second_event_ids=np.concatenate(second_event_ids)
+        distances=np.concatenate(distances)
+        order=np.argsort(self.timestamps_[first_event_ids],kind='mergesort')
+
+        trace_ids,owners,event_indices=self.trace_ids_,self.owners_,self.event_indices_
+        return [(trace_ids[owners[first]],int(event_indices[first]),trace_ids[owners[second]],int(event_indices[second]),float(distance))
+                for first,second,distance in zip(first_event_ids[order],second_event_ids[order],distances[order])]
@@ -0,0 +1,2 @@
+from road_network import Road_network,read_edge_CSV,read_OSM
+from hmm_map_matching import Map_matching
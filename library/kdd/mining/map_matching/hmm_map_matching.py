@@ -0,0 +1,232 @@
+"""
+Hidden Markov Model map matching
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import numpy as np
+
+from ....model import Trace,Event,Columnar_trace,geodesic_distances
+from ....instrumentation import stage,count
+
+
+def _best_candidates(positions,edges,fractions,distances,maximum_candidates) :
+    """
+    Keep the maximum_candidates closest candidates of each position, the candidates
+    are returned ordered by position then by distance.
+    """
+
+    order=np.lexsort((distances,positions))
+    positions,edges,fractions,distances=positions[order],edges[order],fractions[order],distances[order]
+    firsts=np.searchsorted(positions,positions,side='left')
+    kept=np.arange(len(positions))-firsts<maximum_candidates
+    return positions[kept],edges[kept],fractions[kept],distances[kept]
+
+def _route_distances(network,previous_edges,previous_fractions,edges,fractions,cutoff) :
+    """
+    Return the matrix of the road distances from the previous candidates (rows) to the
+    candidates (columns), inf when the road distance exceeds the cutoff.
+    """
+
+    lengths=network.lengths
+    # from the previous projection to the end of its edge, then from the beginning of the edge to the projection
+    leaving=(1-previous_fractions)*lengths[previous_edges]
+    entering=fractions*lengths[edges]
+    entry_nodes=network.sources[edges].tolist()
+    exit_nodes=network.targets[previous_edges]
+    node_distances=np.empty((len(previous_edges),len(edges)))
+    for node in np.unique(exit_nodes).tolist() :
+        reached=network.shortest_distances(node,cutoff)
+        node_distances[exit_nodes==node]=[reached.get(entry_node,np.inf) for entry_node in entry_nodes]
+    routes=leaving[:,None]+node_distances+entering[None,:]
+    # move on the same edge, backward moves are allowed (GPS error of events close to each other)
+    same_edge=previous_edges[:,None]==edges[None,:]
+    along=np.abs(fractions[None,:]-previous_fractions[:,None])*lengths[edges][None,:]
+    return np.where(same_edge,np.minimum(along,routes),routes)
+
+def _backtrack(chain,last_scores) :
+    """
+    Return the (event index, candidate index) of the most likely path of a chain of
+    Viterbi steps (event index, edges, fractions, back pointers).
+    """
+
+    path=[]
+    candidate=int(np.argmax(last_scores))
+    for index,edges,fractions,back_pointers in reversed(chain) :
+        path.append((index,candidate))
+        if (back_pointers is not None) : candidate=int(back_pointers[candidate])
+    path.reverse()
+    return path
+
+
+class Map_matching :
+    """
+    Match the trace on a road network with a Hidden Markov Model (Newson and Krumm) :
+    the hidden states of an event are its projections on the edges closer than
+    search_radius (the candidates), the emission probability of a candidate decreases
+    with its distance to the event (gaussian GPS error) and the transition probability
+    between the candidates of two consecutive events decreases with the difference
+    between their road distance and the distance between the two events (exponential).
+    The most likely sequence of candidates is computed by the Viterbi algorithm.
+
+    Parameters
+    ----------
+    network : Road_network
+        the road network (see read_edge_CSV and read_OSM)
+
+    search_radius : float, optional
+        the maximum distance in meter between an event and its candidates,
+        default value is 50
+
+    maximum_candidates : int, optional
+        the maximum number of candidates of an event (the closest ones),
+        default value is 8
+
+    sigma : float, optional
+        the standard deviation of the GPS error in meter, default value is 5
+
+    beta : float, optional
+        the scale in meter of the difference between the road distance and the
+        distance between two consecutive events, default value is 30
+
+    maximum_detour : float, optional
+        the road distances longer than maximum_detour times the distance between
+        the events (plus twice search_radius) are impossible, default value is 3
+
+    Attributes
+    ----------
+    matched_trace_ : Trace
+        the matched events, moved on their road (the events without candidate are removed)
+
+    matched_mask_ : numpy.ndarray<bool>
+        True for each matched event of the trace
+
+    edges_ : numpy.ndarray<int>
+        the matched edge of each event of the trace (-1 if it is not matched)
+
+    route_length_ : float
+        the road distance in meter along the matched edges
+
+    breaks_ : int
+        the number of times the matching restarted because no road path joins the
+        candidates of two consecutive events
+
+    Notes
+    -----
+        - The candidates of all the events are searched at once in the edge index and
+          the transitions between two events are computed as a matrix.
+        - The shortest path distances are cached by the network (see Road_network) and
+          the Dijkstra cutoff follows the distance between the events, thus, the sparse
+          events of a compressed trace (see RDP_compression) are matched as well.
+        - Backward moves on an edge are allowed (GPS error of close events), they are
+          counted in route_length_ : compressing the trace first removes this jitter.
+        - A Columnar_trace is matched directly on its arrays and the result is a Columnar_trace.
+    """
+
+    # the matching works directly on the arrays of a Columnar_trace (see Pipeline)
+    _columnar=True
+
+    def __init__(self,network,search_radius=50.,maximum_candidates=8,sigma=5.,beta=30.,maximum_detour=3.) :
+        self.network=network
+        self.search_radius=search_radius
+        self.maximum_candidates=maximum_candidates
+        self.sigma=sigma
+        self.beta=beta
+        self.maximum_detour=maximum_detour
+
+    def _viterbi(self,latitudes,longitudes) :
+        """
+        Return the matched (event index, edge, fraction) of the events, the road distance
+        along them and the number of breaks.
+        """
+
+        network=self.network
+        positions,edges,fractions,distances=network.candidates(latitudes,longitudes,self.search_radius)
+        positions,edges,fractions,distances=_best_candidates(positions,edges,fractions,distances,self.maximum_candidates)
+        boundaries=np.searchsorted(positions,np.arange(len(latitudes)+1))
+        emissions=-0.5*(distances/self.sigma)**2
+
+        matched=[]
+        route_length=0.
+        breaks=0
+        chain=[]
+        scores=None
+        routes=[]
+        previous=None
+        for index in range(len(latitudes)) :
+            start,end=boundaries[index],boundaries[index+1]
+            if (start==end) : continue
+            candidate_edges,candidate_fractions=edges[start:end],fractions[start:end]
+            back_pointers=None
+            if (previous is not None) :
+                straight=float(geodesic_distances(latitudes[previous],longitudes[previous],latitudes[index],longitudes[index]))
+                cutoff=self.maximum_detour*straight+2*self.search_radius
+                route_matrix=_route_distances(network,chain[-1][1],chain[-1][2],candidate_edges,candidate_fractions,cutoff)
+                transitions=np.where(route_matrix<=cutoff,-np.abs(route_matrix-straight)/self.beta,-np.inf)
+                totals=scores[:,None]+transitions
+                back_pointers=np.argmax(totals,axis=0)
+                best=totals[back_pointers,np.arange(len(candidate_edges))]
+                if (np.isfinite(best).any()) :
+                    routes.append(route_matrix[back_pointers,np.arange(len(candidate_edges))])
+                    scores=best+emissions[start:end]
+                else :
+                    # no road path : the chain ends and a new one begins
+                    route_length+=self._close_chain(chain,scores,routes,matched)
+                    breaks+=1
+                    chain,routes,back_pointers=[],[],None
+            if (back_pointers is None) : scores=emissions[start:end].copy()
+            chain.append((index,candidate_edges,candidate_fractions,back_pointers))
+            previous=index
+        if (chain) : route_length+=self._close_chain(chain,scores,routes,matched)
+        return matched,route_length,breaks
+
+    def _close_chain(self,chain,scores,routes,matched) :
+        """
+        Backtrack a chain, add its (event index, edge, fraction) to matched and return its road distance.
+        """
+
+        path=_backtrack(chain,scores)
+        length=0.
+        for step,(index,candidate) in enumerate(path) :
+            matched.append((index,int(chain[step][1][candidate]),float(chain[step][2][candidate])))
+            if (step>0) : length+=float(routes[step-1][candidate])
+        return length
+
+    def fit(self,trace) :
+        """
+        Match the trace on the road network.
+
+        Parameters
+        ----------
+        trace : Trace
+            A Trace object (see Trace in Model)
+
+        Returns
+        -------
+        matched_trace_ : Trace
+            the matched events moved on their road.
+        """
+
+        with stage("Map_matching",len(trace)) as record :
+            timestamps,latitudes,longitudes=trace.to_arrays()
+            misses=self.network.misses
+            matched,self.route_length_,self.breaks_=self._viterbi(latitudes,longitudes)
+            count("map_matching.shortest_path_computations",self.network.misses-misses)
+            indices=np.array([index for index,edge,fraction in matched],dtype=np.int64)
+            edges=np.array([edge for index,edge,fraction in matched],dtype=np.int64)
+            fractions=np.array([fraction for index,edge,fraction in matched])
+            self.edges_=np.full(len(timestamps),-1,dtype=np.int64)
+            self.edges_[indices]=edges
+            self.matched_mask_=self.edges_>=0
+            network=self.network
+            sources,targets=network.sources[edges],network.targets[edges]
+            matched_latitudes=network.latitudes[sources]+fractions*(network.latitudes[targets]-network.latitudes[sources])
+            matched_longitudes=network.longitudes[sources]+fractions*(network.longitudes[targets]-network.longitudes[sources])
+            if (isinstance(trace,Columnar_trace)) :
+                self.matched_trace_=Columnar_trace(timestamps[indices],matched_latitudes,matched_longitudes,copy=False)
+            else :
+                self.matched_trace_=Trace()
+                self.matched_trace_.add_events(*[Event(trace[index].datetime,latitude,longitude)
+                                                 for index,latitude,longitude in zip(indices.tolist(),matched_latitudes.tolist(),matched_longitudes.tolist())])
+            record.events_out=len(self.matched_trace_)
+        return self.matched_trace_
@@ -0,0 +1,300 @@
+"""
+Road network with a spatial index of its edges and cached shortest paths
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import csv
+import heapq
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from ....model import geodesic_distances
+from ....model.const import Const
+
+_METERS_PER_DEGREE=math.pi/180*Const().earth_radius
+
+
+def _ranges_to_indices(starts,ends) :
+    """
+    Concatenate the index ranges [starts[k],ends[k]) in one array without any python loop,
+    and return the range of each index.
+    """
+
+    lengths=ends-starts
+    total=int(lengths.sum())
+    if (total==0) : return np.empty(0,dtype=np.int64),np.empty(0,dtype=np.int64)
+    offsets=np.cumsum(lengths)-lengths
+    ranges=np.repeat(np.arange(len(starts)),lengths)
+    return np.repeat(starts-offsets,lengths)+np.arange(total),ranges
+
+
+class Road_network :
+    """
+    Directed road graph : the nodes are positions and the edges are straight road
+    segments between two nodes (a two-way road is two edges). The edges are indexed
+    in a grid of cells (as in Spatio_temporal_index) and the shortest path distances
+    from a node are cached.
+
+    Parameters
+    ----------
+    latitudes, longitudes : array-like<float>
+        the position of each node
+
+    sources, targets : array-like<int>
+        the source node and the target node (indices) of each edge
+
+    cell_size : float, optional
+        the size of a cell of the edge index (in euclidean space), default value is
+        0.001 (approximately 111.32 meters), the search of the candidates is the fastest
+        when it is close to the search radius of the map matching
+
+    cache_size : int, optional
+        the number of source nodes whose shortest path distances are cached,
+        default value is 10000
+
+    Attributes
+    ----------
+    node_ids : list, optional
+        the identifier of each node (the one of the file it was read from)
+
+    lengths : numpy.ndarray<float>
+        the length of each edge in meter
+
+    hits, misses : int
+        the number of shortest path requests answered by the cache or computed
+    """
+
+    def __init__(self,latitudes,longitudes,sources,targets,cell_size=0.001,cache_size=10000,node_ids=None) :
+        self.latitudes=np.asarray(latitudes,dtype=np.float64)
+        self.longitudes=np.asarray(longitudes,dtype=np.float64)
+        self.sources=np.asarray(sources,dtype=np.int64)
+        self.targets=np.asarray(targets,dtype=np.int64)
+        self.node_ids=node_ids
+        self.cell_size=cell_size
+        self.cache_size=cache_size
+        self.lengths=geodesic_distances(self.latitudes[self.sources],self.longitudes[self.sources],
+                                        self.latitudes[self.targets],self.longitudes[self.targets])
+        self._build_adjacency()
+        self._build_index()
+        self._cache=OrderedDict()
+        self.hits=0
+        self.misses=0
+
+    def __len__(self) :
+        return len(self.sources)
+
+    def _build_adjacency(self) :
+        # compressed sparse rows : the edges leaving node u are _edges[_starts[u]:_starts[u+1]]
+        self._edges=np.argsort(self.sources,kind='mergesort')
+        self._starts=np.searchsorted(self.sources[self._edges],np.arange(len(self.latitudes)+1))
+        self._adjacency=[list(zip(self.targets[self._edges[start:end]].tolist(),self.lengths[self._edges[start:end]].tolist()))
+                         for start,end in zip(self._starts[:-1],self._starts[1:])]
+
+    def _cells(self,latitudes,longitudes) :
+        return np.floor(latitudes/self.cell_size).astype(np.int64),np.floor(longitudes/self.cell_size).astype(np.int64)
+
+    def _key(self,rows,columns) :
+        return rows*self._columns_count+(columns-self._first_column)
+
+    def _build_index(self) :
+        """
+        Register each edge in the cells overlapped by its bounding box, the (cell key,
+        edge) pairs are sorted by key.
+        """
+
+        source_rows,source_columns=self._cells(self.latitudes[self.sources],self.longitudes[self.sources])
+        target_rows,target_columns=self._cells(self.latitudes[self.targets],self.longitudes[self.targets])
+        first_rows,last_rows=np.minimum(source_rows,target_rows),np.maximum(source_rows,target_rows)
+        first_columns,last_columns=np.minimum(source_columns,target_columns),np.maximum(source_columns,target_columns)
+        self._first_column=int(first_columns.min())-1 if len(self) else 0
+        self._columns_count=int(last_columns.max())-self._first_column+2 if len(self) else 1
+        heights,widths=last_rows-first_rows+1,last_columns-first_columns+1
+        cells,edges=_ranges_to_indices(np.zeros(len(self),dtype=np.int64),heights*widths)
+        rows=first_rows[edges]+cells//widths[edges]
+        columns=first_columns[edges]+cells%widths[edges]
+        keys=self._key(rows,columns)
+        order=np.argsort(keys,kind='mergesort')
+        self._keys,self._indexed_edges=keys[order],edges[order]
+
+    def candidates(self,latitudes,longitudes,radius) :
+        """
+        Return the projections of positions on the edges closer than radius meters
+        (vectorized over the positions and the edges).
+
+        Parameters
+        ----------
+        latitudes, longitudes : numpy.ndarray<float>
+            the positions
+
+        radius : float
+            the search radius in meter
+
+        Returns
+        -------
+        positions : numpy.ndarray<int>
+            the position of each candidate
+
+        edges : numpy.ndarray<int>
+            the edge of each candidate
+
+        fractions : numpy.ndarray<float>
+            the location of the projection on the edge (0 at the source, 1 at the target)
+
+        distances : numpy.ndarray<float>
+            the distance in meter between the position and its projection
+        """
+
+        rows,columns=self._cells(latitudes,longitudes)
+        # the cells around a position covering the search radius
+        if (len(latitudes)==0) : return (np.empty(0,dtype=np.int64),)*2+(np.empty(0),)*2
+        row_cells=int(math.ceil(radius/(self.cell_size*_METERS_PER_DEGREE)))
+        column_cells=int(math.ceil(radius/(self.cell_size*_METERS_PER_DEGREE*max(math.cos(math.radians(np.abs(latitudes).max())),1e-6))))
+        positions,edges=[],[]
+        for row_offset in range(-row_cells,row_cells+1) :
+            for column_offset in range(-column_cells,column_cells+1) :
+                keys=self._key(rows+row_offset,columns+column_offset)
+                starts=np.searchsorted(self._keys,keys,side='left')
+                ends=np.searchsorted(self._keys,keys,side='right')
+                # the keys of the columns outside the indexed ones are the ones of other rows
+                outside=(columns+column_offset<=self._first_column)|(columns+column_offset>=self._first_column+self._columns_count-1)
+                ends[outside]=starts[outside]
+                indices,ranges=_ranges_to_indices(starts,ends)
+                positions.append(ranges)
+                edges.append(self._indexed_edges[indices])
+        positions,edges=np.concatenate(positions),np.concatenate(edges)
+        # an edge may be found in several cells around a position
+        pairs=np.unique(positions*len(self)+edges)
+        positions,edges=pairs//max(len(self),1),pairs%max(len(self),1)
+
+        # projection in the local plane of each position (equirectangular, in meter)
+        scale=np.cos(np.radians(latitudes[positions]))
+        source_x=(self.longitudes[self.sources[edges]]-longitudes[positions])*scale*_METERS_PER_DEGREE
+        source_y=(self.latitudes[self.sources[edges]]-latitudes[positions])*_METERS_PER_DEGREE
+        target_x=(self.longitudes[self.targets[edges]]-longitudes[positions])*scale*_METERS_PER_DEGREE
+        target_y=(self.latitudes[self.targets[edges]]-latitudes[positions])*_METERS_PER_DEGREE
+        edge_x,edge_y=target_x-source_x,target_y-source_y
+        squared_lengths=edge_x*edge_x+edge_y*edge_y
+        with np.errstate(divide='ignore',invalid='ignore') :
+            fractions=np.clip(np.where(squared_lengths>0,-(source_x*edge_x+source_y*edge_y)/squared_lengths,0.),0.,1.)
+        distances=np.hypot(source_x+fractions*edge_x,source_y+fractions*edge_y)
+        close=distances<=radius
+        return positions[close],edges[close],fractions[close],distances[close]
+
+    def shortest_distances(self,source,cutoff) :
+        """
+        Return the shortest path distances in meter from a node to the nodes closer
+        than cutoff meters (Dijkstra). The results are cached by source node (least
+        recently used first evicted), a cached result is reused if it was computed
+        with a cutoff at least as large.
+
+        Returns
+        -------
+        distances : dict<int,float>
+            the distance of each reached node
+        """
+
+        cached=self._cache.get(source)
+        if (cached is not None and cached[0]>=cutoff) :
+            self.hits+=1
+            del self._cache[source]
+            self._cache[source]=cached
+            return cached[1]
+        self.misses+=1
+        distances={source:0.}
+        heap=[(0.,source)]
+        adjacency=self._adjacency
+        while heap :
+            distance,node=heapq.heappop(heap)
+            if (distance>distances[node]) : continue
+            for target,length in adjacency[node] :
+                target_distance=distance+length
+                if (target_distance<=cutoff and target_distance<distances.get(target,float('inf'))) :
+                    distances[target]=target_distance
+                    heapq.heappush(heap,(target_distance,target))
+        self._cache.pop(source,None)
+        self._cache[source]=(cutoff,distances)
+        if (len(self._cache)>self.cache_size) : self._cache.popitem(last=False)
+        return distances
+
+
+def read_edge_CSV(csv_file,cell_size=0.001,cache_size=10000) :
+    """
+    Read a road network from a CSV file of edges (';' delimited) having the columns
+    source, source_latitude, source_longitude, target, target_latitude, target_longitude
+    and optionally oneway (1 : the edge goes from source to target only, 0 by default :
+    the road is two-way).
+
+    Returns
+    -------
+    network : Road_network
+        the road network (see Road_network for cell_size and cache_size)
+    """
+
+    nodes=OrderedDict()
+    sources,targets=[],[]
+    with open(csv_file,'rb') as edge_file :
+        for row in csv.DictReader(edge_file,delimiter=';') :
+            source=nodes.setdefault(row["source"],(len(nodes),float(row["source_latitude"]),float(row["source_longitude"])))[0]
+            target=nodes.setdefault(row["target"],(len(nodes),float(row["target_latitude"]),float(row["target_longitude"])))[0]
+            sources.append(source)
+            targets.append(target)
+            if (row.get("oneway","0").strip() not in ('1','yes','true')) :
+                sources.append(target)
+                targets.append(source)
+    return _network(nodes,sources,targets,cell_size,cache_size)
+
+def read_OSM(osm_file,highways=None,cell_size=0.001,cache_size=10000) :
+    """
+    Read the road network of an OSM XML extract (.osm) : the ways having a highway tag
+    are split in edges between their consecutive nodes, the oneway tag is respected.
+
+    Parameters
+    ----------
+    osm_file : string or file
+        the OSM extract
+
+    highways : set<string>, optional
+        the highway types kept (e.g. {'primary','secondary','residential'}), all by default
+
+    Returns
+    -------
+    network : Road_network
+        the road network (see Road_network for cell_size and cache_size)
+    """
+
+    from xml.etree.cElementTree import iterparse
+
+    positions={}
+    ways=[]
+    for event,element in iterparse(osm_file) :
+        if (element.tag=='node') :
+            positions[element.get('id')]=(float(element.get('lat')),float(element.get('lon')))
+            element.clear()
+        elif (element.tag=='way') :
+            tags=dict((tag.get('k'),tag.get('v')) for tag in element.iter('tag'))
+            if ('highway' in tags and (highways is None or tags['highway'] in highways)) :
+                ways.append(([node.get('ref') for node in element.iter('nd')],tags.get('oneway','no')))
+            element.clear()
+    nodes=OrderedDict()
+    sources,targets=[],[]
+    for references,oneway in ways :
+        references=[reference for reference in references if reference in positions]
+        if (oneway=='-1') : references.reverse()
+        for source,target in zip(references[:-1],references[1:]) :
+            source=nodes.setdefault(source,(len(nodes),)+positions[source])[0]
+            target=nodes.setdefault(target,(len(nodes),)+positions[target])[0]
+            sources.append(source)
+            targets.append(target)
+            if (oneway not in ('yes','true','1','-1')) :
+                sources.append(target)
+                targets.append(source)
+    return _network(nodes,sources,targets,cell_size,cache_size)
+
+def _network(nodes,sources,targets,cell_size,cache_size) :
+    values=list(nodes.values())
+    latitudes=[value[1] for value in values]
+    longitudes=[value[2] for value in values]
+    return Road_network(latitudes,longitudes,sources,targets,cell_size=cell_size,cache_size=cache_size,node_ids=list(nodes.keys()))
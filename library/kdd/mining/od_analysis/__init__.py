@@ -0,0 +1 @@
+from od_matrix import OD_extraction,OD_matrix,merge_od_matrices
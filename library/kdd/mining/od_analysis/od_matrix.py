@@ -0,0 +1,328 @@
+"""
+Origin-destination trips extraction and OD-matrix aggregation
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import numpy as np
+
+from ....model import Trip,datetime_to_timestamp
+
+
+def _assign_zones(latitudes,longitudes,zones=None,cell_size=0.01) :
+    """
+    Assign each position to a zone.
+
+    Parameters
+    ----------
+    latitudes, longitudes : numpy.ndarray<float>
+        the positions to assign
+
+    zones : list<Position>, optional
+        the centers of user-supplied zones, each position is assigned to the nearest
+        center (in euclidean space). If None, the zones are the cells of a regular grid
+
+    cell_size : float, optional
+        used only when zones is None, the size of a grid cell (in euclidean space)
+        default value is 0.01 (approximately 1.113 kilometers)
+
+    Returns
+    -------
+    zone_codes : numpy.ndarray<int>
+        a 2D-array with one row per position, the row is (grid row, grid column)
+        for the grid zones and (index of the zone center,) for user-supplied zones
+    """
+
+    latitudes,longitudes=np.asarray(latitudes,dtype=np.float64),np.asarray(longitudes,dtype=np.float64)
+    if (zones is None) :
+        rows=np.floor(latitudes/cell_size).astype(np.int64)
+        columns=np.floor(longitudes/cell_size).astype(np.int64)
+        return np.column_stack((rows,columns))
+
+    zones_latitudes=np.array([zone.latitude for zone in zones],dtype=np.float64)
+    zones_longitudes=np.array([zone.longitude for zone in zones],dtype=np.float64)
+    latitude_differences=latitudes[:,None]-zones_latitudes[None,:]
+    longitude_differences=longitudes[:,None]-zones_longitudes[None,:]
+    nearest=np.argmin(latitude_differences*latitude_differences+longitude_differences*longitude_differences,axis=1)
+    return nearest.reshape(-1,1).astype(np.int64)
+
+def _zone_from_code(code,zones) :
+    """
+    Return the zone identifier corresponding to a row of zone codes :
+    a (grid row, grid column) tuple for the grid zones, and the index of the
+    zone center for user-supplied zones (two zones never share an identifier,
+    their labels may, see OD_extraction.zone_label).
+    """
+
+    if (zones is None) : return (int(code[0]),int(code[1]))
+    return int(code[0])
+
+def _extract_trips(trace,stay_points,zones=None,cell_size=0.01,time_bucket=3600) :
+    """
+    Derive the trips between consecutive stay points of a trace, assign their
+    origins and destinations to zones and compute their time-of-day buckets.
+
+    Parameters
+    ----------
+    trace : Trace
+        A Trace object (see Trace in Model), the trace from which the stay points are detected
+
+    stay_points : list<Stay_point>
+        the stay points of the trace ordered by time (see Stay_points in poi_detection)
+
+    zones : list<Position>, optional
+        the centers of user-supplied zones, if None the zones are the cells of a regular grid
+
+    cell_size : float, optional
+        used only when zones is None, the size of a grid cell (in euclidean space)
+
+    time_bucket : float, optional
+        the size of the time-of-day buckets in seconds, default value is 3600
+
+    Returns
+    -------
+    trips : list<Trip>
+        the trips (see Trip in Model)
+
+    buckets : numpy.ndarray<int>
+        the time-of-day bucket of the departure of each trip
+
+    origin_codes, destination_codes : numpy.ndarray<int>
+        the zone codes of the origin and of the destination of each trip
+
+    Notes
+    -----
+    The computational complexity is O(n + m log(n)) where n is the size of the
+    trace and m the number of stay points.
+    """
+
+    trips_count=max(len(stay_points)-1,0)
+    codes_width=2 if zones is None else 1
+    if (trips_count==0) :
+        empty_codes=np.empty((0,codes_width),dtype=np.int64)
+        return [],np.empty(0,dtype=np.int64),empty_codes,empty_codes
+
+    timestamps,latitudes,longitudes=trace.to_arrays()
+    cumulated_lengths=np.zeros(len(timestamps))
+    if (len(timestamps)>1) :
+        cumulated_lengths[1:]=np.cumsum(np.hypot(np.diff(latitudes),np.diff(longitudes)))
+
+    departures=np.array([datetime_to_timestamp(stay_point.ending_time) for stay_point in stay_points[:-1]])
+    arrivals=np.array([datetime_to_timestamp(stay_point.starting_time) for stay_point in stay_points[1:]])
+    # the departure time is the time of the first event out of the stay point,
+    # the path starts from the last event of the stay point
+    departure_indices=np.clip(np.searchsorted(timestamps,departures,side='left')-1,0,len(timestamps)-1)
+    arrival_indices=np.minimum(np.searchsorted(timestamps,arrivals,side='left'),len(timestamps)-1)
+    path_lengths=cumulated_lengths[arrival_indices]-cumulated_lengths[departure_indices]
+
+    stay_latitudes=np.array([stay_point.latitude for stay_point in stay_points])
+    stay_longitudes=np.array([stay_point.longitude for stay_point in stay_points])
+    stay_codes=_assign_zones(stay_latitudes,stay_longitudes,zones=zones,cell_size=cell_size)
+    origin_codes,destination_codes=stay_codes[:-1],stay_codes[1:]
+    buckets=(np.mod(departures,86400)//time_bucket).astype(np.int64)
+
+    trips=[Trip(stay_points[i],stay_points[i+1],float(path_lengths[i]),
+                origin_zone=_zone_from_code(origin_codes[i],zones),
+                destination_zone=_zone_from_code(destination_codes[i],zones))
+           for i in range(trips_count)]
+    return trips,buckets,origin_codes,destination_codes
+
+
+class OD_matrix :
+    """
+    Sparse origin-destination matrices, one per time-of-day bucket.
+    Partial matrices (e.g. computed in parallel on different traces) are
+    combined with merge or with the + operator.
+
+    Parameters
+    ----------
+    time_bucket : float, optional
+        the size of the time-of-day buckets in seconds, default value is 3600
+
+    Attributes
+    ----------
+    time_bucket : float
+        the size of the time-of-day buckets in seconds
+
+    counts : dict<(int,zone,zone),int>
+        the number of trips for each (time-of-day bucket, origin zone, destination zone),
+        absent keys are zeros
+    """
+
+    def __init__(self,time_bucket=3600) :
+        self.time_bucket=time_bucket
+        self.counts={}
+
+    def accumulate(self,buckets,origin_codes,destination_codes,zones=None) :
+        """
+        Add trips to the matrices (vectorized counting of the distinct OD pairs).
+
+        Parameters
+        ----------
+        buckets : numpy.ndarray<int>
+            the time-of-day bucket of each trip
+
+        origin_codes, destination_codes : numpy.ndarray<int>
+            the zone codes of the origin and of the destination of each trip
+
+        zones : list<Position>, optional
+            the centers of user-supplied zones used to compute the codes (None for grid zones)
+
+        Returns
+        -------
+        self : OD_matrix
+        """
+
+        if (len(buckets)==0) : return self
+        codes_width=origin_codes.shape[1]
+        rows=np.column_stack((buckets,origin_codes,destination_codes))
+        unique_rows,counts=np.unique(rows,axis=0,return_counts=True)
+        for row,count in zip(unique_rows,counts) :
+            key=(int(row[0]),_zone_from_code(row[1:1+codes_width],zones),_zone_from_code(row[1+codes_width:],zones))
+            self.counts[key]=self.counts.get(key,0)+int(count)
+        return self
+
+    def merge(self,other) :
+        """
+        Add the counts of another OD_matrix (in place).
+
+        Parameters
+        ----------
+        other : OD_matrix
+            a matrix computed with the same time_bucket
+
+        Returns
+        -------
+        self : OD_matrix
+        """
+
+        if (other.time_bucket!=self.time_bucket) : raise Exception("time_bucket of the merged matrices differs")
+        for key,count in other.counts.items() :
+            self.counts[key]=self.counts.get(key,0)+count
+        return self
+
+    def __add__(self,other) :
+        result=OD_matrix(self.time_bucket)
+        result.merge(self)
+        result.merge(other)
+        return result
+
+    def buckets(self) :
+        """
+        Return the sorted list of the time-of-day buckets having at least one trip.
+        """
+
+        return sorted(set(key[0] for key in self.counts))
+
+    def matrix(self,bucket=None) :
+        """
+        Return the sparse OD matrix of a time-of-day bucket.
+
+        Parameters
+        ----------
+        bucket : int, optional
+            the time-of-day bucket, if None the matrix of the whole day is returned
+
+        Returns
+        -------
+        matrix : dict<(zone,zone),int>
+            the number of trips for each (origin zone, destination zone)
+        """
+
+        matrix={}
+        for (key_bucket,origin_zone,destination_zone),count in self.counts.items() :
+            if (bucket is None or key_bucket==bucket) :
+                matrix[(origin_zone,destination_zone)]=matrix.get((origin_zone,destination_zone),0)+count
+        return matrix
+
+    def __len__(self) :
+        return len(self.counts)
+
+def merge_od_matrices(matrices) :
+    """
+    Merge partial OD matrices (e.g. the results of parallel workers).
+
+    Parameters
+    ----------
+    matrices : iterable<OD_matrix>
+        matrices computed with the same time_bucket
+
+    Returns
+    -------
+    od_matrix : OD_matrix
+        the sum of the matrices
+    """
+
+    result=None
+    for matrix in matrices :
+        if (result is None) : result=OD_matrix(matrix.time_bucket)
+        result.merge(matrix)
+    return result if result is not None else OD_matrix()
+
+
+class OD_extraction :
+    """
+    Derive the trips between the stay points of a trace and accumulate them in
+    sparse OD matrices per time-of-day bucket.
+
+    Parameters
+    ----------
+    zones : list<Position>, optional
+        the centers of user-supplied zones (e.g. a list of Stay_point), each origin and
+        destination is assigned to the nearest center and the zone is identified by the
+        index of its center in the list (see zone_label). If None (default), the zones are
+        the cells of a regular grid and are identified by the tuple (grid row, grid column)
+
+    cell_size : float, optional
+        used only when zones is None, the size of a grid cell (in euclidean space)
+        default value is 0.01 (approximately 1.113 kilometers)
+
+    time_bucket : float, optional
+        the size of the time-of-day buckets in seconds (UTC), default value is 3600
+
+    Attributes
+    ----------
+    trips_ : list<Trip>
+        the trips of the last fitted trace (see Trip in Model)
+
+    od_matrix_ : OD_matrix
+        the OD matrices of the last fitted trace
+    """
+
+    def __init__(self,zones=None,cell_size=0.01,time_bucket=3600) :
+        self.zones=zones
+        self.cell_size=cell_size
+        self.time_bucket=time_bucket
+
+    def fit(self,trace,stay_points) :
+        """
+        Derive the trips of a trace and their OD matrices.
+
+        Parameters
+        ----------
+        trace : Trace
+            A Trace object (see Trace in Model)
+
+        stay_points : list<Stay_point>
+            the stay points of the trace (e.g. the output of Stay_points.fit)
+
+        Returns
+        -------
+        trips_ : list<Trip>
+            the trips (see Trip in Model)
+        """
+
+        self.trips_,buckets,origin_codes,destination_codes=_extract_trips(trace,stay_points,zones=self.zones,cell_size=self.cell_size,time_bucket=self.time_bucket)
+        self.od_matrix_=OD_matrix(self.time_bucket).accumulate(buckets,origin_codes,destination_codes,zones=self.zones)
+        return self.trips_
+
+    def zone_label(self,zone) :
+        """
+        Return the display label of a zone identifier : the label of the user-supplied
+        zone center (e.g. Stay_point.label, the index when it has no label) or
+        "row,column" for a grid zone.
+        """
+
+        if (self.zones is None) : return "{0},{1}".format(*zone)
+        label=getattr(self.zones[zone],'label',None)
+        return label if label else str(zone)
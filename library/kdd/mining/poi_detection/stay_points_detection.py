@@ -4,7 +4,23 @@ Stay point detection
 
 #Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
 
-from ....model import Stay_point
+import numpy as np
+
+from ....model import Stay_point,Columnar_trace
+from ....instrumentation import stage,count
+
+def _known_diagonal(trace) :
+    """
+    Return the diagonal of the bounding box of the trace (see Trace_statistics.diagonal)
+    when it is obtained without scanning the events : from the cached statistics or from
+    the columns of a Columnar_trace (vectorized), None otherwise.
+    """
+
+    if (hasattr(trace,'has_statistics') and trace.has_statistics()) : return trace.statistics().diagonal
+    if (isinstance(trace,Columnar_trace)) :
+        timestamps,latitudes,longitudes=trace.to_arrays()
+        return float(np.hypot(latitudes.max()-latitudes.min(),longitudes.max()-longitudes.min()))
+    return None
 
 def _stay_points_detection(trace,dist_thres=0.0001,time_thres=1800) :
     """
@@ -35,10 +51,17 @@ def _stay_points_detection(trace,dist_thres=0.0001,time_thres=1800) :
     on Advances in geographic information systems (p. 34). ACM. 
     """
     
+    # no two events are farther than the diagonal of the bounding box : the trace can't leave a stay point
+    diagonal=_known_diagonal(trace) if len(trace) else None
+    if (diagonal is not None and diagonal<=dist_thres) :
+        count("stay_points.pruned_traces")
+        return []
     i=0
     stay_points=[]
     trace_size=len(trace)
+    anchors=scanned=0
     while i<trace_size :
+        anchor=i
         point_i=trace[i]
         points_list=[]
         token=False
@@ -65,7 +88,11 @@ def _stay_points_detection(trace,dist_thres=0.0001,time_thres=1800) :
                     token=True
                 break
             j+=1
+        anchors+=1
+        scanned+=j-anchor
         if (not token) : i+=1
+    count("stay_points.anchors",anchors)
+    count("stay_points.inner_loop_iterations",scanned)
     return stay_points
 
 
@@ -116,5 +143,7 @@ class Stay_points :
             A list of Stay_point object (see Stay_point in Model)
         """
 
-        self.stay_points_=_stay_points_detection(trace,dist_thres=self.dist_thres,time_thres=self.time_thres)
+        with stage("Stay_points",len(trace)) as record :
+            self.stay_points_=_stay_points_detection(trace,dist_thres=self.dist_thres,time_thres=self.time_thres)
+            record.events_out=len(self.stay_points_)
         return self.stay_points_
@@ -0,0 +1 @@
+from trajectory_similarity import Trajectory_similarity,dtw_distance,frechet_distance,lcss_similarity
@@ -0,0 +1,417 @@
+"""
+Trajectory similarity (DTW, discrete Frechet, LCSS) with lower-bound pruning
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import heapq
+from multiprocessing import Pool
+
+import numpy as np
+
+
+def _coordinates(trace) :
+    """
+    Return the coordinates of a trace as a 2D-array with one (latitude, longitude) row per event.
+
+    Parameters
+    ----------
+    trace : Trace or numpy.ndarray
+        A Trace object (see Trace in Model) or an array of shape (n,2)
+    """
+
+    if (isinstance(trace,np.ndarray)) : return np.asarray(trace,dtype=np.float64).reshape(-1,2)
+    timestamps,latitudes,longitudes=trace.to_arrays()
+    return np.column_stack((latitudes,longitudes))
+
+def _pairwise_distances(points,other_points) :
+    """
+    Return the euclidean distances between points[i] and other_points[i] (row by row).
+    """
+
+    differences=points-other_points
+    return np.sqrt((differences*differences).sum(axis=1))
+
+def _distances_to_box(points,box) :
+    """
+    Return the euclidean distance of each point to a bounding box (0 inside the box).
+
+    Parameters
+    ----------
+    points : numpy.ndarray
+        array of shape (n,2)
+
+    box : numpy.ndarray
+        array [min_latitude, min_longitude, max_latitude, max_longitude]
+    """
+
+    latitude_gaps=np.maximum(np.maximum(box[0]-points[:,0],points[:,0]-box[2]),0)
+    longitude_gaps=np.maximum(np.maximum(box[1]-points[:,1],points[:,1]-box[3]),0)
+    return np.sqrt(latitude_gaps*latitude_gaps+longitude_gaps*longitude_gaps)
+
+def _box(points) :
+    return np.concatenate((points.min(axis=0),points.max(axis=0)))
+
+def _box_distance(box,other_box) :
+    latitude_gap=max(box[0]-other_box[2],other_box[0]-box[2],0)
+    longitude_gap=max(box[1]-other_box[3],other_box[1]-box[3],0)
+    return np.sqrt(latitude_gap*latitude_gap+longitude_gap*longitude_gap)
+
+def _wavefront(points,other_points,cell,padding) :
+    """
+    Fill a dynamic programming matrix D[i,j]=cell(cost or match, D[i-1,j-1], D[i-1,j], D[i,j-1])
+    anti-diagonal by anti-diagonal, all the cells of an anti-diagonal are independent thus
+    computed with one vectorized operation.
+
+    Parameters
+    ----------
+    points, other_points : numpy.ndarray
+        arrays of shape (n,2) and (m,2)
+
+    cell : function
+        cell(distances, diagonal, up, left) returns the values of the cells of an anti-diagonal
+
+    padding : float
+        the value of the cells out of the matrix (D[-1,j] and D[i,-1])
+
+    Returns
+    -------
+    value : float
+        D[n-1,m-1]
+
+    Notes
+    -----
+    The computational complexity is O(n*m) with O(n+m) vectorized steps and O(n) memory.
+    """
+
+    n,m=len(points),len(other_points)
+    # previous[i+1] is D[i,k-1-i] and before_previous[i+1] is D[i,k-2-i], index 0 is the padding row
+    before_previous=np.full(n+1,padding)
+    previous=np.full(n+1,padding)
+    for k in range(n+m-1) :
+        first,last=max(0,k-m+1),min(k,n-1)
+        rows=np.arange(first,last+1)
+        distances=_pairwise_distances(points[rows],other_points[k-rows])
+        current=np.full(n+1,padding)
+        if (k==0) :
+            current[1]=cell(distances,None,None,None)
+        else :
+            current[first+1:last+2]=cell(distances,before_previous[first:last+1],previous[first:last+1],previous[first+1:last+2])
+        before_previous,previous=previous,current
+    return previous[n]
+
+def dtw_distance(trace,other_trace) :
+    """
+    Return the Dynamic Time Warping distance between two traces (sum of the euclidean
+    distances along the optimal alignment).
+
+    Parameters
+    ----------
+    trace, other_trace : Trace or numpy.ndarray
+        Trace objects (see Trace in Model) or arrays of shape (n,2) of (latitude, longitude)
+
+    Returns
+    -------
+    distance : float
+        the DTW distance
+    """
+
+    def cell(distances,diagonal,up,left) :
+        if (diagonal is None) : return distances
+        return distances+np.minimum(np.minimum(diagonal,up),left)
+    return float(_wavefront(_coordinates(trace),_coordinates(other_trace),cell,np.inf))
+
+def frechet_distance(trace,other_trace) :
+    """
+    Return the discrete Frechet distance between two traces.
+
+    Parameters
+    ----------
+    trace, other_trace : Trace or numpy.ndarray
+        Trace objects (see Trace in Model) or arrays of shape (n,2) of (latitude, longitude)
+
+    Returns
+    -------
+    distance : float
+        the discrete Frechet distance
+
+    References
+    ----------
+    Eiter, T., & Mannila, H. (1994). Computing discrete Frechet distance.
+    Technical Report CD-TR 94/64, Technische Universitat Wien.
+    """
+
+    def cell(distances,diagonal,up,left) :
+        if (diagonal is None) : return distances
+        return np.maximum(distances,np.minimum(np.minimum(diagonal,up),left))
+    return float(_wavefront(_coordinates(trace),_coordinates(other_trace),cell,np.inf))
+
+def lcss_similarity(trace,other_trace,epsilon=0.0001) :
+    """
+    Return the Longest Common SubSequence similarity between two traces, two events
+    match when their euclidean distance is at most epsilon.
+
+    Parameters
+    ----------
+    trace, other_trace : Trace or numpy.ndarray
+        Trace objects (see Trace in Model) or arrays of shape (n,2) of (latitude, longitude)
+
+    epsilon : float, optional
+        the matching threshold (in euclidean space), default value is 0.0001
+        (approximately 11.132 meters)
+
+    Returns
+    -------
+    similarity : float
+        the length of the LCSS divided by the size of the shortest trace (between 0 and 1)
+
+    References
+    ----------
+    Vlachos, M., Kollios, G., & Gunopulos, D. (2002). Discovering similar multidimensional
+    trajectories. In Proceedings of the 18th International Conference on Data Engineering (pp. 673-684). IEEE.
+    """
+
+    points,other_points=_coordinates(trace),_coordinates(other_trace)
+    def cell(distances,diagonal,up,left) :
+        if (diagonal is None) : return (distances<=epsilon).astype(np.float64)
+        return np.where(distances<=epsilon,diagonal+1,np.maximum(up,left))
+    return float(_wavefront(points,other_points,cell,0.))/min(len(points),len(other_points))
+
+
+def _exact_distance(measure,points,other_points,epsilon) :
+    if (measure=='dtw') : return dtw_distance(points,other_points)
+    elif (measure=='frechet') : return frechet_distance(points,other_points)
+    elif (measure=='lcss') : return 1-lcss_similarity(points,other_points,epsilon=epsilon)
+    else : raise Exception("measure dosen't exists")
+
+def _exact_distances(arguments) :
+    """
+    Compute the exact distances of a chunk of pairs (process pool worker).
+    """
+
+    measure,epsilon,pairs=arguments
+    return [_exact_distance(measure,points,other_points,epsilon) for points,other_points in pairs]
+
+def _lower_bound(measure,points,other_points,box,other_box,epsilon) :
+    """
+    Return a lower bound of the distance between two traces, the cheapest bounds are
+    evaluated first and the LB_Keogh style bounds (distance of each event to the bounding
+    box of the other trace) only when the cheap bounds are not conclusive.
+
+    Parameters
+    ----------
+    measure : {'dtw','frechet','lcss'}
+        the distance measure ('lcss' distance is 1 - lcss similarity)
+
+    points, other_points : numpy.ndarray
+        arrays of shape (n,2) and (m,2)
+
+    box, other_box : numpy.ndarray
+        the bounding boxes of the two traces
+
+    epsilon : float
+        the LCSS matching threshold
+
+    Returns
+    -------
+    lower_bound : float
+        a lower bound of the exact distance
+    """
+
+    n,m=len(points),len(other_points)
+    box_distance=_box_distance(box,other_box)
+    if (measure=='lcss') :
+        if (box_distance>epsilon) : return 1.
+        matchable=min(np.count_nonzero(_distances_to_box(points,other_box)<=epsilon),
+                      np.count_nonzero(_distances_to_box(other_points,box)<=epsilon))
+        return 1-float(matchable)/min(n,m)
+
+    # the first (resp. last) events are always aligned together
+    first_distance=_pairwise_distances(points[:1],other_points[:1])[0]
+    last_distance=_pairwise_distances(points[-1:],other_points[-1:])[0]
+    # each event is aligned with at least one event of the other trace
+    if (measure=='dtw') :
+        endpoints=first_distance+last_distance if (n>1 or m>1) else first_distance
+        return max(endpoints,max(n,m)*box_distance,
+                   _distances_to_box(points,other_box).sum(),_distances_to_box(other_points,box).sum())
+    elif (measure=='frechet') :
+        return max(first_distance,last_distance,box_distance,
+                   _distances_to_box(points,other_box).max(),_distances_to_box(other_points,box).max())
+    else : raise Exception("measure dosen't exists")
+
+
+class Trajectory_similarity :
+    """
+    Compare traces with DTW, discrete Frechet or LCSS. Lower bounds (bounding boxes,
+    endpoints and LB_Keogh style envelopes) prune the pairs before the exact computation,
+    which is distributed over a process pool.
+
+    Parameters
+    ----------
+    measure : {'dtw','frechet','lcss'}, optional
+        'dtw' : Dynamic Time Warping distance
+        'frechet' : discrete Frechet distance
+        'lcss' : 1 - Longest Common SubSequence similarity
+        default value is 'dtw'
+
+    epsilon : float, optional
+        used only when measure='lcss', the matching threshold (in euclidean space)
+        default value is 0.0001 (approximately 11.132 meters)
+
+    n_jobs : int, optional
+        the number of worker processes used for the exact computations, default value is 1
+        (no process pool)
+
+    chunk_size : int, optional
+        the number of pairs sent at once to a worker, default value is 16
+
+    Attributes
+    ----------
+    exact_computations_ : int
+        the number of exact computations performed by the last query
+
+    pruned_ : int
+        the number of pairs pruned by the lower bounds in the last query
+
+    Notes
+    -----
+    The used distance is the euclidean distance.
+    """
+
+    def __init__(self,measure='dtw',epsilon=0.0001,n_jobs=1,chunk_size=16) :
+        self.measure=measure
+        self.epsilon=epsilon
+        self.n_jobs=n_jobs
+        self.chunk_size=chunk_size
+
+    def distance(self,trace,other_trace) :
+        """
+        Return the exact distance between two traces.
+
+        Parameters
+        ----------
+        trace, other_trace : Trace or numpy.ndarray
+            Trace objects (see Trace in Model) or arrays of shape (n,2) of (latitude, longitude)
+
+        Returns
+        -------
+        distance : float
+            the distance
+        """
+
+        return _exact_distance(self.measure,_coordinates(trace),_coordinates(other_trace),self.epsilon)
+
+    def _compute(self,pool,pairs) :
+        """
+        Return the exact distances of the pairs, computed by the pool if any.
+        """
+
+        self.exact_computations_+=len(pairs)
+        chunks=[(self.measure,self.epsilon,pairs[i:i+self.chunk_size]) for i in range(0,len(pairs),self.chunk_size)]
+        if (pool is None) : results=map(_exact_distances,chunks)
+        else : results=pool.map(_exact_distances,chunks)
+        return [distance for chunk in results for distance in chunk]
+
+    def _pool(self) :
+        return Pool(self.n_jobs) if self.n_jobs>1 else None
+
+    def top_k(self,query,candidates,k=10) :
+        """
+        Return the k traces the most similar to the query.
+
+        The candidates are sorted by lower bound and their exact distances are computed
+        by batches, the search stops as soon as the next lower bound exceeds the k-th
+        best exact distance.
+
+        Parameters
+        ----------
+        query : Trace or numpy.ndarray
+            the query trace
+
+        candidates : dict<id,Trace> or list<Trace>
+            the candidate traces, when a list is given the identifier of a trace is its
+            position in the list
+
+        k : int, optional
+            the number of returned traces, default value is 10
+
+        Returns
+        -------
+        neighbors : list<(id,float)>
+            the identifiers of the k nearest traces with their distances, sorted by distance
+        """
+
+        items=list(candidates.items()) if isinstance(candidates,dict) else list(enumerate(candidates))
+        query_points=_coordinates(query)
+        query_box=_box(query_points)
+        candidates_points=[_coordinates(trace) for trace_id,trace in items]
+        lower_bounds=np.array([_lower_bound(self.measure,query_points,points,query_box,_box(points),self.epsilon) for points in candidates_points])
+        order=np.argsort(lower_bounds,kind='mergesort')
+
+        self.exact_computations_=0
+        batch_size=max(k,self.n_jobs*self.chunk_size)
+        best=[]
+        pool=self._pool()
+        try :
+            position=0
+            while position<len(order) :
+                if (len(best)>=k) :
+                    threshold=-best[0][0]
+                    batch=[index for index in order[position:position+batch_size] if lower_bounds[index]<threshold]
+                    if (not batch) : break
+                else :
+                    batch=list(order[position:position+batch_size])
+                position+=batch_size
+                distances=self._compute(pool,[(query_points,candidates_points[index]) for index in batch])
+                for index,distance in zip(batch,distances) :
+                    if (len(best)<k) : heapq.heappush(best,(-distance,-index))
+                    elif (distance<-best[0][0]) : heapq.heapreplace(best,(-distance,-index))
+        finally :
+            if (pool is not None) :
+                pool.close()
+                pool.join()
+
+        self.pruned_=len(items)-self.exact_computations_
+        return [(items[-index][0],-distance) for distance,index in sorted(best,reverse=True)]
+
+    def all_pairs(self,traces,threshold) :
+        """
+        Return all the pairs of traces which distance is at most threshold
+        (e.g. near-duplicate routes).
+
+        Parameters
+        ----------
+        traces : dict<id,Trace> or list<Trace>
+            the traces, when a list is given the identifier of a trace is its position in the list
+
+        threshold : float
+            the maximal distance (for measure='lcss', 1 - the minimal similarity)
+
+        Returns
+        -------
+        pairs : list<(id,id,float)>
+            the identifiers of the two traces and their distance, sorted by distance
+        """
+
+        items=list(traces.items()) if isinstance(traces,dict) else list(enumerate(traces))
+        points=[_coordinates(trace) for trace_id,trace in items]
+        boxes=[_box(trace_points) for trace_points in points]
+
+        candidate_pairs=[]
+        for i in range(len(items)) :
+            for j in range(i+1,len(items)) :
+                if (_lower_bound(self.measure,points[i],points[j],boxes[i],boxes[j],self.epsilon)<=threshold) :
+                    candidate_pairs.append((i,j))
+
+        self.exact_computations_=0
+        pool=self._pool()
+        try :
+            distances=self._compute(pool,[(points[i],points[j]) for i,j in candidate_pairs])
+        finally :
+            if (pool is not None) :
+                pool.close()
+                pool.join()
+
+        self.pruned_=len(items)*(len(items)-1)//2-self.exact_computations_
+        pairs=[(items[i][0],items[j][0],distance) for (i,j),distance in zip(candidate_pairs,distances) if distance<=threshold]
+        return sorted(pairs,key=lambda pair : pair[2])
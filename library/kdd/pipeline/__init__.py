@@ -0,0 +1,2 @@
+from pipeline import Pipeline
+from result_cache import Result_cache,Cached_estimator,trace_fingerprint,result_key
@@ -0,0 +1,173 @@
+"""
+Composable processing pipeline
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import time
+
+from ...model import Columnar_trace
+
+
+def _is_trace(data) :
+    return hasattr(data,'to_arrays')
+
+def _is_traces_list(data) :
+    return isinstance(data,list) and all(_is_trace(element) for element in data)
+
+
+class Pipeline :
+    """
+    Chain estimators (Mean_filter, Median_filter, Segmentation_by_time, RDP_compression,
+    Stay_points, ...) where the output of a stage is the input of the next one.
+
+    Consecutive stages supporting columnar traces (Mean_filter, Median_filter,
+    Segmentation_by_time, Speed_filter) share one conversion : the trace is converted
+    once to a Columnar_trace and no Event object is created between them. The trace is
+    converted back to a Trace only before the first stage which does not support
+    columnar traces.
+
+    Consecutive filters (Mean_filter, Median_filter) and a segmentation following them
+    are fused : they run on the columns of the trace (filter_columns, segment_columns)
+    and no trace is built between them. The filters do not change the timestamps, their
+    window bounds are computed once per window shape, and each filter writes its result
+    in the arrays of the filter before the previous one (at most two pairs of coordinate
+    arrays are allocated whatever the number of filters). The segments are views of the
+    filtered columns. The fused estimators do not set their filtered_trace_ attribute.
+
+    When a stage returns a list of traces (e.g. Segmentation_by_time), the following
+    stages are applied to each trace of the list.
+
+    Parameters
+    ----------
+    steps : list<estimator> or list<(string,estimator)>
+        the stages, an estimator is any object having a fit(trace) method, the name
+        of a stage is its class name when it is not given
+
+    fuse : bool, optional
+        fuse the consecutive filters and segmentation, default value is True
+
+    Attributes
+    ----------
+    result_ : object
+        the output of the last stage (a list of outputs when the trace has been segmented)
+
+    timings_ : list<(string,float)>
+        the wall time in seconds of each stage (summed over the segments), the
+        conversions between Trace and Columnar_trace are reported as stages
+        named 'to_columnar' and 'to_trace'
+    """
+
+    def __init__(self,steps,fuse=True) :
+        self.steps=[step if isinstance(step,tuple) else (step.__class__.__name__,step) for step in steps]
+        self.fuse=fuse
+
+    def fit(self,trace) :
+        """
+        Run all the stages on the trace.
+
+        Parameters
+        ----------
+        trace : Trace
+            A Trace object (see Trace in Model) or a Columnar_trace
+
+        Returns
+        -------
+        result_ : object
+            the output of the last stage
+        """
+
+        timings={}
+        order=[]
+        def record(name,elapsed_time) :
+            if (name not in timings) :
+                timings[name]=0.
+                order.append(name)
+            timings[name]+=elapsed_time
+
+        data=trace
+        index=0
+        while (index<len(self.steps)) :
+            run=self._fused_run(index) if self.fuse else []
+            steps=run if len(run)>1 else self.steps[index:index+1]
+            columnar=getattr(steps[0][1],'_columnar',False)
+            if (self._needs_conversion(data,columnar)) :
+                starting_time=time.time()
+                data=self._convert(data,columnar)
+                record('to_columnar' if columnar else 'to_trace',time.time()-starting_time)
+
+            if (len(run)>1) :
+                data=self._apply_fused(run,data,record)
+            else :
+                name,estimator=steps[0]
+                starting_time=time.time()
+                data=self._apply(estimator,data)
+                record(name,time.time()-starting_time)
+            index+=len(steps)
+
+        self.timings_=[(name,timings[name]) for name in order]
+        self.result_=data
+        return self.result_
+
+    def _needs_conversion(self,data,columnar) :
+        """
+        Return True if the trace(s) are not in the representation expected by the next stage.
+        """
+
+        if (_is_traces_list(data)) : return any(self._needs_conversion(element,columnar) for element in data)
+        if (not _is_trace(data)) : return False
+        return columnar!=isinstance(data,Columnar_trace)
+
+    def _convert(self,data,columnar) :
+        """
+        Convert the trace(s) to the representation expected by the next stage.
+        """
+
+        if (_is_traces_list(data)) : return [self._convert(element,columnar) for element in data]
+        if (not _is_trace(data)) : return data
+        if (columnar) : return Columnar_trace.from_trace(data)
+        if (isinstance(data,Columnar_trace)) : return data.to_trace()
+        return data
+
+    def _apply(self,estimator,data) :
+        """
+        Apply a stage to a trace, or to each trace of a list of traces.
+        """
+
+        if (_is_traces_list(data)) : return [self._apply(estimator,element) for element in data]
+        return estimator.fit(data)
+
+    def _fused_run(self,index) :
+        """
+        Return the consecutive filters starting at index and the segmentation following
+        them (the stages fused by _apply_fused).
+        """
+
+        end=index
+        while (end<len(self.steps) and hasattr(self.steps[end][1],'filter_columns')) : end+=1
+        if (end<len(self.steps) and hasattr(self.steps[end][1],'segment_columns')) : end+=1
+        return self.steps[index:end]
+
+    def _apply_fused(self,run,data,record) :
+        """
+        Apply fused stages (see _fused_run) to a columnar trace, or to each trace of a
+        list of traces.
+        """
+
+        if (_is_traces_list(data)) : return [self._apply_fused(run,element,record) for element in data]
+        timestamps,latitudes,longitudes=data.to_arrays()
+        windows={}
+        # outputs of the last two filters, a filter writes in the arrays read by the previous one
+        outputs=[]
+        for name,estimator in run :
+            starting_time=time.time()
+            if (hasattr(estimator,'filter_columns')) :
+                out=outputs.pop(0) if len(outputs)==2 else None
+                latitudes,longitudes=estimator.filter_columns(timestamps,latitudes,longitudes,windows=windows,out=out)
+                outputs.append((latitudes,longitudes))
+                data=None
+            else :
+                data=estimator.segment_columns(timestamps,latitudes,longitudes)
+            record(name,time.time()-starting_time)
+        if (data is None) : data=Columnar_trace(timestamps,latitudes,longitudes,copy=False)
+        return data
@@ -0,0 +1,242 @@
+"""
+Memoization of the stage results keyed by trace fingerprint and estimator parameters
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from ...data_management.columnar_io import write_columnar,read_columnar
+
+
+def trace_fingerprint(trace) :
+    """
+    Return a content fingerprint of a trace (two traces with the same events have
+    the same fingerprint whatever their type, Trace or Columnar_trace).
+
+    Parameters
+    ----------
+    trace : Trace
+        A Trace object (see Trace in Model) or a Columnar_trace
+
+    Returns
+    -------
+    fingerprint : string
+        the SHA-1 hexadecimal digest of the columns of the trace
+    """
+
+    digest=hashlib.sha1()
+    for column in trace.to_arrays() :
+        digest.update(np.ascontiguousarray(column,dtype=np.float64).data)
+    digest.update(str(len(trace)))
+    return digest.hexdigest()
+
+def _parameters(value) :
+    """
+    Return a stable representation of a parameter value, the parameters of an
+    estimator are its public attributes which are not results (trailing underscore).
+    """
+
+    if (isinstance(value,(list,tuple))) : return tuple(_parameters(element) for element in value)
+    if (isinstance(value,dict)) : return tuple(sorted((repr(key),_parameters(element)) for key,element in value.items()))
+    if (hasattr(value,'__dict__')) :
+        attributes=sorted((name,_parameters(attribute)) for name,attribute in vars(value).items() if not name.startswith('_') and not name.endswith('_'))
+        return (value.__class__.__module__,value.__class__.__name__,tuple(attributes))
+    return repr(value)
+
+def result_key(estimator,trace) :
+    """
+    Return the cache key of the result of estimator.fit(trace).
+    """
+
+    return hashlib.sha1(repr((_parameters(estimator),trace_fingerprint(trace)))).hexdigest()
+
+
+class Result_cache :
+    """
+    Two tiers cache of stage results : an in-memory LRU tier and an optional on-disk tier
+    (one file per result in the binary columnar format, see write_columnar) bounded by
+    its total size, the least recently used files are evicted first.
+
+    Parameters
+    ----------
+    directory : string, optional
+        the directory of the on-disk tier (created if it does not exist), None for
+        a memory only cache
+
+    memory_size : int, optional
+        the maximal number of results kept in memory, default value is 64
+
+    disk_size : int, optional
+        the maximal total size in bytes of the on-disk tier, default value is 1 GiB
+
+    Attributes
+    ----------
+    hits : int
+        the number of results found in the cache
+
+    misses : int
+        the number of results not found in the cache
+
+    write_errors : int
+        the number of results which could not be written in the on-disk tier
+        (they are logged on the "motaf" logger and only kept in memory)
+
+    Notes
+    -----
+    The results of the memory tier are shared : a result returned by the cache must
+    not be modified.
+    """
+
+    def __init__(self,directory=None,memory_size=64,disk_size=1<<30) :
+        self.directory=directory
+        self.memory_size=memory_size
+        self.disk_size=disk_size
+        self.hits=0
+        self.misses=0
+        self.write_errors=0
+        self._memory=OrderedDict()
+        if (directory is not None and not os.path.isdir(directory)) : os.makedirs(directory)
+
+    def _path(self,key) :
+        return os.path.join(self.directory,key+".npz")
+
+    def _remember(self,key,result) :
+        self._memory[key]=result
+        while (len(self._memory)>self.memory_size) :
+            self._memory.popitem(last=False)
+
+    def get(self,key) :
+        """
+        Return the cached result of a key.
+
+        Returns
+        -------
+        found : bool
+            True if the key is in the cache
+
+        result : object
+            the cached result (None if not found)
+        """
+
+        if (key in self._memory) :
+            result=self._memory.pop(key)
+            self._memory[key]=result
+            self.hits+=1
+            return True,result
+        if (self.directory is not None and os.path.exists(self._path(key))) :
+            try :
+                result=read_columnar(self._path(key))
+                os.utime(self._path(key),None)
+            except (IOError,OSError,ValueError) :
+                # evicted or being replaced by another process
+                self.misses+=1
+                return False,None
+            self._remember(key,result)
+            self.hits+=1
+            return True,result
+        self.misses+=1
+        return False,None
+
+    def put(self,key,result) :
+        """
+        Add a result to the cache, the results which can not be written in the
+        columnar format are only kept in memory (see write_errors).
+        """
+
+        self._remember(key,result)
+        if (self.directory is None) : return
+        descriptor,temporary_path=tempfile.mkstemp(suffix=".npz.tmp",dir=self.directory)
+        try :
+            with os.fdopen(descriptor,'wb') as temporary_file :
+                write_columnar(temporary_file,result)
+            os.rename(temporary_path,self._path(key))
+        except Exception :
+            self.write_errors+=1
+            logging.getLogger("motaf").warning("result %s not written in the on-disk cache",key,exc_info=True)
+            os.remove(temporary_path)
+            return
+        self._evict()
+
+    def _evict(self) :
+        """
+        Remove the least recently used files until the on-disk tier fits in disk_size.
+        """
+
+        files=[]
+        for name in os.listdir(self.directory) :
+            if (not name.endswith(".npz")) : continue
+            try :
+                status=os.stat(os.path.join(self.directory,name))
+            except OSError :
+                continue
+            files.append((status.st_mtime,status.st_size,name))
+        total_size=sum(size for modification_time,size,name in files)
+        for modification_time,size,name in sorted(files) :
+            if (total_size<=self.disk_size) : break
+            try :
+                os.remove(os.path.join(self.directory,name))
+            except OSError :
+                pass
+            total_size-=size
+
+    def fit(self,estimator,trace) :
+        """
+        Return estimator.fit(trace), computed only if it is not in the cache.
+        """
+
+        key=result_key(estimator,trace)
+        found,result=self.get(key)
+        if (not found) :
+            result=estimator.fit(trace)
+            self.put(key,result)
+        return result
+
+    def clear(self) :
+        """
+        Remove all the results (of both tiers).
+        """
+
+        self._memory.clear()
+        if (self.directory is None) : return
+        for name in os.listdir(self.directory) :
+            if (name.endswith(".npz")) : os.remove(os.path.join(self.directory,name))
+
+
+class Cached_estimator :
+    """
+    Wrap an estimator so that its results are memoized in a Result_cache, a cached
+    estimator can be used everywhere the estimator is (e.g. as a stage of a Pipeline).
+
+    Parameters
+    ----------
+    estimator : estimator
+        any object having a fit(trace) method (Median_filter, RDP_compression, Stay_points, ...)
+
+    cache : Result_cache
+        the cache of the results
+
+    Attributes
+    ----------
+    result_ : object
+        the result of the last fit
+    """
+
+    def __init__(self,estimator,cache) :
+        self.estimator=estimator
+        self.cache=cache
+        self._columnar=getattr(estimator,'_columnar',False)
+
+    def fit(self,trace) :
+        """
+        Return the result of the estimator on the trace (from the cache when possible).
+        """
+
+        self.result_=self.cache.fit(self.estimator,trace)
+        return self.result_
@@ -1,2 +1,4 @@
 from mean_filter import Mean_filter
 from median_filter import Median_filter
+from speed_filter import Speed_filter
+from kalman_filter import Kalman_filter
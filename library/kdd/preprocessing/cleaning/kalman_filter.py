@@ -0,0 +1,304 @@
+"""
+Kalman Filter
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import math
+
+import numpy as np
+
+from ....model import Trace,Event,Columnar_trace,Trace_collection
+from ....model.const import Const
+from ....instrumentation import stage
+
+_METERS_PER_DEGREE=math.pi/180*Const().earth_radius
+
+
+def _to_meters(latitudes,longitudes,origin_latitudes,origin_longitudes) :
+    """
+    Return the (east, north) coordinates in meter of positions in the local plane of
+    their origin (equirectangular projection).
+    """
+
+    scale=_METERS_PER_DEGREE*np.cos(np.radians(origin_latitudes))
+    return (longitudes-origin_longitudes)*scale,(latitudes-origin_latitudes)*_METERS_PER_DEGREE
+
+def _to_degrees(xs,ys,origin_latitudes,origin_longitudes) :
+    scale=_METERS_PER_DEGREE*np.cos(np.radians(origin_latitudes))
+    return origin_latitudes+ys/_METERS_PER_DEGREE,origin_longitudes+xs/scale
+
+# The constant velocity model has the same covariance on the east and the north axes
+# (same dt, same noises), thus, the state of a device is its position (x, y), its velocity
+# (vx, vy) and the covariance [[p00, p01], [p01, p11]] of (position, velocity) on one axis.
+# _initial_state, _step and _smooth_step only use arithmetic operators : they run on floats
+# for one device and on numpy arrays for many devices at once.
+
+def _initial_state(x,y,measurement_variance,initial_speed_variance) :
+    return x,y,0.*x,0.*y,measurement_variance+0.*x,0.*x,initial_speed_variance+0.*x
+
+def _step(state,dt,x_measure,y_measure,acceleration_variance,measurement_variance) :
+    """
+    Return the filtered state after a prediction of dt seconds and the update by the
+    measured position (x_measure, y_measure).
+    """
+
+    x,y,vx,vy,p00,p01,p11=state
+    dt2=dt*dt
+    x=x+dt*vx
+    y=y+dt*vy
+    p00=p00+dt*(2*p01+dt*p11)+acceleration_variance*dt2*dt2/4
+    p01=p01+dt*p11+acceleration_variance*dt2*dt/2
+    p11=p11+acceleration_variance*dt2
+    innovation_variance=p00+measurement_variance
+    k0=p00/innovation_variance
+    k1=p01/innovation_variance
+    x_innovation=x_measure-x
+    y_innovation=y_measure-y
+    return (x+k0*x_innovation,y+k0*y_innovation,vx+k1*x_innovation,vy+k1*y_innovation,
+            (1-k0)*p00,(1-k0)*p01,p11-k1*p01)
+
+def _smooth_step(filtered,smoothed,dt,acceleration_variance) :
+    """
+    Return the smoothed (x, y, vx, vy) of an event (Rauch-Tung-Striebel) from its filtered
+    state and the smoothed (x, y, vx, vy) of the next event, dt seconds later.
+    """
+
+    x,y,vx,vy,p00,p01,p11=filtered
+    next_x,next_y,next_vx,next_vy=smoothed
+    dt2=dt*dt
+    predicted_p00=p00+dt*(2*p01+dt*p11)+acceleration_variance*dt2*dt2/4
+    predicted_p01=p01+dt*p11+acceleration_variance*dt2*dt/2
+    predicted_p11=p11+acceleration_variance*dt2
+    determinant=predicted_p00*predicted_p11-predicted_p01*predicted_p01
+    # gain C = P F^T inverse(F P F^T + Q)
+    a00,a01,a10,a11=p00+dt*p01,p01,p01+dt*p11,p11
+    c00=(a00*predicted_p11-a01*predicted_p01)/determinant
+    c01=(a01*predicted_p00-a00*predicted_p01)/determinant
+    c10=(a10*predicted_p11-a11*predicted_p01)/determinant
+    c11=(a11*predicted_p00-a10*predicted_p01)/determinant
+    x_position,y_position=next_x-(x+dt*vx),next_y-(y+dt*vy)
+    x_velocity,y_velocity=next_vx-vx,next_vy-vy
+    return (x+c00*x_position+c01*x_velocity,y+c00*y_position+c01*y_velocity,
+            vx+c10*x_position+c11*x_velocity,vy+c10*y_position+c11*y_velocity)
+
+
+def _kalman_collection(offsets,timestamps,xs,ys,acceleration_variance,measurement_variance,initial_speed_variance,smoothing) :
+    """
+    Filter (and smooth) concatenated traces : the recursion runs along the time (k-th event
+    of each trace at the k-th step) and each step is vectorized across the traces.
+
+    Returns
+    -------
+    xs, ys : numpy.ndarray<float>
+        the filtered (or smoothed) positions in the local planes of the traces
+    """
+
+    sizes=np.diff(offsets)
+    # the traces by decreasing size : the traces still running at a step are a prefix
+    order=np.argsort(-sizes,kind='mergesort')
+    starts=offsets[:-1][order]
+    sorted_sizes=sizes[order]
+    maximum_size=int(sorted_sizes[0]) if len(sizes) else 0
+    # running[k] is the number of traces having more than k events
+    running=np.searchsorted(-sorted_sizes,-np.arange(maximum_size),side='left')
+
+    # the filtered states of all the events (preallocated)
+    filtered=[np.empty(len(timestamps)) for component in range(7)]
+    state=None
+    for k in range(maximum_size) :
+        devices=running[k]
+        indices=starts[:devices]+k
+        if (k==0) :
+            state=_initial_state(xs[indices],ys[indices],measurement_variance,initial_speed_variance)
+        else :
+            dt=timestamps[indices]-timestamps[indices-1]
+            state=_step(tuple(component[:devices] for component in state),dt,xs[indices],ys[indices],acceleration_variance,measurement_variance)
+        for component,values in zip(filtered,state) : component[indices]=values
+    if (not smoothing) : return filtered[0],filtered[1]
+
+    smoothed=[component.copy() for component in filtered[:4]]
+    for k in range(maximum_size-2,-1,-1) :
+        devices=running[k+1]
+        indices=starts[:devices]+k
+        dt=timestamps[indices+1]-timestamps[indices]
+        values=_smooth_step(tuple(component[indices] for component in filtered),
+                            tuple(component[indices+1] for component in smoothed),dt,acceleration_variance)
+        for component,value in zip(smoothed,values) : component[indices]=value
+    return smoothed[0],smoothed[1]
+
+def _kalman_trace(timestamps,xs,ys,acceleration_variance,measurement_variance,initial_speed_variance,smoothing,state=None) :
+    """
+    Filter (and smooth) one trace, the recursion runs on floats (faster than numpy
+    for one device). The filtering starts from state (the state after the previous
+    events of the trace, see Kalman_filter.push) if it is given.
+
+    Returns
+    -------
+    xs, ys : list<float>
+        the filtered (or smoothed) positions in the local plane of the trace
+
+    state : tuple
+        the filtered state after the last event
+    """
+
+    timestamps,xs,ys=timestamps.tolist(),xs.tolist(),ys.tolist()
+    filtered=[]
+    previous_timestamp=None if state is None else state[0]
+    for timestamp,x,y in zip(timestamps,xs,ys) :
+        if (state is None) : filtered_state=_initial_state(x,y,measurement_variance,initial_speed_variance)
+        else : filtered_state=_step(state[1],timestamp-previous_timestamp,x,y,acceleration_variance,measurement_variance)
+        filtered.append(filtered_state)
+        state=(timestamp,filtered_state)
+        previous_timestamp=timestamp
+    if (smoothing and filtered) :
+        smoothed=[filtered[-1][:4]]
+        for k in range(len(filtered)-2,-1,-1) :
+            smoothed.append(_smooth_step(filtered[k],smoothed[-1],timestamps[k+1]-timestamps[k],acceleration_variance))
+        smoothed.reverse()
+        filtered=smoothed
+    return [values[0] for values in filtered],[values[1] for values in filtered],state
+
+
+class Kalman_filter :
+    """
+    Smooth the trace with a constant velocity Kalman filter : the state of the moving
+    object is its position and its velocity, the velocity changes by a random acceleration
+    (white noise) and each event is a measure of the position with a gaussian error. The
+    time between the events is taken in count (irregular sampling).
+
+    Parameters
+    ----------
+    measurement_noise : float, optional
+        the standard deviation of the position error of the events in meter,
+        default value is 10
+
+    acceleration_noise : float, optional
+        the standard deviation of the acceleration in meter per second squared,
+        default value is 1
+
+    initial_speed_noise : float, optional
+        the standard deviation of the speed at the first event in meter per second,
+        default value is 10
+
+    smoothing : bool, optional
+        True (default) : the filtered positions are smoothed by a Rauch-Tung-Striebel
+        smoother (each event uses the past and the future events, offline use),
+        False : each event uses only the past events (causal, see push)
+
+    Attributes
+    ----------
+    filtered_trace_ : Trace
+        the filtered trace.
+
+    Notes
+    -----
+        - The computational complexity is O(n).
+        - The positions are projected in the local plane of the first event of the trace
+          (equirectangular projection, in meter).
+        - A Trace_collection is filtered at once : the recursion runs along the time and
+          each step is vectorized across the traces, the result is a Trace_collection.
+        - A Columnar_trace is filtered directly on its arrays and the result is a Columnar_trace.
+    """
+
+    # the filter works directly on the arrays of a Columnar_trace (see Pipeline)
+    _columnar=True
+
+    def __init__(self,measurement_noise=10.,acceleration_noise=1.,initial_speed_noise=10.,smoothing=True) :
+        self.measurement_noise=measurement_noise
+        self.acceleration_noise=acceleration_noise
+        self.initial_speed_noise=initial_speed_noise
+        self.smoothing=smoothing
+        self.reset()
+
+    def _variances(self) :
+        # acceleration, measurement and initial speed variances
+        return self.acceleration_noise**2,self.measurement_noise**2,self.initial_speed_noise**2
+
+    def _fit_collection(self,collection) :
+        device_ids,offsets,timestamps,latitudes,longitudes=collection.to_arrays()
+        sizes=np.diff(offsets)
+        origins=np.repeat(offsets[:-1][sizes>0],sizes[sizes>0])
+        xs,ys=_to_meters(latitudes,longitudes,latitudes[origins],longitudes[origins])
+        acceleration_variance,measurement_variance,initial_speed_variance=self._variances()
+        xs,ys=_kalman_collection(offsets,timestamps,xs,ys,acceleration_variance,measurement_variance,initial_speed_variance,self.smoothing)
+        latitudes,longitudes=_to_degrees(xs,ys,latitudes[origins],longitudes[origins])
+        filtered_collection=Trace_collection()
+        for device_id,start,end in zip(device_ids,offsets[:-1],offsets[1:]) :
+            filtered_collection.add_trace(device_id,self._result(collection[device_id],timestamps[start:end],latitudes[start:end],longitudes[start:end]))
+        return filtered_collection
+
+    def _result(self,trace,timestamps,latitudes,longitudes) :
+        if (isinstance(trace,Columnar_trace)) : return Columnar_trace(timestamps,latitudes,longitudes,copy=False)
+        filtered_trace=Trace()
+        filtered_trace.add_events(*[Event(event.datetime,latitude,longitude) for event,latitude,longitude in zip(trace,latitudes.tolist(),longitudes.tolist())])
+        return filtered_trace
+
+    def fit(self,trace) :
+        """
+        Perform the Kalman filter (and smoother) on the trace.
+
+        Parameters
+        ----------
+        trace : Trace or Trace_collection
+            A Trace object (see Trace in Model) or a collection of traces
+
+        Returns
+        -------
+        filtered_trace_ : Trace or Trace_collection
+            the filtered trace (the filtered collection).
+        """
+
+        if (isinstance(trace,Trace_collection)) :
+            events=sum(len(trace[device_id]) for device_id in trace)
+            with stage("Kalman_filter",events) as record :
+                self.filtered_trace_=self._fit_collection(trace)
+                record.events_out=events
+            return self.filtered_trace_
+
+        with stage("Kalman_filter",len(trace)) as record :
+            timestamps,latitudes,longitudes=trace.to_arrays()
+            if (len(timestamps)==0) :
+                self.filtered_trace_=self._result(trace,timestamps,latitudes,longitudes)
+            else :
+                xs,ys=_to_meters(latitudes,longitudes,latitudes[0],longitudes[0])
+                acceleration_variance,measurement_variance,initial_speed_variance=self._variances()
+                xs,ys,state=_kalman_trace(timestamps,xs,ys,acceleration_variance,measurement_variance,initial_speed_variance,self.smoothing)
+                latitudes,longitudes=_to_degrees(np.array(xs),np.array(ys),latitudes[0],longitudes[0])
+                self.filtered_trace_=self._result(trace,timestamps,latitudes,longitudes)
+            record.events_out=len(self.filtered_trace_)
+        return self.filtered_trace_
+
+    def push(self,block) :
+        """
+        Filter the next events of a trace (streaming mode, the smoothing is not applied) :
+        the filter goes on from the state after the previously pushed events, thus, the
+        result is the one of fit with smoothing=False on the whole trace.
+
+        Parameters
+        ----------
+        block : Columnar_trace
+            the next events (ordered by increasing datetime)
+
+        Returns
+        -------
+        filtered_block : Columnar_trace
+            the filtered events
+        """
+
+        timestamps,latitudes,longitudes=block.to_arrays()
+        if (len(timestamps)==0) : return Columnar_trace()
+        if (self._origin is None) : self._origin=(latitudes[0],longitudes[0])
+        xs,ys=_to_meters(latitudes,longitudes,*self._origin)
+        acceleration_variance,measurement_variance,initial_speed_variance=self._variances()
+        xs,ys,self._state=_kalman_trace(timestamps,xs,ys,acceleration_variance,measurement_variance,initial_speed_variance,False,self._state)
+        latitudes,longitudes=_to_degrees(np.array(xs),np.array(ys),*self._origin)
+        return Columnar_trace(timestamps,latitudes,longitudes,copy=False)
+
+    def reset(self) :
+        """
+        Forget the pushed events (the next pushed events start a new trace).
+        """
+
+        self._origin=None
+        self._state=None
@@ -4,7 +4,10 @@ Mean Filter
 
 #Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
 
-from ....model import Event
+import numpy as np
+
+from ....model import Event,Columnar_trace
+from ....instrumentation import stage
 
 
 def _mean_filter(trace,window_size=4,window_type='causal',neighbooring_type='number') :
@@ -40,13 +43,13 @@ def _mean_filter(trace,window_size=4,window_type='causal',neighbooring_type='num
         - The used distance is the euclidean distance.
     """
     
-    if (window_type=='causal') : kernel_shape=(-window_size,0)
-    elif (window_type=='centered') : kernel_shape=(-(window_size/2),window_size/2)
-    else : raise Exception("window_type dosen't exists")
+    kernel_shape=_kernel_shape(window_size,window_type)
+
+    if (neighbooring_type not in ('number','time')) : raise Exception("neighbooring_type dosen't exists")
 
-    if (neighbooring_type=='number') : filtered_trace=_base_mean_filter(trace,kernel_shape)
-    elif (neighbooring_type=='time') : filtered_trace=_base_mean_filter_by_time(trace,kernel_shape)
-    else : raise Exception("neighbooring_type dosen't exists")
+    if (isinstance(trace,Columnar_trace)) : filtered_trace=_base_mean_filter_columnar(trace,kernel_shape,neighbooring_type)
+    elif (neighbooring_type=='number') : filtered_trace=_base_mean_filter(trace,kernel_shape)
+    else : filtered_trace=_base_mean_filter_by_time(trace,kernel_shape)
 
     return filtered_trace
 
@@ -184,6 +187,130 @@ def _base_mean_filter_by_time(trace,kernel_shape) :
               
     return filtered_trace
 
+def _kernel_shape(window_size,window_type) :
+    """
+    Return the kernel_shape (l,r) of a window, l<=0 and r>=0.
+
+    Parameters
+    ----------
+    window_size : int
+        the size of the window (in number of events or in seconds)
+
+    window_type : {'causal', 'centered'}
+        'causal' : the window contains only actual and past events
+        'centered' : the window contains past and futur events
+    """
+
+    if (window_type=='causal') : return (-window_size,0)
+    elif (window_type=='centered') : return (-(window_size/2),window_size/2)
+    else : raise Exception("window_type dosen't exists")
+
+def _window_bounds(timestamps,kernel_shape,neighbooring_type) :
+    """
+    Return for each event the bounds [start,end) of the indices of its neighboors.
+
+    Parameters
+    ----------
+    timestamps : numpy.ndarray<float>
+        the datetime of each event in seconds since the epoch (ordered by increasing datetime)
+
+    kernel_shape : 2-tuple
+        the kernel_shape is 2-tuple (l,r) where l<=0 and r>=0, in number of events
+        or in seconds depending on neighbooring_type
+
+    neighbooring_type : {'number', 'time'}
+        wether the neighbooring is calculated by time or just by order
+
+    Returns
+    -------
+    starts, ends : numpy.ndarray<int>
+        the neighboors of the event i are the events of index in [starts[i],ends[i])
+    """
+
+    left,right=kernel_shape
+    if (neighbooring_type=='number') :
+        indices=np.arange(len(timestamps))
+        return np.maximum(indices+left,0),np.minimum(indices+right+1,len(timestamps))
+    return np.searchsorted(timestamps,timestamps+left,side='left'),np.searchsorted(timestamps,timestamps+right,side='right')
+
+def _cached_window_bounds(windows,timestamps,kernel_shape,neighbooring_type) :
+    """
+    Return the window bounds (see _window_bounds), windows is a dict caching them
+    for the filters applied to the same timestamps (see Pipeline), None disables
+    the cache.
+    """
+
+    if (windows is None) : return _window_bounds(timestamps,kernel_shape,neighbooring_type)
+    key=(kernel_shape,neighbooring_type)
+    if (key not in windows) : windows[key]=_window_bounds(timestamps,kernel_shape,neighbooring_type)
+    return windows[key]
+
+def _mean_filter_columns(latitudes,longitudes,starts,ends,out=None) :
+    """
+    Return the mean coordinates of the windows [starts[i],ends[i]) with cumulative sums.
+
+    Parameters
+    ----------
+    latitudes, longitudes : numpy.ndarray<float>
+        the coordinates of the events
+
+    starts, ends : numpy.ndarray<int>
+        the bounds of the window of each event (see _window_bounds)
+
+    out : 2-tuple of numpy.ndarray<float>, optional
+        the arrays receiving the filtered latitudes and longitudes (they may not be
+        the given coordinates), new arrays are allocated when it is None
+
+    Returns
+    -------
+    filtered_latitudes, filtered_longitudes : numpy.ndarray<float>
+        the filtered coordinates
+    """
+
+    sizes=ends-starts
+    cumulated=np.empty(len(latitudes)+1)
+    cumulated[0]=0.
+    filtered=[]
+    for column,column_out in zip((latitudes,longitudes),out or (None,None)) :
+        np.cumsum(column,out=cumulated[1:])
+        column_out=np.subtract(cumulated[ends],cumulated[starts],out=column_out)
+        column_out/=sizes
+        filtered.append(column_out)
+    return filtered
+
+def _base_mean_filter_columnar(trace,kernel_shape,neighbooring_type) :
+    """
+    Perform a mean filter on a columnar trace with cumulative sums,
+    no Event object is created.
+
+    Parameters
+    ----------
+    trace : Columnar_trace
+        A Columnar_trace object (see Columnar_trace in Model)
+
+    kernel_shape : 2-tuple
+        the kernel_shape is 2-tuple (l,r) where l<=0 and r>=0, in number of events
+        or in seconds depending on neighbooring_type
+
+    neighbooring_type : {'number', 'time'}
+        wether the neighbooring is calculated by time or just by order
+
+    Returns
+    -------
+    filtered_trace : Columnar_trace
+        the filtered trace (its timestamps array is shared with the given trace).
+
+    Notes
+    -----
+    The commputational complexity is O(n) for neighbooring_type='number'
+    and O(n log(n)) for neighbooring_type='time'
+    """
+
+    timestamps,latitudes,longitudes=trace.to_arrays()
+    starts,ends=_window_bounds(timestamps,kernel_shape,neighbooring_type)
+    filtered_latitudes,filtered_longitudes=_mean_filter_columns(latitudes,longitudes,starts,ends)
+    return Columnar_trace(timestamps,filtered_latitudes,filtered_longitudes,copy=False)
+
 
 class Mean_filter :
     """
@@ -213,8 +340,12 @@ class Mean_filter :
     -----
         - The commputational complexity is O(n)
         - The used distance is the euclidean distance.
+        - A Columnar_trace is filtered directly on its arrays and the result is a Columnar_trace.
     """
 
+    # the filter works directly on the arrays of a Columnar_trace (see Pipeline)
+    _columnar=True
+
     def __init__(self,window_size=4,window_type='causal',neighbooring_type='number') :
         self.window_size=window_size
         self.window_type=window_type
@@ -235,5 +366,38 @@ class Mean_filter :
             the filtered trace.
         """
 
-        self.filtered_trace_=_mean_filter(trace,window_size=self.window_size,window_type=self.window_type,neighbooring_type=self.neighbooring_type)
+        with stage("Mean_filter",len(trace)) as record :
+            self.filtered_trace_=_mean_filter(trace,window_size=self.window_size,window_type=self.window_type,neighbooring_type=self.neighbooring_type)
+            record.events_out=len(self.filtered_trace_)
         return self.filtered_trace_
+
+    def filter_columns(self,timestamps,latitudes,longitudes,windows=None,out=None) :
+        """
+        Filter the columns of a trace, no trace is built (see Pipeline, the timestamps
+        are not changed by the filter).
+
+        Parameters
+        ----------
+        timestamps, latitudes, longitudes : numpy.ndarray<float>
+            the columns of the trace (see Trace.to_arrays)
+
+        windows : dict, optional
+            cache of the window bounds shared by the filters applied to the same timestamps
+
+        out : 2-tuple of numpy.ndarray<float>, optional
+            the arrays receiving the filtered latitudes and longitudes (they may not be
+            the given columns), new arrays are allocated when it is None
+
+        Returns
+        -------
+        filtered_latitudes, filtered_longitudes : numpy.ndarray<float>
+            the filtered coordinates
+        """
+
+        kernel_shape=_kernel_shape(self.window_size,self.window_type)
+        if (self.neighbooring_type not in ('number','time')) : raise Exception("neighbooring_type dosen't exists")
+        with stage("Mean_filter",len(timestamps)) as record :
+            starts,ends=_cached_window_bounds(windows,timestamps,kernel_shape,self.neighbooring_type)
+            filtered=_mean_filter_columns(latitudes,longitudes,starts,ends,out=out)
+            record.events_out=len(timestamps)
+        return filtered
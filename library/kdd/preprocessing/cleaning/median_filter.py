@@ -6,7 +6,11 @@ Median Filter
 
 import math
 
-from ....model import Event,Position
+import numpy as np
+
+from ....model import Event,Position,Columnar_trace
+from ....instrumentation import stage,count,observe
+from mean_filter import _kernel_shape,_window_bounds,_cached_window_bounds
 
 def _median_filter(trace,window_size=4,window_type='causal',neighbooring_type='number',algorithm='weiszfeld',epsilon=0.00001) :
     """
@@ -61,13 +65,13 @@ def _median_filter(trace,window_size=4,window_type='causal',neighbooring_type='n
 
     """
     
-    if (window_type=='causal') : kernel_shape=(-window_size,0)
-    elif (window_type=='centered') : kernel_shape=(-(window_size/2),window_size/2)
-    else : raise Exception("window_type dosen't exists")
+    kernel_shape=_kernel_shape(window_size,window_type)
+
+    if (neighbooring_type not in ('number','time')) : raise Exception("neighbooring_type dosen't exists")
 
-    if (neighbooring_type=='number') : filtered_trace=_base_median_filter(trace,kernel_shape,algorithm,epsilon=epsilon)
-    elif (neighbooring_type=='time') : filtered_trace=_base_median_filter_by_time(trace,kernel_shape,algorithm,epsilon=epsilon)
-    else : raise Exception("neighbooring_type dosen't exists")
+    if (isinstance(trace,Columnar_trace)) : filtered_trace=_base_median_filter_columnar(trace,kernel_shape,neighbooring_type,algorithm,epsilon=epsilon)
+    elif (neighbooring_type=='number') : filtered_trace=_base_median_filter(trace,kernel_shape,algorithm,epsilon=epsilon)
+    else : filtered_trace=_base_median_filter_by_time(trace,kernel_shape,algorithm,epsilon=epsilon)
 
     return filtered_trace
 
@@ -113,7 +117,7 @@ def _base_median_filter(trace,kernel_shape,algorithm,**kwargs) :
     
     if (algorithm=='weiszfeld') :
         _get_median=_get_median_weiszfeld
-        if (not kwargs.has_key('epsion')) :
+        if (not kwargs.has_key('epsilon')) :
             kwargs['epsilon']=0.00001
     elif (algorithm=='complete') :
         _get_median=_get_median_complete
@@ -188,7 +192,7 @@ def _base_median_filter_by_time(trace,kernel_shape,algorithm,**kwargs) :
 
     if (algorithm=='weiszfeld') :
         _get_median=_get_median_weiszfeld
-        if (not kwargs.has_key('epsion')) :
+        if (not kwargs.has_key('epsilon')) :
             kwargs['epsilon']=0.00001
     elif (algorithm=='complete') :
         _get_median=_get_median_complete
@@ -297,10 +301,14 @@ def _get_median_weiszfeld(points_list,epsilon) :
     last_point=initial_point=Position(initial_point_latitude/len(points_list),initial_point_longitude/len(points_list))
     new_point=_get_next_weiszfeld_point(points_list,last_point)
 
+    iterations=1
     while (new_point.euclidean_distance(last_point)>epsilon) :
         last_point=new_point
         new_point=_get_next_weiszfeld_point(points_list,last_point)
+        iterations+=1
 
+    count("median_filter.weiszfeld_windows")
+    count("median_filter.weiszfeld_iterations",iterations)
     median_point=new_point
     return median_point 
 
@@ -368,6 +376,225 @@ def _get_next_weiszfeld_point(points_list,last_point) :
             new_point_longitude=(1-last_point_weight)*new_point_longitude_non_equal+last_point_weight*last_point_longitude            
             return Position(new_point_latitude,new_point_longitude)
 
+def _block_end(widths,block_start,row_bytes,memory_budget) :
+    """
+    Return the end of the block of windows starting at block_start : the largest block
+    whose rows (as wide as the widest window of the block) fit in memory_budget bytes,
+    at least one window.
+    """
+
+    block_end=len(widths)
+    while (True) :
+        width=int(widths[block_start:block_end].max())
+        block_end_limit=block_start+max(1,memory_budget//row_bytes(width))
+        if (block_end_limit>=block_end) : return block_end
+        block_end=block_end_limit
+
+def _base_median_filter_columnar(trace,kernel_shape,neighbooring_type,algorithm,epsilon=0.00001,memory_budget=2**26) :
+    """
+    Perform the median filtering on a columnar trace, the medians of all the windows
+    of a block of events are computed together with array operations, no Event or
+    Position object is created.
+
+    Parameters
+    ----------
+    trace : Columnar_trace
+        A Columnar_trace object (see Columnar_trace in Model)
+
+    kernel_shape : 2-tuple
+        the kernel_shape is 2-tuple (l,r) where l<=0 and r>=0, in number of events
+        or in seconds depending on neighbooring_type
+
+    neighbooring_type : {'number', 'time'}
+        wether the neighbooring is calculated by time or just by order
+
+    algorithm : {'weiszfeld','complete'}
+        the used algorithme to calculate median for a list of 2D-points (see _median_filter)
+
+    epsilon : float, optional
+        used only when the used algorithm=weiszfeld, the convergence criteria
+
+    memory_budget : int, optional
+        the size in bytes of the largest array of a block of windows processed together :
+        a window of width w takes w*w*8 bytes with 'complete' and w*8 bytes with 'weiszfeld',
+        default value is 2^26 (64 MiB, the peak memory is a few times larger)
+
+    Returns
+    -------
+    filtered_trace : Columnar_trace
+        the filtered trace (its timestamps array is shared with the given trace).
+
+    References
+    ----------
+    Vardi, Y., & Zhang, C. H. (2000). The multivariate L1-median and associated data depth.
+    Proceedings of the National Academy of Sciences, 97(4), 1423-1426.
+    """
+
+    timestamps,latitudes,longitudes=trace.to_arrays()
+    starts,ends=_window_bounds(timestamps,kernel_shape,neighbooring_type)
+    filtered_latitudes,filtered_longitudes=_median_filter_columns(latitudes,longitudes,starts,ends,algorithm,epsilon,memory_budget)
+    return Columnar_trace(timestamps,filtered_latitudes,filtered_longitudes,copy=False)
+
+def _median_filter_columns(latitudes,longitudes,starts,ends,algorithm,epsilon=0.00001,memory_budget=2**26,out=None) :
+    """
+    Return the median coordinates of the windows [starts[i],ends[i]) computed by blocks
+    of windows (see _base_median_filter_columnar).
+
+    Parameters
+    ----------
+    latitudes, longitudes : numpy.ndarray<float>
+        the coordinates of the events
+
+    starts, ends : numpy.ndarray<int>
+        the bounds of the window of each event (see _window_bounds)
+
+    algorithm, epsilon, memory_budget :
+        see _base_median_filter_columnar
+
+    out : 2-tuple of numpy.ndarray<float>, optional
+        the arrays receiving the filtered latitudes and longitudes (they may not be
+        the given coordinates), new arrays are allocated when it is None
+
+    Returns
+    -------
+    filtered_latitudes, filtered_longitudes : numpy.ndarray<float>
+        the filtered coordinates
+    """
+
+    if (algorithm=='weiszfeld') :
+        _get_medians=lambda latitudes,longitudes,mask : _get_medians_weiszfeld(latitudes,longitudes,mask,epsilon)
+        row_bytes=lambda width : width*8
+    elif (algorithm=='complete') :
+        _get_medians=_get_medians_complete
+        row_bytes=lambda width : width*width*8
+    else : raise Exception("algorithm dosen't exists")
+
+    if (out is None) : out=(np.empty(len(latitudes)),np.empty(len(latitudes)))
+    filtered_latitudes,filtered_longitudes=out
+    widths=ends-starts
+    block_start=0
+    while (block_start<len(latitudes)) :
+        block_end=_block_end(widths,block_start,row_bytes,memory_budget)
+        block_starts,block_ends=starts[block_start:block_end],ends[block_start:block_end]
+        width=int(widths[block_start:block_end].max())
+        indices=block_starts[:,None]+np.arange(width)[None,:]
+        mask=indices<block_ends[:,None]
+        indices=np.where(mask,indices,block_starts[:,None])
+        block_latitudes,block_longitudes=_get_medians(latitudes[indices],longitudes[indices],mask)
+        filtered_latitudes[block_start:block_end]=block_latitudes
+        filtered_longitudes[block_start:block_end]=block_longitudes
+        block_start=block_end
+    return filtered_latitudes,filtered_longitudes
+
+def _get_medians_complete(latitudes,longitudes,mask) :
+    """
+    Array version of _get_median_complete : for each row of points, return the point
+    of the row which minimize the sum of distance with the other points of the row.
+
+    Parameters
+    ----------
+    latitudes, longitudes : numpy.ndarray<float>
+        2D-arrays, one row of points per window
+
+    mask : numpy.ndarray<bool>
+        the valid points of each row
+
+    Returns
+    -------
+    median_latitudes, median_longitudes : numpy.ndarray<float>
+        the median point of each row
+    """
+
+    latitude_differences=latitudes[:,:,None]-latitudes[:,None,:]
+    longitude_differences=longitudes[:,:,None]-longitudes[:,None,:]
+    distances=np.sqrt(latitude_differences*latitude_differences+longitude_differences*longitude_differences)
+    sum_distances=(distances*mask[:,None,:]).sum(axis=2)
+    sum_distances[~mask]=np.inf
+    chosen=np.argmin(sum_distances,axis=1)
+    rows=np.arange(len(chosen))
+    return latitudes[rows,chosen],longitudes[rows,chosen]
+
+def _get_medians_weiszfeld(latitudes,longitudes,mask,epsilon) :
+    """
+    Array version of _get_median_weiszfeld : the iterative algorithme of Weiszdeld
+    corrected by Yehuda Vardi and Cun-Hui Zhang is run on all the rows together,
+    a row stops being updated as soon as it converges.
+
+    Parameters
+    ----------
+    latitudes, longitudes : numpy.ndarray<float>
+        2D-arrays, one row of points per window
+
+    mask : numpy.ndarray<bool>
+        the valid points of each row
+
+    epsilon : float
+        it precise the convergence criteria (i.e. the distance between the point and its next in
+        the iterative algorithm is smaller than epsilon)
+
+    Returns
+    -------
+    median_latitudes, median_longitudes : numpy.ndarray<float>
+        the geometric median of each row
+
+    References
+    ----------
+    Vardi, Y., & Zhang, C. H. (2000). The multivariate L1-median and associated data depth.
+    Proceedings of the National Academy of Sciences, 97(4), 1423-1426.
+    """
+
+    sizes=mask.sum(axis=1)
+    last_latitudes=(latitudes*mask).sum(axis=1)/sizes
+    last_longitudes=(longitudes*mask).sum(axis=1)/sizes
+    new_latitudes,new_longitudes=_get_next_weiszfeld_points(latitudes,longitudes,mask,last_latitudes,last_longitudes)
+
+    active=np.hypot(new_latitudes-last_latitudes,new_longitudes-last_longitudes)>epsilon
+    iterations=1
+    iterations_sum=len(active)
+    while (active.any()) :
+        rows=np.flatnonzero(active)
+        iterations+=1
+        iterations_sum+=len(rows)
+        last_latitudes[rows],last_longitudes[rows]=new_latitudes[rows],new_longitudes[rows]
+        next_latitudes,next_longitudes=_get_next_weiszfeld_points(latitudes[rows],longitudes[rows],mask[rows],last_latitudes[rows],last_longitudes[rows])
+        new_latitudes[rows],new_longitudes[rows]=next_latitudes,next_longitudes
+        active[rows]=np.hypot(next_latitudes-last_latitudes[rows],next_longitudes-last_longitudes[rows])>epsilon
+
+    count("median_filter.weiszfeld_windows",len(active))
+    count("median_filter.weiszfeld_iterations",iterations_sum)
+    observe("median_filter.weiszfeld_max_iterations",iterations)
+    return new_latitudes,new_longitudes
+
+def _get_next_weiszfeld_points(latitudes,longitudes,mask,last_latitudes,last_longitudes) :
+    """
+    Array version of _get_next_weiszfeld_point, one step of the iterative algorithm
+    for each row of points.
+    """
+
+    latitude_differences=latitudes-last_latitudes[:,None]
+    longitude_differences=longitudes-last_longitudes[:,None]
+    distances=np.sqrt(latitude_differences*latitude_differences+longitude_differences*longitude_differences)
+    positive=mask&(distances>0)
+    weights=np.where(positive,1/np.where(positive,distances,1),0)
+    weights_sum=weights.sum(axis=1)
+    no_weight=weights_sum==0
+    weights_sum[no_weight]=1
+
+    new_latitudes=(weights*latitudes).sum(axis=1)/weights_sum
+    new_longitudes=(weights*longitudes).sum(axis=1)/weights_sum
+
+    # rows where the last point is one of the points
+    centralized_latitudes=(weights*latitude_differences).sum(axis=1)/weights_sum
+    centralized_longitudes=(weights*longitude_differences).sum(axis=1)/weights_sum
+    centralized_modules=np.hypot(centralized_latitudes,centralized_longitudes)
+    last_weights=np.where(centralized_modules>0,np.minimum(1,1/np.where(centralized_modules>0,centralized_modules,1)),1)
+    in_points=(mask&(distances==0)).any(axis=1)
+    last_weights=np.where(in_points,last_weights,0)
+    last_weights[no_weight]=1
+
+    return ((1-last_weights)*new_latitudes+last_weights*last_latitudes,
+            (1-last_weights)*new_longitudes+last_weights*last_longitudes)
+
 
 class Median_filter :
     """
@@ -410,6 +637,7 @@ class Median_filter :
     Notes
     -----
     The used distance is the euclidean distance.
+    A Columnar_trace is filtered directly on its arrays and the result is a Columnar_trace.
 
     References
     ----------
@@ -417,6 +645,9 @@ class Median_filter :
     Proceedings of the National Academy of Sciences, 97(4), 1423-1426.
     """
 
+    # the filter works directly on the arrays of a Columnar_trace (see Pipeline)
+    _columnar=True
+
     def __init__(self,window_size=4,window_type='causal',neighbooring_type='number',algorithm='weiszfeld',epsilon=0.00001) :
         self.window_size=window_size
         self.window_type=window_type
@@ -439,5 +670,38 @@ class Median_filter :
             the filtered trace.
         """
 
-        self.filtered_trace_=_median_filter(trace,window_size=self.window_size,window_type=self.window_type,neighbooring_type=self.neighbooring_type,algorithm=self.algorithm,epsilon=self.epsilon)
+        with stage("Median_filter",len(trace)) as record :
+            self.filtered_trace_=_median_filter(trace,window_size=self.window_size,window_type=self.window_type,neighbooring_type=self.neighbooring_type,algorithm=self.algorithm,epsilon=self.epsilon)
+            record.events_out=len(self.filtered_trace_)
         return self.filtered_trace_
+
+    def filter_columns(self,timestamps,latitudes,longitudes,windows=None,out=None) :
+        """
+        Filter the columns of a trace, no trace is built (see Pipeline, the timestamps
+        are not changed by the filter).
+
+        Parameters
+        ----------
+        timestamps, latitudes, longitudes : numpy.ndarray<float>
+            the columns of the trace (see Trace.to_arrays)
+
+        windows : dict, optional
+            cache of the window bounds shared by the filters applied to the same timestamps
+
+        out : 2-tuple of numpy.ndarray<float>, optional
+            the arrays receiving the filtered latitudes and longitudes (they may not be
+            the given columns), new arrays are allocated when it is None
+
+        Returns
+        -------
+        filtered_latitudes, filtered_longitudes : numpy.ndarray<float>
+            the filtered coordinates
+        """
+
+        kernel_shape=_kernel_shape(self.window_size,self.window_type)
+        if (self.neighbooring_type not in ('number','time')) : raise Exception("neighbooring_type dosen't exists")
+        with stage("Median_filter",len(timestamps)) as record :
+            starts,ends=_cached_window_bounds(windows,timestamps,kernel_shape,self.neighbooring_type)
+            filtered=_median_filter_columns(latitudes,longitudes,starts,ends,self.algorithm,epsilon=self.epsilon,out=out)
+            record.events_out=len(timestamps)
+        return filtered
@@ -0,0 +1,364 @@
+"""
+Speed Filter
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import numpy as np
+
+from ....model import Trace,Event,Columnar_trace
+from ....instrumentation import stage,count
+
+
+class _Linked_trace :
+    """
+    The events kept by the filter as a doubly linked list over the indices of the trace
+    (previous[i] is -1 for the first kept event and next[i] is the size of the trace for
+    the last one), removing events costs O(1) per event.
+    """
+
+    def __init__(self,trace,distance) :
+        # the distances are computed by the trace (see Columnar_trace.distances)
+        self.trace,self.distance=trace,distance
+        self.timestamps=trace.timestamps
+        self.size=len(trace)
+        self.previous=np.arange(-1,self.size-1)
+        self.next=np.arange(1,self.size+1)
+        self.keep=np.ones(self.size,dtype=bool)
+
+    def speeds(self,first,second) :
+        """
+        Return the speeds between the events first and second (inf if they have the
+        same timestamp and different positions).
+        """
+
+        dt=self.timestamps[second]-self.timestamps[first]
+        distances=self.trace.distances(first,second,self.distance)
+        with np.errstate(divide='ignore',invalid='ignore') :
+            return np.where(dt>0,distances/dt,np.where(distances>0,np.inf,0.))
+
+    def remove(self,indices) :
+        # no two removed events are linked (see _select), the relinking is then vectorized
+        previous,next=self.previous[indices],self.next[indices]
+        self.next[previous[previous>=0]]=next[previous>=0]
+        self.previous[next[next<self.size]]=previous[next<self.size]
+        self.keep[indices]=False
+
+
+def _implausible_steps(linked,first,second,maximum_speed,maximum_acceleration) :
+    """
+    Return the speeds of the steps (first[k], second[k]) between linked events and whether
+    each step is implausible : its speed exceeds maximum_speed or its speed change with the
+    previous or the next step exceeds maximum_acceleration.
+    """
+
+    speeds=linked.speeds(first,second)
+    implausible=speeds>maximum_speed
+    if (maximum_acceleration is not None) :
+        timestamps=linked.timestamps
+        for before,after,neighbour in ((linked.previous[first],first,True),(second,linked.next[second],False)) :
+            exists=(before>=0) if neighbour else (after<linked.size)
+            before,after=before[exists],after[exists]
+            neighbour_speeds=linked.speeds(before,after)
+            # the speed change is divided by the time between the middles of the two steps
+            if (neighbour) : elapsed=(timestamps[second[exists]]-timestamps[before])/2.
+            else : elapsed=(timestamps[after]-timestamps[first[exists]])/2.
+            with np.errstate(divide='ignore',invalid='ignore') :
+                accelerations=np.abs(speeds[exists]-neighbour_speeds)/elapsed
+            implausible[exists]|=np.nan_to_num(accelerations)>maximum_acceleration
+    return speeds,implausible
+
+def _walk(linked,indices,steps,forward) :
+    """
+    Return the list of the kept events 0, 1, ..., steps links after (forward) or before
+    each of the kept events indices, -1 when there is none.
+    """
+
+    links=linked.next if forward else linked.previous
+    walk=[indices]
+    for step in range(steps) :
+        moved=np.full(len(indices),-1,dtype=indices.dtype)
+        inside=walk[-1]>=0
+        moved[inside]=links[walk[-1][inside]]
+        moved[moved>=linked.size]=-1
+        walk.append(moved)
+    return walk
+
+def _burst_scores(linked,indices,maximum_speed,maximum_acceleration,maximum_burst) :
+    """
+    Return the outlier score of the kept events indices as members of a burst, -inf for
+    the events which are not in a burst.
+
+    A burst is a run of 2 to maximum_burst consecutive events bracketed by implausible
+    steps (from the event before the run and to the event after it) while the step
+    bypassing the run is plausible : the trace leaves its path and comes back. Its score
+    is the lowest speed of the bracketing steps (the same for all its events).
+    """
+
+    scores=np.full(len(indices),-np.inf)
+    # the events up to maximum_burst links before (backward[k]) and after (forward[k]) indices
+    backward=_walk(linked,indices,maximum_burst,False)
+    forward=_walk(linked,indices,maximum_burst,True)
+    # the step leaving each of these events is evaluated once (the step entering a run
+    # is the one leaving the event before it)
+    leaving=np.concatenate(backward[1:]+forward[:-1])
+    leaving=leaving[(leaving>=0)&(linked.next[np.maximum(leaving,0)]<linked.size)]
+    if (len(leaving)==0) : return scores
+    if (len(leaving)*8>=linked.size) :
+        # many events (first iteration) : dense lookup table, no sort
+        present=np.zeros(linked.size,dtype=bool)
+        present[leaving]=True
+        leaving=np.flatnonzero(present)
+        positions=np.cumsum(present)-1
+        locate=lambda events : positions[events]
+    else :
+        leaving=np.unique(leaving)
+        locate=lambda events : np.searchsorted(leaving,events)
+    leaving_speeds,leaving_implausible=_implausible_steps(linked,leaving,linked.next[leaving],maximum_speed,maximum_acceleration)
+    for length in range(2,maximum_burst+1) :
+        for position in range(length) :
+            # the run [starts,ends] where indices are at position
+            starts,ends=backward[position],forward[length-1-position]
+            before,after=backward[position+1],forward[length-position]
+            rows=np.flatnonzero((starts>=0)&(ends>=0)&(before>=0)&(after>=0))
+            if (len(rows)==0) : continue
+            entering,exiting=locate(before[rows]),locate(ends[rows])
+            bracketed=leaving_implausible[entering]&leaving_implausible[exiting]
+            rows,entering,exiting=rows[bracketed],entering[bracketed],exiting[bracketed]
+            if (len(rows)==0) : continue
+            bypass_speeds,bypass_implausible=_implausible_steps(linked,before[rows],after[rows],maximum_speed,maximum_acceleration)
+            bursts=~bypass_implausible
+            rows=rows[bursts]
+            scores[rows]=np.maximum(scores[rows],np.minimum(leaving_speeds[entering],leaving_speeds[exiting])[bursts])
+    return scores
+
+def _evaluate(linked,indices,maximum_speed,maximum_acceleration,maximum_burst=1) :
+    """
+    Return the outlier score of the kept events indices, -inf for the events which
+    are not outliers.
+
+    An event is an outlier when the steps from its previous event and to its next event
+    are both implausible (or its only step for the first and the last events), its score
+    is the lowest speed of these steps. The score of the first and the last events is
+    lower than any other score, thus, a spike next to an end of the trace is removed
+    before the end itself. The events of a burst (see _burst_scores) are outliers too.
+    """
+
+    scores=np.full(len(indices),-np.inf)
+    previous,next=linked.previous[indices],linked.next[indices]
+    has_previous,has_next=previous>=0,next<linked.size
+    outliers=has_previous|has_next
+    in_speeds=np.full(len(indices),np.inf)
+    out_speeds=np.full(len(indices),np.inf)
+    if (has_previous.any()) :
+        speeds,implausible=_implausible_steps(linked,previous[has_previous],indices[has_previous],maximum_speed,maximum_acceleration)
+        in_speeds[has_previous]=speeds
+        outliers[has_previous]&=implausible
+    if (has_next.any()) :
+        speeds,implausible=_implausible_steps(linked,indices[has_next],next[has_next],maximum_speed,maximum_acceleration)
+        out_speeds[has_next]=speeds
+        outliers[has_next]&=implausible
+    scores[outliers]=np.minimum(in_speeds,out_speeds)[outliers]
+    scores[outliers&~(has_previous&has_next)]=-np.finfo(np.float64).max
+    others=np.flatnonzero(~outliers)
+    if (maximum_burst>1 and len(others)>0) :
+        scores[others]=_burst_scores(linked,indices[others],maximum_speed,maximum_acceleration,maximum_burst)
+    return scores
+
+def _select(linked,candidates,maximum_speed,maximum_acceleration,maximum_burst=1) :
+    """
+    Return the outliers among the candidates which score more than their linked neighbours
+    (ties are won by the later event), thus, two linked events are never removed together
+    (the events of a burst are removed one per iteration, the last one first), and the
+    other outliers among the candidates (deferred to the next iterations).
+    """
+
+    scores=_evaluate(linked,candidates,maximum_speed,maximum_acceleration,maximum_burst)
+    outliers=np.isfinite(scores)
+    candidates,scores=candidates[outliers],scores[outliers]
+    if (len(candidates)==0) : return candidates,candidates
+    previous,next=linked.previous[candidates],linked.next[candidates]
+    previous_scores=np.full(len(candidates),-np.inf)
+    next_scores=np.full(len(candidates),-np.inf)
+    previous_scores[previous>=0]=_evaluate(linked,previous[previous>=0],maximum_speed,maximum_acceleration,maximum_burst)
+    next_scores[next<linked.size]=_evaluate(linked,next[next<linked.size],maximum_speed,maximum_acceleration,maximum_burst)
+    selected=(scores>=previous_scores)&(scores>next_scores)
+    return candidates[selected],candidates[~selected]
+
+def _speed_filter_mask(trace,maximum_speed,maximum_acceleration=None,distance='geodesic',maximum_iterations=None,maximum_burst=3) :
+    """
+    Return the keep mask of the speed filter (see Speed_filter) on a Columnar_trace
+    and its number of iterations.
+
+    Notes
+    -----
+    The first iteration evaluates all the events, the next ones only re-check the deferred
+    outliers (see _select) and the events up to maximum_burst+1 links from the removed ones
+    (the score of an event depends on the steps up to maximum_burst+1 links from it, see
+    _burst_scores), thus, the outliers remaining after an iteration are always re-checked
+    and the kept events are a fixed point of the filter (filtering them again removes
+    nothing). The computational complexity is O(n) for the first iteration and O(r+d) for
+    an iteration removing r events and deferring d outliers (times maximum_burst^2 for the
+    search of the bursts).
+    """
+
+    linked=_Linked_trace(trace,distance)
+    candidates=np.arange(linked.size)
+    iterations=0
+    while (len(candidates)>0 and (maximum_iterations is None or iterations<maximum_iterations)) :
+        removed,deferred=_select(linked,candidates,maximum_speed,maximum_acceleration,maximum_burst)
+        iterations+=1
+        if (len(removed)==0) : break
+        linked.remove(removed)
+        # the events whose score may have changed
+        previous=linked.previous[removed]
+        next=linked.next[removed]
+        previous=previous[previous>=0]
+        next=next[next<linked.size]
+        around=_walk(linked,previous,maximum_burst,False)+_walk(linked,next,maximum_burst,True)
+        candidates=np.unique(np.concatenate([deferred]+around))
+        candidates=candidates[candidates>=0]
+    return linked.keep,iterations
+
+def _repair(timestamps,latitudes,longitudes,keep) :
+    """
+    Return the coordinates where the removed events are replaced by the linear
+    interpolation in time of the kept events (the nearest kept event at the ends).
+    """
+
+    if (keep.all() or not keep.any()) : return latitudes,longitudes
+    kept_timestamps=timestamps[keep]
+    return np.interp(timestamps,kept_timestamps,latitudes[keep]),np.interp(timestamps,kept_timestamps,longitudes[keep])
+
+
+class Speed_filter :
+    """
+    Remove (or repair) the events whose implied speed or acceleration is implausible,
+    such as GPS spikes, instead of spreading them in their neighbours as the smoothing
+    filters do (apply it before Mean_filter or Median_filter).
+
+    An event is an outlier when both the step from its previous event and the step to its
+    next event are implausible : the speed of the step exceeds maximum_speed or its speed
+    change with a neighbouring step exceeds maximum_acceleration. The events of a burst
+    (up to maximum_burst consecutive events, e.g. multipath fixes) are outliers when the
+    steps entering and leaving the burst are implausible while the step bypassing it is
+    plausible (the steps inside the burst may be plausible). The outliers are removed
+    iteratively : at each iteration, the outliers scoring more than their neighbours (the
+    lowest speed of their steps) are removed and the events around them are re-checked
+    with their new neighbours, until no outlier remains.
+
+    Parameters
+    ----------
+    maximum_speed : float
+        the maximum plausible speed in meter per second (in degree per second for the
+        euclidean distance)
+
+    maximum_acceleration : float, optional
+        the maximum plausible acceleration in meter per second squared (in degree per
+        second squared for the euclidean distance), None (default) disables the check
+
+    mode : {'drop', 'repair'}, optional
+        'drop' : the outliers are removed from the trace
+        'repair' : the outliers are replaced by the linear interpolation in time of the
+        kept events, the filtered trace has the events of the trace
+
+    distance : {'geodesic', 'euclidean'}, optional
+        the distance between events, default value is 'geodesic'
+
+    maximum_iterations : int, optional
+        the maximum number of iterations, default value is None (until no outlier remains)
+
+    maximum_burst : int, optional
+        the maximum number of consecutive outliers of a burst, default value is 3
+        (1 disables the search of the bursts)
+
+    Attributes
+    ----------
+    keep_mask_ : numpy.ndarray<bool>
+        True for each event of the trace which is not an outlier
+
+    filtered_trace_ : Trace
+        the filtered trace (the Event objects of a Trace are shared with it).
+
+    Notes
+    -----
+        - The computational complexity is O(n) (see _speed_filter_mask).
+        - A burst longer than maximum_burst is only removed if its inner steps are
+          implausible too. A single jump of the trace is kept (the trace does not come back).
+        - A burst at an end of the trace (no event before or after it) is not detected.
+        - The events are expected to be ordered by datetime, two events at the same datetime
+          and different positions have an infinite speed.
+        - A Columnar_trace is filtered directly on its arrays and the result is a Columnar_trace.
+        - The distances of a Reduced_precision_trace are computed on its stored offsets
+          (see Reduced_precision_trace.distances).
+    """
+
+    # the filter works directly on the arrays of a Columnar_trace (see Pipeline)
+    _columnar=True
+
+    def __init__(self,maximum_speed,maximum_acceleration=None,mode='drop',distance='geodesic',maximum_iterations=None,maximum_burst=3) :
+        if (mode not in ('drop','repair')) : raise Exception("mode dosen't exists")
+        if (distance not in ('geodesic','euclidean')) : raise Exception("distance dosen't exists")
+        self.maximum_speed=maximum_speed
+        self.maximum_acceleration=maximum_acceleration
+        self.mode=mode
+        self.distance=distance
+        self.maximum_iterations=maximum_iterations
+        self.maximum_burst=maximum_burst
+
+    def fit_mask(self,trace) :
+        """
+        Compute the keep mask of the trace only (no trace is built), the kept events are
+        then for example trace.timestamps[keep_mask_].
+
+        Parameters
+        ----------
+        trace : Trace
+            A Trace object (see Trace in Model)
+
+        Returns
+        -------
+        keep_mask_ : numpy.ndarray<bool>
+            True for each event of the trace which is not an outlier
+        """
+
+        self.keep_mask_,iterations=_speed_filter_mask(Columnar_trace.from_trace(trace),self.maximum_speed,self.maximum_acceleration,self.distance,self.maximum_iterations,self.maximum_burst)
+        count("speed_filter.iterations",iterations)
+        count("speed_filter.outliers",int(len(self.keep_mask_)-self.keep_mask_.sum()))
+        return self.keep_mask_
+
+    def fit(self,trace) :
+        """
+        Remove (or repair) the outliers of the trace.
+
+        Parameters
+        ----------
+        trace : Trace
+            A Trace object (see Trace in Model)
+
+        Returns
+        -------
+        filtered_trace_ : Trace
+            the filtered trace.
+        """
+
+        with stage("Speed_filter",len(trace)) as record :
+            keep=self.fit_mask(trace)
+            if (isinstance(trace,Columnar_trace)) :
+                timestamps,latitudes,longitudes=trace.to_arrays()
+                if (self.mode=='drop') :
+                    self.filtered_trace_=Columnar_trace(timestamps[keep],latitudes[keep],longitudes[keep],copy=False)
+                else :
+                    latitudes,longitudes=_repair(timestamps,latitudes,longitudes,keep)
+                    self.filtered_trace_=Columnar_trace(timestamps,latitudes,longitudes)
+            else :
+                self.filtered_trace_=Trace()
+                if (self.mode=='drop') :
+                    self.filtered_trace_.add_events(*[event for event,kept in zip(trace,keep) if kept])
+                else :
+                    timestamps,latitudes,longitudes=trace.to_arrays()
+                    latitudes,longitudes=_repair(timestamps,latitudes,longitudes,keep)
+                    self.filtered_trace_.add_events(*[event if kept else Event(event.datetime,latitude,longitude)
+                                                      for event,kept,latitude,longitude in zip(trace,keep,latitudes,longitudes)])
+            record.events_out=len(self.filtered_trace_)
+        return self.filtered_trace_
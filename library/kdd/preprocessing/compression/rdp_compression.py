@@ -5,6 +5,7 @@ Douglas Peucker compression algorithme
 #Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
 
 from ....model import Trace
+from ....instrumentation import is_enabled,stage,count,observe
 
 
 def _rdp_compress(trace,epsilon=0.0001) :
@@ -33,7 +34,11 @@ def _rdp_compress(trace,epsilon=0.0001) :
     """
     
     positions_list=list(trace)
-    compressed_events_list=_rdp_compress_recursive(positions_list,epsilon)
+    statistics={"splits":0,"max_depth":0} if is_enabled() else None
+    compressed_events_list=_rdp_compress_recursive(positions_list,epsilon,statistics)
+    if (statistics is not None) :
+        count("rdp_compression.splits",statistics["splits"])
+        observe("rdp_compression.max_depth",statistics["max_depth"])
     trace=Trace()
     for event in compressed_events_list :
         trace.add_event(event)
@@ -83,7 +88,7 @@ def _shortest_distance_to_segment(position,segment_starting_position,segment_end
     return min(position.euclidean_distance(segment_starting_position),position.euclidean_distance(segment_ending_position))
 
 
-def _rdp_compress_recursive(positions_list,epsilon) :
+def _rdp_compress_recursive(positions_list,epsilon,statistics=None,depth=0) :
     """
     Perform the Ramer-Douglas-Peucker algorithm on the trajectory
 
@@ -98,6 +103,13 @@ def _rdp_compress_recursive(positions_list,epsilon) :
         the compressed trace and the original trace)
         Note : default value is 0.0001 (in euclidian space) which is approximatly 11.132 meters
 
+    statistics : dict, optional
+        if given, its 'splits' (number of splits) and 'max_depth' (maximal recursion depth)
+        entries are updated
+
+    depth : int, optional
+        the recursion depth of the call
+
     Returns
     -------
     compressed_trace : positions_list
@@ -121,9 +133,11 @@ def _rdp_compress_recursive(positions_list,epsilon) :
         if (d>dmax) :
             index=i
             dmax=d
+    if (statistics is not None) : statistics["max_depth"]=max(statistics["max_depth"],depth)
     if (dmax>epsilon) :
-        sub_trajectory_1=_rdp_compress_recursive(positions_list[0:index],epsilon)
-        sub_trajectory_2=_rdp_compress_recursive(positions_list[index:-1],epsilon)
+        if (statistics is not None) : statistics["splits"]+=1
+        sub_trajectory_1=_rdp_compress_recursive(positions_list[0:index],epsilon,statistics,depth+1)
+        sub_trajectory_2=_rdp_compress_recursive(positions_list[index:-1],epsilon,statistics,depth+1)
         result=sub_trajectory_1+sub_trajectory_2
     else :
         result=[positions_list[0],positions_list[-1]]
@@ -176,5 +190,7 @@ class RDP_compression :
             the compressed trace.
         """
 
-        self.compressed_trace_=_rdp_compress(trace,epsilon=self.epsilon)
+        with stage("RDP_compression",len(trace)) as record :
+            self.compressed_trace_=_rdp_compress(trace,epsilon=self.epsilon)
+            record.events_out=len(self.compressed_trace_)
         return self.compressed_trace_
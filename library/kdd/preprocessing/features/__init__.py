@@ -0,0 +1 @@
+from kinematic_features import Kinematic_features,kinematic_features,FEATURE_COLUMNS
@@ -0,0 +1,183 @@
+"""
+Vectorized kinematic feature extraction
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+from collections import OrderedDict
+
+import numpy as np
+
+from ....model import Trace_collection,geodesic_distances,euclidean_distances,bearings
+from ....instrumentation import stage
+
+# the columns of a feature table in order
+FEATURE_COLUMNS=("trace","segment","timestamp","latitude","longitude","dt","distance","speed",
+                 "acceleration","jerk","bearing","turn_angle")
+
+def _segment_starts(offsets,timestamps,maximum_time_difference) :
+    """
+    Return a boolean array marking the first event of each segment : the first event
+    of each trace and, if maximum_time_difference is given, each event following a
+    time gap longer than it (see Segmentation_by_time).
+    """
+
+    starts=np.zeros(len(timestamps),dtype=bool)
+    starts[offsets[:-1][offsets[:-1]<len(timestamps)]]=True
+    if (maximum_time_difference is not None and len(timestamps)>1) :
+        starts[1:]|=np.diff(timestamps)>maximum_time_difference
+    return starts
+
+def _shifted_difference(values,starts,out) :
+    """
+    Write values[i]-values[i-1] in out[i], NaN at the first event of each segment.
+    """
+
+    out[0:1]=np.nan
+    np.subtract(values[1:],values[:-1],out=out[1:])
+    out[starts]=np.nan
+    return out
+
+def kinematic_features(timestamps,latitudes,longitudes,offsets=None,distance='geodesic',maximum_time_difference=None) :
+    """
+    Compute the kinematic features of concatenated traces in one vectorized pass.
+
+    The features of an event describe the step from the previous event of its segment,
+    thus, they are NaN where this step (or the previous steps they need) crosses the
+    beginning of a segment : dt, distance, speed and bearing are NaN at the first event
+    of each segment, acceleration and turn_angle at its first 2 events and jerk at its
+    first 3 events.
+
+    Parameters
+    ----------
+    timestamps, latitudes, longitudes : array-like<float>
+        the concatenated columns of the traces (see Trace_collection.to_arrays)
+
+    offsets : array-like<int>, optional
+        the events of the k-th trace are [offsets[k],offsets[k+1]), default value is
+        a single trace
+
+    distance : {'geodesic','euclidean'}, optional
+        the step distance, geodesic in meter or euclidean in degree
+        (see Position), default value is 'geodesic'
+
+    maximum_time_difference : float, optional
+        if given, the traces are also segmented at the time gaps longer than
+        maximum_time_difference seconds (see Segmentation_by_time)
+
+    Returns
+    -------
+    features : OrderedDict<string,numpy.ndarray>
+        the feature table, one column per feature (see FEATURE_COLUMNS), one row per
+        event, pandas.DataFrame(features) gives a data frame without copy of the values :
+
+        - trace : the index of the trace of the event
+        - segment : the index of the segment of the event (over all the traces)
+        - timestamp, latitude, longitude : the event
+        - dt : the time elapsed since the previous event in seconds
+        - distance : the distance from the previous event
+        - speed : distance/dt (NaN when dt is 0)
+        - acceleration : the speed difference with the previous event divided by dt
+        - jerk : the acceleration difference with the previous event divided by dt
+        - bearing : the bearing from the previous event in degree between 0 and 360
+        - turn_angle : the bearing difference with the previous event in degree between
+          -180 and 180 (positive for a clockwise turn)
+    """
+
+    if (distance not in ('geodesic','euclidean')) : raise Exception("distance dosen't exists")
+    timestamps=np.asarray(timestamps,dtype=np.float64)
+    latitudes=np.asarray(latitudes,dtype=np.float64)
+    longitudes=np.asarray(longitudes,dtype=np.float64)
+    size=len(timestamps)
+    offsets=np.asarray(offsets if offsets is not None else [0,size],dtype=np.int64)
+    starts=_segment_starts(offsets,timestamps,maximum_time_difference)
+
+    features=OrderedDict()
+    features["trace"]=np.repeat(np.arange(len(offsets)-1),np.diff(offsets))
+    features["segment"]=np.cumsum(starts)-1
+    features["timestamp"]=timestamps
+    features["latitude"]=latitudes
+    features["longitude"]=longitudes
+    for column in FEATURE_COLUMNS[5:] : features[column]=np.empty(size)
+    if (size==0) : return features
+
+    dt=_shifted_difference(timestamps,starts,features["dt"])
+    step_distance=features["distance"]
+    step_bearing=features["bearing"]
+    step_distance[0]=step_bearing[0]=np.nan
+    distances=geodesic_distances if distance=='geodesic' else euclidean_distances
+    step_distance[1:]=distances(latitudes[:-1],longitudes[:-1],latitudes[1:],longitudes[1:])
+    step_bearing[1:]=bearings(latitudes[:-1],longitudes[:-1],latitudes[1:],longitudes[1:])
+    step_distance[starts]=step_bearing[starts]=np.nan
+
+    # NaN at a segment start propagates to the derived features of the next events
+    with np.errstate(divide='ignore',invalid='ignore') :
+        speed=np.divide(step_distance,dt,out=features["speed"])
+        speed[dt==0]=np.nan
+        acceleration=_shifted_difference(speed,starts,features["acceleration"])
+        np.divide(acceleration,dt,out=acceleration)
+        acceleration[dt==0]=np.nan
+        jerk=_shifted_difference(acceleration,starts,features["jerk"])
+        np.divide(jerk,dt,out=jerk)
+        jerk[dt==0]=np.nan
+    turn_angle=_shifted_difference(step_bearing,starts,features["turn_angle"])
+    np.subtract(np.mod(turn_angle+180.,360.),180.,out=turn_angle)
+    return features
+
+
+class Kinematic_features :
+    """
+    Compute the kinematic features (step distance, dt, speed, acceleration, jerk,
+    bearing and turn angle) of each event of a trace or of a collection of traces
+    (see kinematic_features).
+
+    Parameters
+    ----------
+    distance : {'geodesic','euclidean'}, optional
+        the step distance, geodesic in meter or euclidean in degree
+        (see Position), default value is 'geodesic'
+
+    maximum_time_difference : float, optional
+        if given, the traces are also segmented at the time gaps longer than
+        maximum_time_difference seconds (see Segmentation_by_time), the features
+        never cross a segment boundary
+
+    Attributs
+    ---------
+    features_ : OrderedDict<string,numpy.ndarray>
+        the feature table, one column per feature and one row per event (the rows of
+        a collection are in collection order, see Trace_collection.to_arrays)
+    """
+
+    # the features are computed on the arrays of a Columnar_trace (see Pipeline)
+    _columnar=True
+
+    def __init__(self,distance='geodesic',maximum_time_difference=None) :
+        if (distance not in ('geodesic','euclidean')) : raise Exception("distance dosen't exists")
+        self.distance=distance
+        self.maximum_time_difference=maximum_time_difference
+
+    def fit(self,trace) :
+        """
+        Compute the kinematic features of the trace.
+
+        Parameters
+        ----------
+        trace : Trace, Columnar_trace or Trace_collection
+            the trace or the collection of traces
+
+        Returns
+        -------
+        features_ : OrderedDict<string,numpy.ndarray>
+            the feature table (see kinematic_features)
+        """
+
+        if (isinstance(trace,Trace_collection)) :
+            device_ids,offsets,timestamps,latitudes,longitudes=trace.to_arrays()
+        else :
+            timestamps,latitudes,longitudes=trace.to_arrays()
+            offsets=None
+        with stage("Kinematic_features",len(timestamps)) as record :
+            self.features_=kinematic_features(timestamps,latitudes,longitudes,offsets,self.distance,self.maximum_time_difference)
+            record.events_out=len(timestamps)
+        return self.features_
@@ -0,0 +1 @@
+from uniform_resampling import Uniform_resampling
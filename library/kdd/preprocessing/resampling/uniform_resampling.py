@@ -0,0 +1,182 @@
+"""
+Uniform rate resampling of traces
+"""
+
+#Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
+
+import math
+
+import numpy as np
+
+from ....model import Columnar_trace
+from ....instrumentation import stage
+
+
+def _grid(timestamps,period,origin) :
+    """
+    Return the timestamps of the uniform grid covering the trace : the multiples of
+    period (shifted by origin) from the first event to the last one.
+    """
+
+    first=origin+math.ceil((timestamps[0]-origin)/period)*period
+    size=int(math.floor((timestamps[-1]-first)/period))+1 if timestamps[-1]>=first else 0
+    return first+np.arange(size)*period
+
+def _interpolate(timestamps,latitudes,longitudes,grid,method,maximum_gap) :
+    """
+    Interpolate the trace at the grid timestamps.
+
+    Returns
+    -------
+    latitudes, longitudes : numpy.ndarray<float>
+        the interpolated coordinates, NaN where the grid timestamp falls in a gap longer
+        than maximum_gap (the time between the events around it)
+
+    valid : numpy.ndarray<bool>
+        False where the coordinates are NaN
+    """
+
+    # events [after-1, after] surround each grid timestamp
+    after=np.clip(np.searchsorted(timestamps,grid,side='left'),1,len(timestamps)-1)
+    before=after-1
+    if (method=='linear') :
+        grid_latitudes=np.interp(grid,timestamps,latitudes)
+        grid_longitudes=np.interp(grid,timestamps,longitudes)
+    else :
+        nearest=np.where(grid-timestamps[before]<=timestamps[after]-grid,before,after)
+        grid_latitudes,grid_longitudes=latitudes[nearest],longitudes[nearest]
+    valid=np.ones(len(grid),dtype=bool)
+    if (maximum_gap is not None) :
+        # a grid timestamp falling on an event is always valid
+        valid=(timestamps[after]-timestamps[before]<=maximum_gap)|(timestamps[before]==grid)|(timestamps[after]==grid)
+        grid_latitudes[~valid]=np.nan
+        grid_longitudes[~valid]=np.nan
+    return grid_latitudes,grid_longitudes,valid
+
+def _aggregate(timestamps,latitudes,longitudes,grid,period) :
+    """
+    Return the mean coordinates of the events of each grid bin [t-period/2, t+period/2)
+    and the number of events of each bin.
+    """
+
+    bins=np.floor((timestamps-grid[0])/period+0.5).astype(np.int64)
+    inside=(bins>=0)&(bins<len(grid))
+    bins=bins[inside]
+    counts=np.bincount(bins,minlength=len(grid))
+    with np.errstate(divide='ignore',invalid='ignore') :
+        grid_latitudes=np.bincount(bins,weights=latitudes[inside],minlength=len(grid))/counts
+        grid_longitudes=np.bincount(bins,weights=longitudes[inside],minlength=len(grid))/counts
+    return grid_latitudes,grid_longitudes,counts
+
+def _uniform_resampling(trace,period,method='linear',maximum_gap=None,aggregation=None,origin=0.) :
+    """
+    Resample the trace on a uniform time grid (see Uniform_resampling).
+
+    Returns
+    -------
+    resampled_trace : Columnar_trace
+        the resampled trace
+
+    valid : numpy.ndarray<bool>
+        False for the grid timestamps without coordinates (NaN)
+    """
+
+    if (method not in ('linear','nearest')) : raise Exception("method dosen't exists")
+    if (aggregation not in (None,'mean')) : raise Exception("aggregation dosen't exists")
+    if (period<=0) : raise Exception("period must be positive")
+
+    timestamps,latitudes,longitudes=trace.to_arrays()
+    if (len(timestamps)==0) : return Columnar_trace(),np.zeros(0,dtype=bool)
+    grid=_grid(timestamps,period,origin)
+    if (len(grid)==0) : return Columnar_trace(),np.zeros(0,dtype=bool)
+    if (len(timestamps)==1) :
+        return Columnar_trace(grid,latitudes,longitudes),np.ones(1,dtype=bool)
+
+    grid_latitudes,grid_longitudes,valid=_interpolate(timestamps,latitudes,longitudes,grid,method,maximum_gap)
+    if (aggregation=='mean') :
+        # the bins having events take their mean, the empty ones stay interpolated
+        mean_latitudes,mean_longitudes,counts=_aggregate(timestamps,latitudes,longitudes,grid,period)
+        filled=counts>0
+        grid_latitudes[filled]=mean_latitudes[filled]
+        grid_longitudes[filled]=mean_longitudes[filled]
+        valid|=filled
+    return Columnar_trace(grid,grid_latitudes,grid_longitudes,copy=False),valid
+
+
+class Uniform_resampling :
+    """
+    Resample the trace on a uniform time grid : the events of the resampled trace are
+    the multiples of period (shifted by origin) between the first and the last events
+    of the trace, thus, the following stages can rely on a fixed stride (window sizes in
+    number of events, strided or FFT based operations, ...).
+
+    Parameters
+    ----------
+    period : float
+        the time between two consecutive events of the resampled trace in seconds
+
+    method : {'linear', 'nearest'}, optional
+        'linear' : the position at a grid timestamp is linearly interpolated between the
+        events around it
+        'nearest' : the position at a grid timestamp is the one of the nearest event
+
+    maximum_gap : float, optional
+        the gaps longer than maximum_gap seconds between two consecutive events are not
+        filled, the grid timestamps inside them have NaN coordinates (see valid_mask_).
+        None (default) fills all the gaps
+
+    aggregation : {None, 'mean'}, optional
+        None : the trace is interpolated at each grid timestamp
+        'mean' : for downsampling, the position at a grid timestamp t is the mean of the
+        events in [t-period/2, t+period/2), the bins without event are interpolated
+
+    origin : float, optional
+        the grid timestamps are origin+k*period, default value is 0 (the epoch), thus,
+        the grids of all the traces are aligned
+
+    Attributes
+    ----------
+    resampled_trace_ : Columnar_trace
+        the resampled trace (NaN coordinates in the unfilled gaps)
+
+    valid_mask_ : numpy.ndarray<bool>
+        True for the events of the resampled trace having coordinates
+
+    Notes
+    -----
+        - The computational complexity is O(n+m log n) where m is the size of the grid.
+        - The events are expected to be ordered by datetime.
+        - The mean of the coordinates is in the euclidean space (see Position.euclidean_distance).
+    """
+
+    # the resampling works directly on the arrays of a Columnar_trace (see Pipeline)
+    _columnar=True
+
+    def __init__(self,period,method='linear',maximum_gap=None,aggregation=None,origin=0.) :
+        if (method not in ('linear','nearest')) : raise Exception("method dosen't exists")
+        if (aggregation not in (None,'mean')) : raise Exception("aggregation dosen't exists")
+        self.period=period
+        self.method=method
+        self.maximum_gap=maximum_gap
+        self.aggregation=aggregation
+        self.origin=origin
+
+    def fit(self,trace) :
+        """
+        Resample the trace on a uniform time grid.
+
+        Parameters
+        ----------
+        trace : Trace
+            A Trace object (see Trace in Model)
+
+        Returns
+        -------
+        resampled_trace_ : Columnar_trace
+            the resampled trace (NaN coordinates in the unfilled gaps, see valid_mask_)
+        """
+
+        with stage("Uniform_resampling",len(trace)) as record :
+            self.resampled_trace_,self.valid_mask_=_uniform_resampling(trace,self.period,self.method,self.maximum_gap,self.aggregation,self.origin)
+            record.events_out=len(self.resampled_trace_)
+        return self.resampled_trace_
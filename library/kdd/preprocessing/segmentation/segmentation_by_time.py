@@ -4,7 +4,10 @@ Trace segmentation by time
 
 #Author : Belfodil Aimene <aimene.belfodil@insa-lyon.fr>
 
-from ....model import Trace
+import numpy as np
+
+from ....model import Trace,Columnar_trace
+from ....instrumentation import stage
 
 def _segment_by_time(trace,maximum_time_difference=1800) :
     """
@@ -30,6 +33,8 @@ def _segment_by_time(trace,maximum_time_difference=1800) :
     -----
     The computational complexity is O(n)
     """
+
+    if (isinstance(trace,Columnar_trace)) : return _segment_by_time_columnar(trace,maximum_time_difference)
     
     segmented_trace=[]
     current_segment=Trace()
@@ -42,9 +47,51 @@ def _segment_by_time(trace,maximum_time_difference=1800) :
         else :
             segmented_trace.append(current_segment)
             current_segment=Trace()
+            current_segment.add_event(current_event)
         last_event=current_event
+    if (len(current_segment)>0) :
+        segmented_trace.append(current_segment)
     return segmented_trace
 
+def _segment_by_time_columnar(trace,maximum_time_difference=1800) :
+    """
+    Segment a columnar trace, the segments are views of the arrays of the
+    trace (no copy, no Event object is created).
+
+    Parameters
+    ----------
+    trace : Columnar_trace
+        A Columnar_trace object (see Columnar_trace in Model)
+
+    maximum_time_difference : float, optional
+        float value in seconds, two consecutive event which time
+        difference exceed maximum_time_difference are in two
+        different segments.
+
+    Returns
+    -------
+    segmented_trace : list<Columnar_trace>
+        the segmented trace as list of columnar trace (all event are took in count).
+
+    Notes
+    -----
+    The computational complexity is O(n)
+    """
+
+    starts,ends=_segment_bounds(trace.timestamps,maximum_time_difference)
+    return [trace.segment(start,end) for start,end in zip(starts,ends)]
+
+def _segment_bounds(timestamps,maximum_time_difference=1800) :
+    """
+    Return the bounds [starts[k],ends[k]) of the indices of the events of each segment.
+    """
+
+    if (len(timestamps)==0) : return np.zeros(0,dtype=np.int64),np.zeros(0,dtype=np.int64)
+    boundaries=np.flatnonzero(np.diff(timestamps)>maximum_time_difference)+1
+    starts=np.concatenate(([0],boundaries))
+    ends=np.concatenate((boundaries,[len(timestamps)]))
+    return starts,ends
+
 
 class Segmentation_by_time :
     """
@@ -62,8 +109,12 @@ class Segmentation_by_time :
     ---------
     segmented_trace_ : list<Trace>
         the segmented trace as list of trace (all event are took in count).
+        the segments of a Columnar_trace are Columnar_trace sharing its arrays.
     """
 
+    # the segmentation works directly on the arrays of a Columnar_trace (see Pipeline)
+    _columnar=True
+
     def __init__(self,maximum_time_difference=1800) :
         self.maximum_time_difference=maximum_time_difference
 
@@ -83,5 +134,28 @@ class Segmentation_by_time :
             the segmented trace as list of trace (all event are took in count).
         """
 
-        self.segmented_trace_=_segment_by_time(trace,maximum_time_difference=self.maximum_time_difference)
+        with stage("Segmentation_by_time",len(trace)) as record :
+            self.segmented_trace_=_segment_by_time(trace,maximum_time_difference=self.maximum_time_difference)
+            record.events_out=sum(len(segment) for segment in self.segmented_trace_)
         return self.segmented_trace_
+
+    def segment_columns(self,timestamps,latitudes,longitudes) :
+        """
+        Segment the columns of a trace, no trace is built before the segments (see Pipeline).
+
+        Parameters
+        ----------
+        timestamps, latitudes, longitudes : numpy.ndarray<float>
+            the columns of the trace (see Trace.to_arrays)
+
+        Returns
+        -------
+        segmented_trace : list<Columnar_trace>
+            the segments, views of the given columns
+        """
+
+        with stage("Segmentation_by_time",len(timestamps)) as record :
+            starts,ends=_segment_bounds(timestamps,self.maximum_time_difference)
+            segmented_trace=[Columnar_trace(timestamps[start:end],latitudes[start:end],longitudes[start:end],copy=False) for start,end in zip(starts,ends)]
+            record.events_out=len(timestamps)
+        return segmented_trace
@@ -1,4 +1,10 @@
-from position import Position
+from position import Position,geodesic_distances,euclidean_distances,bearings
 from event import Event
+from trace_statistics import Trace_statistics
 from trace import Trace
+from columnar_trace import Columnar_trace
+from reduced_precision_trace import Reduced_precision_trace
+from trace_collection import Trace_collection
 from stay_point import Stay_point
+from trip import Trip
+from time_conversion import datetime_to_timestamp,timestamp_to_datetime
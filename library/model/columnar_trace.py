@@ -0,0 +1,221 @@
+import numpy as np
+from event import Event
+from time_conversion import datetime_to_timestamp,timestamp_to_datetime
+from trace_statistics import Trace_statistics
+from position import geodesic_distances,euclidean_distances
+
+class Columnar_trace :
+    """
+    This class models a Mobility Trace stored as columns (numpy arrays).
+    It can be used everywhere a Trace is expected (__len__, __getitem__,
+    __iter__, add_event, add_events and to_arrays behave as in Trace), the
+    Event objects are only created when they are accessed.
+    Algorithms supporting columnar traces work directly on the arrays.
+
+    Parameters
+    ----------
+
+    timestamps : array-like<float>, optional
+        the datetime of each event in seconds since the epoch (1970-01-01 UTC)
+
+    latitudes : array-like<float>, optional
+        the latitude of each event
+
+    longitudes : array-like<float>, optional
+        the longitude of each event
+
+    copy : bool, optional
+        if False, the given float64 arrays are used as storage without any copy
+        (the trace is then a view of the arrays), default value is True
+
+
+    Attributes
+    ----------
+
+    timestamps : numpy.ndarray<float>
+        the datetime of each event in seconds since the epoch (ordered by increasing datetime)
+
+    latitudes : numpy.ndarray<float>
+        the latitude of each event
+
+    longitudes : numpy.ndarray<float>
+        the longitude of each event
+    """
+
+    # the cached summary statistics (see statistics), None until they are computed
+    _statistics=None
+
+    def __init__(self,timestamps=None,latitudes=None,longitudes=None,copy=True) :
+        if (timestamps is None) : timestamps,latitudes,longitudes=[],[],[]
+        as_column=np.array if copy else np.asarray
+        self._timestamps=as_column(timestamps,dtype=np.float64).reshape(-1)
+        self._latitudes=as_column(latitudes,dtype=np.float64).reshape(-1)
+        self._longitudes=as_column(longitudes,dtype=np.float64).reshape(-1)
+        if (not len(self._timestamps)==len(self._latitudes)==len(self._longitudes)) :
+            raise Exception("columns of different sizes")
+        self._size=len(self._timestamps)
+
+    @classmethod
+    def from_trace(cls,trace) :
+        """
+        Return the columnar version of a trace.
+
+        Parameters
+        ----------
+
+        trace : Trace
+            A Trace object (see Trace in Model) or any object having a to_arrays method
+
+        Returns
+        -------
+
+        columnar_trace : Columnar_trace
+            the columnar trace (the trace itself if it is already columnar)
+        """
+
+        if (isinstance(trace,Columnar_trace)) : return trace
+        timestamps,latitudes,longitudes=trace.to_arrays()
+        return cls(timestamps,latitudes,longitudes,copy=False)
+
+    def to_trace(self) :
+        """
+        Return the trace as a Trace object (all the events are created).
+        """
+
+        from trace import Trace
+        trace=Trace()
+        trace.add_events(*list(self))
+        return trace
+
+    @property
+    def timestamps(self) :
+        return self._timestamps[:self._size]
+
+    @property
+    def latitudes(self) :
+        return self._latitudes[:self._size]
+
+    @property
+    def longitudes(self) :
+        return self._longitudes[:self._size]
+
+    def to_arrays(self) :
+        """
+        Return the columns of the trace (views, no copy).
+
+        Returns
+        -------
+
+        timestamps : numpy.ndarray<float>
+            the datetime of each event in seconds since the epoch (1970-01-01 UTC)
+
+        latitudes : numpy.ndarray<float>
+            the latitude of each event
+
+        longitudes : numpy.ndarray<float>
+            the longitude of each event
+        """
+
+        return self.timestamps,self.latitudes,self.longitudes
+
+    def distances(self,first,second,distance='geodesic') :
+        """
+        Return the distances between the events first[k] and second[k], only the
+        coordinates of these events are read.
+
+        Parameters
+        ----------
+
+        first, second : numpy.ndarray<int>
+            the indices of the events
+
+        distance : {'geodesic', 'euclidean'}, optional
+            the geodesic distance in meter or the euclidean distance in degree
+            (see geodesic_distances and euclidean_distances), default value is 'geodesic'
+
+        Returns
+        -------
+
+        distances : numpy.ndarray<float>
+            the distance between each pair of events
+        """
+
+        latitudes,longitudes=self.latitudes,self.longitudes
+        distance_function=geodesic_distances if distance=='geodesic' else euclidean_distances
+        return distance_function(latitudes[first],longitudes[first],latitudes[second],longitudes[second])
+
+    def segment(self,start,end) :
+        """
+        Return the events [start,end) as a Columnar_trace sharing the arrays of
+        this trace (no copy).
+        """
+
+        return Columnar_trace(self._timestamps[start:min(end,self._size)],self._latitudes[start:min(end,self._size)],self._longitudes[start:min(end,self._size)],copy=False)
+
+    def _reserve(self,size) :
+        """
+        Grow the storage (capacity doubling) so that it can hold size events.
+        """
+
+        capacity=len(self._timestamps)
+        if (size<=capacity) : return
+        capacity=max(size,2*capacity,16)
+        for name in ('_timestamps','_latitudes','_longitudes') :
+            column=np.empty(capacity,dtype=getattr(self,name).dtype)
+            column[:self._size]=getattr(self,name)[:self._size]
+            setattr(self,name,column)
+
+    def statistics(self) :
+        """
+        Return the summary statistics of the trace (see Trace.statistics), computed
+        on the columns at the first call then updated by add_event and add_events.
+        The columns are views : modifying them in place requires a call to
+        invalidate_statistics.
+        """
+
+        if (self._statistics is None) : self._statistics=Trace_statistics(*self.to_arrays())
+        return self._statistics
+
+    def invalidate_statistics(self) :
+        self._statistics=None
+
+    def has_statistics(self) :
+        """
+        Return True if the statistics are cached (statistics is then O(1)).
+        """
+
+        return self._statistics is not None
+
+    def add_event(self,event) :
+        self._reserve(self._size+1)
+        self._timestamps[self._size]=datetime_to_timestamp(event.datetime)
+        self._latitudes[self._size]=event.latitude
+        self._longitudes[self._size]=event.longitude
+        self._size+=1
+        if (self._statistics is not None) :
+            self._statistics.update(self._timestamps[self._size-1],event.latitude,event.longitude)
+
+    def add_events(self,*events) :
+        self._reserve(self._size+len(events))
+        for event in events :
+            self.add_event(event)
+
+    def _event(self,index) :
+        return Event(timestamp_to_datetime(self._timestamps[index]),self._latitudes[index],self._longitudes[index])
+
+    def __len__(self) :
+        return self._size
+
+    def __list__(self) :
+        return list(self)
+
+    def __getitem__(self,key) :
+        if (isinstance(key,slice)) :
+            return [self._event(index) for index in range(*key.indices(self._size))]
+        if (key<0) : key+=self._size
+        if (not 0<=key<self._size) : raise IndexError("trace index out of range")
+        return self._event(key)
+
+    def __iter__(self) :
+        for index in range(self._size) :
+            yield self._event(index)
@@ -47,7 +47,7 @@ class Position :
         """
         
         latitude1,longitude1,latitude2,longitude2=self.latitude,self.longitude,other.latitude,other.longitude
-        if (latitude1==latitude1 and longitude1==longitude2) : return 0
+        if (latitude1==latitude2 and longitude1==longitude2) : return 0
         const = Const()
         earth_radius=const.earth_radius
         degrees_to_radians = math.pi/180
@@ -103,7 +103,7 @@ class Position :
             The bearing from the self event to other event in degree between 0 and 360.
         """
         
-        latitude1,longitude1,latitude2,longitude2=self.latitude,self.longitude,other.latitude,other.longitude
+        latitude1,longitude1,latitude2,longitude2=math.radians(self.latitude),math.radians(self.longitude),math.radians(other.latitude),math.radians(other.longitude)
         radians_to_degrees = 180 / math.pi
         longitude_difference=longitude2-longitude1
         y = math.sin(longitude_difference) * math.cos(latitude2)
@@ -114,3 +114,55 @@ class Position :
 
     def __str__(self) :
         return str((self.latitude,self.longitude))
+
+
+def geodesic_distances(latitudes1,longitudes1,latitudes2,longitudes2) :
+    """
+    Return the geodisic distances in meter between arrays of positions
+    (vectorized version of Position.geodisic_distance).
+
+    Parameters
+    ----------
+
+    latitudes1, longitudes1, latitudes2, longitudes2 : array-like<float>
+        the coordinates of the first and of the second positions (broadcasted together)
+
+    Returns
+    -------
+
+    distances : numpy.ndarray<float>
+        the distance between each pair of positions in meter
+
+    Notes
+    -----
+    The haversine formula is used, it gives the same distance as Position.geodisic_distance
+    but stays accurate for close positions (a few meters).
+    """
+
+    latitudes1,longitudes1=np.radians(latitudes1),np.radians(longitudes1)
+    latitudes2,longitudes2=np.radians(latitudes2),np.radians(longitudes2)
+    sin_latitude=np.sin((latitudes2-latitudes1)/2)
+    sin_longitude=np.sin((longitudes2-longitudes1)/2)
+    haversine=sin_latitude*sin_latitude+np.cos(latitudes1)*np.cos(latitudes2)*sin_longitude*sin_longitude
+    return 2*Const().earth_radius*np.arcsin(np.sqrt(np.clip(haversine,0.,1.)))
+
+def euclidean_distances(latitudes1,longitudes1,latitudes2,longitudes2) :
+    """
+    Return the euclidean distances between arrays of positions (vectorized version of
+    Position.euclidean_distance, 0.00001 is approximately 1 meter).
+    """
+
+    return np.hypot(np.subtract(latitudes2,latitudes1),np.subtract(longitudes2,longitudes1))
+
+def bearings(latitudes1,longitudes1,latitudes2,longitudes2) :
+    """
+    Return the bearings in degree between 0 and 360 from arrays of positions to
+    other arrays of positions (vectorized version of Position.bearing).
+    """
+
+    latitudes1,longitudes1=np.radians(latitudes1),np.radians(longitudes1)
+    latitudes2,longitudes2=np.radians(latitudes2),np.radians(longitudes2)
+    longitude_difference=longitudes2-longitudes1
+    y=np.sin(longitude_difference)*np.cos(latitudes2)
+    x=np.cos(latitudes1)*np.sin(latitudes2)-np.sin(latitudes1)*np.cos(latitudes2)*np.cos(longitude_difference)
+    return np.mod(np.degrees(np.arctan2(y,x)),360.)
@@ -0,0 +1,207 @@
+import numpy as np
+from event import Event
+from columnar_trace import Columnar_trace
+from time_conversion import datetime_to_timestamp,timestamp_to_datetime
+from position import geodesic_distances
+
+class Reduced_precision_trace(Columnar_trace) :
+    """
+    This class models a columnar Mobility Trace (see Columnar_trace) whose coordinates
+    are stored in reduced precision as offsets from an origin : float32 offsets in degree
+    or int32 offsets in units of resolution degree. The stored coordinates take half the
+    memory of a Columnar_trace, the timestamps stay in float64.
+
+    The trace can be used everywhere a Columnar_trace is expected : latitudes, longitudes,
+    to_arrays and the events give the decoded float64 coordinates, thus, all the
+    algorithms work on it (with the error below). Each access to latitudes, longitudes
+    or to_arrays decodes the whole columns to new float64 arrays : the algorithms using
+    them (the smoothing filters, RDP_compression, Stay_points, ...) read full precision
+    copies and only gain the storage of the trace. The distances method reads the stored
+    offsets of the requested events only (the euclidean distance is computed on the
+    offsets, no coordinate is decoded), Speed_filter computes its distances with it, thus,
+    its distance loop reads the reduced precision columns.
+
+    Parameters
+    ----------
+
+    timestamps : array-like<float>, optional
+        the datetime of each event in seconds since the epoch (1970-01-01 UTC)
+
+    latitudes : array-like<float>, optional
+        the latitude of each event
+
+    longitudes : array-like<float>, optional
+        the longitude of each event
+
+    dtype : {'float32', 'int32'}, optional
+        the storage of the offsets, default value is 'float32'
+
+    origin : 2-tuple, optional
+        the (latitude, longitude) origin of the offsets, default value is the first
+        event of the trace (or (0,0) for an empty trace)
+
+    resolution : float, optional
+        the unit in degree of the int32 offsets, default value is 1e-7 (approximately
+        1.1 centimeter), the offsets range is then +/-214.7 degrees from the origin,
+        a farther coordinate raises an exception (e.g. a trace crossing the antimeridian,
+        use a coarser resolution or 'float32')
+
+
+    Attributes
+    ----------
+
+    origin : 2-tuple
+        the (latitude, longitude) origin of the offsets
+
+    Notes
+    -----
+    Worst-case error of a decoded coordinate (see coordinate_error_bound) :
+
+    - 'int32' : resolution/2, i.e. 5e-8 degree (approximately 5.6 millimeters) by default,
+      whatever the extent of the trace.
+    - 'float32' : D*2^-24 where D is the largest offset from the origin, i.e. 3e-8 degree
+      (approximately 3.3 millimeters) for a trace within 0.5 degree (55 kilometers) of its
+      origin and 6e-7 degree (6.6 centimeters) within 10 degrees.
+
+    A euclidean distance (see Position.euclidean_distance) between two decoded positions
+    is then wrong by at most 2*sqrt(2) times the coordinate error.
+    """
+
+    def __init__(self,timestamps=None,latitudes=None,longitudes=None,dtype='float32',origin=None,resolution=1e-7) :
+        if (dtype not in ('float32','int32')) : raise Exception("dtype dosen't exists")
+        if (timestamps is None) : timestamps,latitudes,longitudes=[],[],[]
+        timestamps=np.array(timestamps,dtype=np.float64).reshape(-1)
+        latitudes=np.asarray(latitudes,dtype=np.float64).reshape(-1)
+        longitudes=np.asarray(longitudes,dtype=np.float64).reshape(-1)
+        if (not len(timestamps)==len(latitudes)==len(longitudes)) :
+            raise Exception("columns of different sizes")
+        if (origin is None) : origin=(latitudes[0],longitudes[0]) if len(latitudes) else (0.,0.)
+        self.origin=(float(origin[0]),float(origin[1]))
+        self.dtype=np.dtype(dtype)
+        self.resolution=resolution
+        self._timestamps=timestamps
+        self._latitudes=self._encode(latitudes,self.origin[0])
+        self._longitudes=self._encode(longitudes,self.origin[1])
+        self._size=len(timestamps)
+
+    @classmethod
+    def from_trace(cls,trace,dtype='float32',origin=None,resolution=1e-7) :
+        """
+        Return the reduced precision version of a trace.
+
+        Parameters
+        ----------
+
+        trace : Trace
+            A Trace object (see Trace in Model) or any object having a to_arrays method
+
+        dtype, origin, resolution : optional
+            see Reduced_precision_trace
+
+        Returns
+        -------
+
+        reduced_precision_trace : Reduced_precision_trace
+            the trace with reduced precision coordinates (the trace itself if it is
+            already a Reduced_precision_trace)
+        """
+
+        if (isinstance(trace,Reduced_precision_trace)) : return trace
+        timestamps,latitudes,longitudes=trace.to_arrays()
+        return cls(timestamps,latitudes,longitudes,dtype=dtype,origin=origin,resolution=resolution)
+
+    def _encode(self,coordinates,origin) :
+        if (self.dtype==np.int32) :
+            offsets=np.round((coordinates-origin)/self.resolution)
+            if (np.size(offsets) and np.abs(offsets).max()>np.iinfo(np.int32).max) :
+                raise Exception("coordinate too far from the origin for the int32 offsets (see resolution)")
+            return offsets.astype(np.int32)
+        return (coordinates-origin).astype(np.float32)
+
+    def _decode(self,offsets,origin) :
+        if (self.dtype==np.int32) : return origin+offsets*self.resolution
+        return origin+offsets.astype(np.float64)
+
+    @property
+    def latitudes(self) :
+        return self._decode(self._latitudes[:self._size],self.origin[0])
+
+    @property
+    def longitudes(self) :
+        return self._decode(self._longitudes[:self._size],self.origin[1])
+
+    def distances(self,first,second,distance='geodesic') :
+        """
+        Return the distances between the events first[k] and second[k] (see
+        Columnar_trace.distances) from the stored offsets of these events only.
+        """
+
+        latitude_offsets,longitude_offsets=self.offsets()
+        if (distance=='geodesic') :
+            return geodesic_distances(self._decode(latitude_offsets[first],self.origin[0]),self._decode(longitude_offsets[first],self.origin[1]),
+                                      self._decode(latitude_offsets[second],self.origin[0]),self._decode(longitude_offsets[second],self.origin[1]))
+        # the origin cancels out : the distance is the one of the offsets
+        latitude_differences=latitude_offsets[second].astype(np.float64)-latitude_offsets[first]
+        longitude_differences=longitude_offsets[second].astype(np.float64)-longitude_offsets[first]
+        distances=np.hypot(latitude_differences,longitude_differences)
+        if (self.dtype==np.int32) : distances*=self.resolution
+        return distances
+
+    def offsets(self) :
+        """
+        Return the stored offsets of the coordinates (views, no copy), e.g. to
+        serialize them or to compute distances (see distances).
+
+        Returns
+        -------
+
+        latitude_offsets, longitude_offsets : numpy.ndarray<float32 or int32>
+            the offsets from the origin (in degree or in units of resolution)
+        """
+
+        return self._latitudes[:self._size],self._longitudes[:self._size]
+
+    def coordinate_error_bound(self) :
+        """
+        Return the worst-case absolute error (in degree) of the decoded coordinates of the
+        trace : the error of the offsets (see Notes) plus the float64 rounding of the
+        encoding and of the decoding (below 1e-13 degree).
+        """
+
+        if (self._size==0) : return 0.
+        largest_offset=float(max(np.abs(self._latitudes[:self._size]).max(),np.abs(self._longitudes[:self._size]).max()))
+        if (self.dtype==np.int32) : largest_offset*=self.resolution
+        largest_coordinate=max(abs(self.origin[0]),abs(self.origin[1]))+largest_offset
+        rounding=largest_coordinate*2.**-50
+        if (self.dtype==np.int32) : return self.resolution/2.+rounding
+        return largest_offset*2.**-24+rounding
+
+    def segment(self,start,end) :
+        """
+        Return the events [start,end) as a Reduced_precision_trace sharing the arrays of
+        this trace (no copy).
+        """
+
+        end=min(end,self._size)
+        segment=Reduced_precision_trace(dtype=self.dtype.name,origin=self.origin,resolution=self.resolution)
+        segment._timestamps=self._timestamps[start:end]
+        segment._latitudes=self._latitudes[start:end]
+        segment._longitudes=self._longitudes[start:end]
+        segment._size=len(segment._timestamps)
+        return segment
+
+    def add_event(self,event) :
+        self._reserve(self._size+1)
+        self._timestamps[self._size]=datetime_to_timestamp(event.datetime)
+        self._latitudes[self._size]=self._encode(np.float64(event.latitude),self.origin[0])
+        self._longitudes[self._size]=self._encode(np.float64(event.longitude),self.origin[1])
+        self._size+=1
+        if (self._statistics is not None) :
+            # the statistics are the ones of the decoded coordinates (see to_arrays)
+            index=self._size-1
+            self._statistics.update(self._timestamps[index],self._decode(self._latitudes[index],self.origin[0]),self._decode(self._longitudes[index],self.origin[1]))
+
+    def _event(self,index) :
+        latitude=self._decode(self._latitudes[index],self.origin[0])
+        longitude=self._decode(self._longitudes[index],self.origin[1])
+        return Event(timestamp_to_datetime(self._timestamps[index]),float(latitude),float(longitude))
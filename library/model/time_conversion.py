@@ -0,0 +1,41 @@
+import calendar,datetime
+
+def datetime_to_timestamp(date_time) :
+    """
+    Return the number of seconds elapsed since the epoch (1970-01-01 UTC).
+    Naive datetime objects are considered as UTC datetime.
+
+    Parameters
+    ----------
+
+    date_time : datetime.datetime (datetime python package)
+        the datetime to convert
+
+    Returns
+    -------
+
+    timestamp : float
+        seconds elapsed since the epoch
+    """
+
+    return calendar.timegm(date_time.utctimetuple())+date_time.microsecond/1000000.
+
+def timestamp_to_datetime(timestamp) :
+    """
+    Return the naive UTC datetime corresponding to a number of seconds
+    elapsed since the epoch (1970-01-01 UTC).
+
+    Parameters
+    ----------
+
+    timestamp : float
+        seconds elapsed since the epoch
+
+    Returns
+    -------
+
+    date_time : datetime.datetime (datetime python package)
+        the corresponding naive datetime (UTC)
+    """
+
+    return datetime.datetime(1970,1,1)+datetime.timedelta(seconds=float(timestamp))
@@ -1,3 +1,14 @@
+import numpy as np
+from time_conversion import datetime_to_timestamp
+from trace_statistics import Trace_statistics
+
+def _events_to_arrays(events) :
+    events_count=len(events)
+    timestamps=np.fromiter((datetime_to_timestamp(event.datetime) for event in events),dtype=np.float64,count=events_count)
+    latitudes=np.fromiter((event.latitude for event in events),dtype=np.float64,count=events_count)
+    longitudes=np.fromiter((event.longitude for event in events),dtype=np.float64,count=events_count)
+    return timestamps,latitudes,longitudes
+
 class Trace :
     """
     This class models a Mobility Trace of a moving object in time.
@@ -9,21 +20,59 @@ class Trace :
 
     __events : list<Event>
         list of event ordered by increasing datetime (by construction) 
+
+    __statistics : Trace_statistics
+        the cached summary statistics (None until statistics is called)
     """
     
     def __init__(self) :
         self.__events=[]
+        self.__statistics=None
 
     def add_event(self,event) :
         self.__events.append(event)
+        if (self.__statistics is not None) :
+            self.__statistics.update(datetime_to_timestamp(event.datetime),event.latitude,event.longitude)
         
     def add_events(self,*events) :
         self.__events.extend(events)
+        if (self.__statistics is not None) :
+            self.__statistics.extend(*_events_to_arrays(events))
+
+    def statistics(self) :
+        """
+        Return the summary statistics of the trace (count, time range, bounding box,
+        path length, see Trace_statistics). They are computed on the arrays of the trace
+        at the first call then updated by add_event and add_events, thus, the next calls
+        are O(1).
+        The events given by __list__ may be modified : the cache is then invalidated.
+        An event modified in place requires a call to invalidate_statistics.
+
+        Returns
+        -------
+
+        statistics : Trace_statistics
+            the statistics of the trace (do not modify them)
+        """
+
+        if (self.__statistics is None) : self.__statistics=Trace_statistics(*self.to_arrays())
+        return self.__statistics
+
+    def invalidate_statistics(self) :
+        self.__statistics=None
+
+    def has_statistics(self) :
+        """
+        Return True if the statistics are cached (statistics is then O(1)).
+        """
+
+        return self.__statistics is not None
 
     def __len__(self) :
         return len(self.__events)
 
     def __list__(self) :
+        self.__statistics=None
         return self.__events
 
     def __getitem__(self,key) :
@@ -32,5 +81,25 @@ class Trace :
     def __iter__(self) :
         return iter(self.__events)
 
+    def to_arrays(self) :
+        """
+        Return the trace as three numpy arrays (timestamps, latitudes, longitudes)
+        where timestamps are the number of seconds elapsed since the epoch.
+
+        Returns
+        -------
+
+        timestamps : numpy.ndarray<float>
+            the datetime of each event in seconds since the epoch (1970-01-01 UTC)
+
+        latitudes : numpy.ndarray<float>
+            the latitude of each event
+
+        longitudes : numpy.ndarray<float>
+            the longitude of each event
+        """
+
+        return _events_to_arrays(self.__events)
+
     
     
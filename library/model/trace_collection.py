@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+import numpy as np
+from trace_statistics import Trace_statistics
+
+class Trace_collection :
+    """
+    This class models a collection of Mobility Traces indexed by the identifier
+    of their moving object (device).
+    The collection is seen as a dictionary device_id -> trace :
+    (__getitem__, __contains__, __iter__ and __len__ methods are overloaded,
+    the iteration is done on the device identifiers in insertion order)
+
+    Parameters
+    ----------
+
+    traces : dict<id,Trace> or list<(id,Trace)>, optional
+        the initial traces
+
+
+    Attributes
+    ----------
+
+    __traces : OrderedDict<id,Trace>
+        the traces indexed by device identifier
+    """
+
+    def __init__(self,traces=None) :
+        self.__traces=OrderedDict()
+        if (traces is not None) :
+            items=traces.items() if isinstance(traces,dict) else traces
+            for device_id,trace in items :
+                self.add_trace(device_id,trace)
+
+    def add_trace(self,device_id,trace) :
+        self.__traces[device_id]=trace
+
+    def device_ids(self) :
+        return list(self.__traces.keys())
+
+    def items(self) :
+        return list(self.__traces.items())
+
+    def __len__(self) :
+        return len(self.__traces)
+
+    def __getitem__(self,device_id) :
+        return self.__traces[device_id]
+
+    def __contains__(self,device_id) :
+        return device_id in self.__traces
+
+    def __iter__(self) :
+        return iter(self.__traces)
+
+    def statistics(self) :
+        """
+        Return the summary statistics of the collection, merged from the cached
+        statistics of its traces (see Trace.statistics and Trace_statistics.merge).
+        """
+
+        return Trace_statistics.merge(self.__traces[device_id].statistics() for device_id in self.__traces)
+
+    def to_arrays(self) :
+        """
+        Return all the traces as concatenated columns.
+
+        Returns
+        -------
+
+        device_ids : list
+            the device identifiers in collection order
+
+        offsets : numpy.ndarray<int>
+            the events of the k-th trace are [offsets[k],offsets[k+1])
+
+        timestamps, latitudes, longitudes : numpy.ndarray<float>
+            the concatenated columns of the traces (see Trace.to_arrays)
+        """
+
+        device_ids=self.device_ids()
+        columns=[self.__traces[device_id].to_arrays() for device_id in device_ids]
+        sizes=[len(timestamps) for timestamps,latitudes,longitudes in columns]
+        offsets=np.concatenate(([0],np.cumsum(sizes))).astype(np.int64)
+        if (not columns) : return device_ids,offsets,np.empty(0),np.empty(0),np.empty(0)
+        timestamps,latitudes,longitudes=(np.concatenate(column) for column in zip(*columns))
+        return device_ids,offsets,timestamps,latitudes,longitudes
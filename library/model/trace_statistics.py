@@ -0,0 +1,185 @@
+import numpy as np
+from position import geodesic_distances
+
+class Trace_statistics :
+    """
+    This class models the summary statistics of a Mobility Trace : number of events,
+    time range, bounding box and path length. The statistics are computed once on the
+    columns of a trace (vectorized) then updated in O(1) for each appended event
+    (see Trace.statistics).
+
+    Parameters
+    ----------
+
+    timestamps : numpy.ndarray<float>, optional
+        the datetime of each event in seconds since the epoch (1970-01-01 UTC)
+
+    latitudes : numpy.ndarray<float>, optional
+        the latitude of each event
+
+    longitudes : numpy.ndarray<float>, optional
+        the longitude of each event
+
+
+    Attributes
+    ----------
+
+    count : int
+        the number of events
+
+    starting_timestamp, ending_timestamp : float
+        the first and the last datetime in seconds since the epoch (None if there is no event)
+
+    minimum_latitude, minimum_longitude, maximum_latitude, maximum_longitude : float
+        the bounding box of the events (None if there is no event)
+
+    path_length : float
+        the geodisic distance in meter along the consecutive events
+
+    Notes
+    -----
+    The statistics of a collection (see merge) sum the path lengths and the sampling
+    intervals of its traces, the gaps between two traces are not counted.
+    """
+
+    def __init__(self,timestamps=None,latitudes=None,longitudes=None) :
+        self.count=0
+        self.starting_timestamp=self.ending_timestamp=None
+        self.minimum_latitude=self.minimum_longitude=None
+        self.maximum_latitude=self.maximum_longitude=None
+        self.path_length=0.
+        # sum and number of the time differences between consecutive events
+        self._elapsed=0.
+        self._intervals=0
+        # (timestamp, latitude, longitude) of the last appended event
+        self._last_event=None
+        if (timestamps is not None) : self.extend(timestamps,latitudes,longitudes)
+
+    def _start(self,timestamp,latitude,longitude) :
+        self.count=1
+        self.starting_timestamp=self.ending_timestamp=timestamp
+        self.minimum_latitude=self.maximum_latitude=latitude
+        self.minimum_longitude=self.maximum_longitude=longitude
+        self._last_event=(timestamp,latitude,longitude)
+
+    def update(self,timestamp,latitude,longitude) :
+        """
+        Update the statistics with one appended event (O(1)).
+        """
+
+        timestamp,latitude,longitude=float(timestamp),float(latitude),float(longitude)
+        if (self.count==0) : return self._start(timestamp,latitude,longitude)
+        last_timestamp,last_latitude,last_longitude=self._last_event
+        self.path_length+=float(geodesic_distances(last_latitude,last_longitude,latitude,longitude))
+        self._elapsed+=timestamp-last_timestamp
+        self._intervals+=1
+        self.count+=1
+        self.starting_timestamp=min(self.starting_timestamp,timestamp)
+        self.ending_timestamp=max(self.ending_timestamp,timestamp)
+        self.minimum_latitude=min(self.minimum_latitude,latitude)
+        self.maximum_latitude=max(self.maximum_latitude,latitude)
+        self.minimum_longitude=min(self.minimum_longitude,longitude)
+        self.maximum_longitude=max(self.maximum_longitude,longitude)
+        self._last_event=(timestamp,latitude,longitude)
+
+    def extend(self,timestamps,latitudes,longitudes) :
+        """
+        Update the statistics with the columns of appended events (vectorized).
+        """
+
+        timestamps=np.asarray(timestamps,dtype=np.float64)
+        latitudes=np.asarray(latitudes,dtype=np.float64)
+        longitudes=np.asarray(longitudes,dtype=np.float64)
+        if (len(timestamps)==0) : return
+        if (self.count==0) :
+            self._start(float(timestamps[0]),float(latitudes[0]),float(longitudes[0]))
+            timestamps,latitudes,longitudes=timestamps[1:],latitudes[1:],longitudes[1:]
+            if (len(timestamps)==0) : return
+        last_timestamp,last_latitude,last_longitude=self._last_event
+        previous_latitudes=np.concatenate(([last_latitude],latitudes[:-1]))
+        previous_longitudes=np.concatenate(([last_longitude],longitudes[:-1]))
+        self.path_length+=float(geodesic_distances(previous_latitudes,previous_longitudes,latitudes,longitudes).sum())
+        self._elapsed+=float(timestamps[-1])-last_timestamp
+        self._intervals+=len(timestamps)
+        self.count+=len(timestamps)
+        self.starting_timestamp=min(self.starting_timestamp,float(timestamps.min()))
+        self.ending_timestamp=max(self.ending_timestamp,float(timestamps.max()))
+        self.minimum_latitude=min(self.minimum_latitude,float(latitudes.min()))
+        self.maximum_latitude=max(self.maximum_latitude,float(latitudes.max()))
+        self.minimum_longitude=min(self.minimum_longitude,float(longitudes.min()))
+        self.maximum_longitude=max(self.maximum_longitude,float(longitudes.max()))
+        self._last_event=(float(timestamps[-1]),float(latitudes[-1]),float(longitudes[-1]))
+
+    @classmethod
+    def merge(cls,statistics) :
+        """
+        Return the statistics of a collection of traces from the statistics of its
+        traces (O(number of traces)).
+
+        Parameters
+        ----------
+
+        statistics : iterable<Trace_statistics>
+            the statistics of each trace
+        """
+
+        merged=cls()
+        for trace_statistics in statistics :
+            if (trace_statistics.count==0) : continue
+            if (merged.count==0) :
+                merged.starting_timestamp,merged.ending_timestamp=trace_statistics.starting_timestamp,trace_statistics.ending_timestamp
+                merged.minimum_latitude,merged.maximum_latitude=trace_statistics.minimum_latitude,trace_statistics.maximum_latitude
+                merged.minimum_longitude,merged.maximum_longitude=trace_statistics.minimum_longitude,trace_statistics.maximum_longitude
+            else :
+                merged.starting_timestamp=min(merged.starting_timestamp,trace_statistics.starting_timestamp)
+                merged.ending_timestamp=max(merged.ending_timestamp,trace_statistics.ending_timestamp)
+                merged.minimum_latitude=min(merged.minimum_latitude,trace_statistics.minimum_latitude)
+                merged.maximum_latitude=max(merged.maximum_latitude,trace_statistics.maximum_latitude)
+                merged.minimum_longitude=min(merged.minimum_longitude,trace_statistics.minimum_longitude)
+                merged.maximum_longitude=max(merged.maximum_longitude,trace_statistics.maximum_longitude)
+            merged.count+=trace_statistics.count
+            merged.path_length+=trace_statistics.path_length
+            merged._elapsed+=trace_statistics._elapsed
+            merged._intervals+=trace_statistics._intervals
+        return merged
+
+    @property
+    def bounding_box(self) :
+        """
+        The (minimum_latitude, minimum_longitude, maximum_latitude, maximum_longitude)
+        of the events, None if there is no event.
+        """
+
+        if (self.count==0) : return None
+        return self.minimum_latitude,self.minimum_longitude,self.maximum_latitude,self.maximum_longitude
+
+    @property
+    def diagonal(self) :
+        """
+        The euclidean length of the diagonal of the bounding box (see Position.euclidean_distance) :
+        no two events are farther from each other, 0 if there is no event.
+        """
+
+        if (self.count==0) : return 0.
+        return float(np.hypot(self.maximum_latitude-self.minimum_latitude,self.maximum_longitude-self.minimum_longitude))
+
+    @property
+    def duration(self) :
+        """
+        The time in seconds between the first and the last datetime, 0 if there is no event.
+        """
+
+        if (self.count==0) : return 0.
+        return self.ending_timestamp-self.starting_timestamp
+
+    @property
+    def mean_sampling_interval(self) :
+        """
+        The mean time in seconds between two consecutive events, None if there are less than two events.
+        """
+
+        if (self._intervals==0) : return None
+        return self._elapsed/self._intervals
+
+    def __str__(self) :
+        return "{0} events, {1} s, {2:.1f} m, bounding box {3}".format(self.count,self.duration,self.path_length,self.bounding_box)
@@ -0,0 +1,60 @@
+class Trip :
+    """
+    This class models a trip, i.e. the movement between two consecutive stay points.
+
+    Parameters
+    ----------
+
+    origin : Stay_point
+        the stay point from which the moving object departs
+
+    destination : Stay_point
+        the stay point at which the moving object arrives
+
+    path_length : float
+        the length of the path followed between the two stay points
+        (sum of the euclidean distances between consecutive events)
+
+    origin_zone : object, optional
+        the zone of the origin (None by default)
+
+    destination_zone : object, optional
+        the zone of the destination (None by default)
+
+
+    Attributes
+    ----------
+
+    origin : Stay_point
+        the stay point from which the moving object departs
+
+    destination : Stay_point
+        the stay point at which the moving object arrives
+
+    departure_time : Datetime
+        the departure time from the origin
+
+    arrival_time : Datetime
+        the arrival time at the destination
+
+    path_length : float
+        the length of the path followed between the two stay points
+
+    origin_zone : object
+        the zone of the origin
+
+    destination_zone : object
+        the zone of the destination
+    """
+
+    def __init__(self,origin,destination,path_length,origin_zone=None,destination_zone=None) :
+        self.origin=origin
+        self.destination=destination
+        self.departure_time=origin.ending_time
+        self.arrival_time=destination.starting_time
+        self.path_length=path_length
+        self.origin_zone=origin_zone
+        self.destination_zone=destination_zone
+
+    def __str__(self) :
+        return "({0} -> {1}, {2}, {3})".format(self.departure_time,self.arrival_time,self.origin_zone,self.destination_zone)
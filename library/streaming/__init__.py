@@ -0,0 +1,2 @@
+from streaming_stages import Streaming_filter,Streaming_segmentation,Streaming_stay_points,Streaming_device_pipeline
+from ingestion_service import Ingestion_service,Jsonl_sink,default_device_pipeline,connect
@@ -0,0 +1,337 @@
+"""
+Ingestion service running the streaming stages on location events received on a socket
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import SocketServer
+from Queue import Queue,Full,Empty
+
+import numpy as np
+
+from ..model import Columnar_trace,datetime_to_timestamp
+from ..kdd.preprocessing.cleaning import Median_filter
+from ..kdd.preprocessing.segmentation import Segmentation_by_time
+from ..kdd.mining.poi_detection import Stay_points
+from streaming_stages import Streaming_filter,Streaming_segmentation,Streaming_stay_points,Streaming_device_pipeline
+
+
+def default_device_pipeline() :
+    """
+    Return the default streaming stages of a device : a median filter (5 events,
+    centered), a segmentation by time (10 minutes) and a stay point detection.
+    """
+
+    return Streaming_device_pipeline(cleaning=Streaming_filter(Median_filter(window_size=5,window_type='centered')),
+                                     segmentation=Streaming_segmentation(Segmentation_by_time(maximum_time_difference=600)),
+                                     stay_points=Streaming_stay_points(Stay_points()))
+
+
+class Jsonl_sink :
+    """
+    Sink writing the results of the service as JSON lines :
+    {"device_id": ..., "kind": "cleaned", "timestamps": [...], "latitudes": [...], "longitudes": [...]}
+    {"device_id": ..., "kind": "segment", "segment_index": ..., "starting_time": ..., "ending_time": ..., "size": ...}
+    {"device_id": ..., "kind": "stay_point", "latitude": ..., "longitude": ..., "starting_time": ..., "ending_time": ...}
+    (the times are in seconds since the epoch)
+
+    Parameters
+    ----------
+    output : string or file
+        the path of the output file or a file object
+    """
+
+    def __init__(self,output) :
+        self.output=open(output,'a') if isinstance(output,str) else output
+        self._lock=threading.Lock()
+
+    def __call__(self,device_id,kind,result) :
+        record={"device_id":device_id,"kind":kind}
+        if (kind=='cleaned') :
+            record.update(timestamps=result.timestamps.tolist(),latitudes=result.latitudes.tolist(),longitudes=result.longitudes.tolist())
+        elif (kind=='segment') :
+            segment_index,piece=result
+            record.update(segment_index=segment_index,starting_time=piece.timestamps[0],ending_time=piece.timestamps[-1],size=len(piece))
+        else :
+            record.update(latitude=result.latitude,longitude=result.longitude,
+                          starting_time=datetime_to_timestamp(result.starting_time),ending_time=datetime_to_timestamp(result.ending_time))
+        line=json.dumps(record)+"\n"
+        with self._lock :
+            self.output.write(line)
+
+    def close(self) :
+        self.output.flush()
+
+
+class _Event_handler(SocketServer.StreamRequestHandler) :
+    """
+    Read the events of a connection (one JSON object per line) and route them to the
+    queue of their device worker, the reading is suspended while the queue is full.
+    A malformed record (invalid JSON, missing field, unhashable device id) is counted
+    and skipped.
+    """
+
+    def handle(self) :
+        service=self.server.service
+        for line in self.rfile :
+            line=line.strip()
+            if (not line) : continue
+            try :
+                record=json.loads(line)
+                event=(record["device_id"],float(record["timestamp"]),float(record["latitude"]),float(record["longitude"]),record.get("sent_at"))
+                worker=service._worker(event[0])
+            except (ValueError,KeyError,TypeError) :
+                service._count('malformed_events')
+                continue
+            service._route(worker,event)
+
+
+class _Threading_mixin(SocketServer.ThreadingMixIn) :
+    """
+    Handle each connection in a daemon thread registered in the service, thus, the
+    service can close the connections and wait for their handlers (see Ingestion_service.stop).
+    """
+
+    daemon_threads=True
+
+    def process_request(self,request,client_address) :
+        thread=threading.Thread(target=self.process_request_thread,args=(request,client_address))
+        thread.daemon=True
+        self.service._add_handler(thread,request)
+        thread.start()
+
+    def process_request_thread(self,request,client_address) :
+        try :
+            SocketServer.ThreadingMixIn.process_request_thread(self,request,client_address)
+        finally :
+            self.service._remove_handler(threading.current_thread())
+
+class _TCP_server(_Threading_mixin,SocketServer.TCPServer) :
+    allow_reuse_address=True
+
+class _Unix_server(_Threading_mixin,SocketServer.UnixStreamServer) :
+    pass
+
+
+class Ingestion_service :
+    """
+    Service accepting newline-delimited location events on a local TCP or Unix socket,
+    each line is a JSON object {"device_id": ..., "timestamp": ..., "latitude": ..., "longitude": ...}
+    (timestamp in seconds since the epoch, the events of a device are sent in time order).
+
+    The events are routed by device to a fixed worker (thus, the events of a device are
+    processed in order), each worker keeps the streaming stages of its devices (see
+    Streaming_device_pipeline) and processes its events by batches. The queues of the
+    workers are bounded : when a worker lags, the connections stop being read and the
+    senders are slowed down by the socket buffers (backpressure).
+
+    Parameters
+    ----------
+    address : 2-tuple or string
+        (host, port) for a TCP socket or the path of a Unix socket
+
+    sink : callable
+        called as sink(device_id, kind, result) for each result (see Streaming_device_pipeline.push)
+
+    device_pipeline : callable, optional
+        return the streaming stages of a new device, default value is default_device_pipeline
+
+    workers : int, optional
+        the number of worker threads, default value is 1
+
+    queue_size : int, optional
+        the maximal number of waiting events of a worker, default value is 10000
+
+    batch_size : int, optional
+        the maximal number of events processed at once by a worker, default value is 1000
+
+    max_latencies : int, optional
+        the number of kept latencies, default value is 100000
+
+    Attributes
+    ----------
+    counters : dict<string,int>
+        'received_events', 'processed_events', 'malformed_events', 'backpressure_waits'
+        (number of events that waited for room in a full queue), 'failed_batches' and
+        'failed_flushes' (batches and device flushes whose stages or sink raised an
+        exception, it is logged and the worker goes on with the next batch)
+
+    latencies : list<float>
+        the latencies (in seconds) of the last processed events that had a 'sent_at' field
+        (wall clock time of the sending), from the sending to the end of their processing
+    """
+
+    def __init__(self,address,sink,device_pipeline=default_device_pipeline,workers=1,queue_size=10000,batch_size=1000,max_latencies=100000) :
+        self.address=address
+        self.sink=sink
+        self.device_pipeline=device_pipeline
+        self.batch_size=batch_size
+        self.max_latencies=max_latencies
+        self.counters={'received_events':0,'processed_events':0,'malformed_events':0,'backpressure_waits':0,'failed_batches':0,'failed_flushes':0}
+        self.latencies=[]
+        self._lock=threading.Lock()
+        self._queues=[Queue(maxsize=queue_size) for worker in range(workers)]
+        self._pipelines=[{} for worker in range(workers)]
+        self._workers=[]
+        self._handlers={}
+        self._server=None
+        self._server_thread=None
+
+    def _count(self,name,value=1) :
+        with self._lock :
+            self.counters[name]+=value
+
+    def _add_handler(self,thread,request) :
+        with self._lock :
+            self._handlers[thread]=request
+
+    def _remove_handler(self,thread) :
+        with self._lock :
+            self._handlers.pop(thread,None)
+
+    def _worker(self,device_id) :
+        # raises TypeError for an unhashable device id (e.g. a JSON list)
+        return hash(device_id)%len(self._queues)
+
+    def _route(self,worker,event) :
+        queue=self._queues[worker]
+        self._count('received_events')
+        try :
+            queue.put_nowait(event)
+        except Full :
+            self._count('backpressure_waits')
+            queue.put(event)
+
+    def _emit(self,device_id,results) :
+        for kind,result in results :
+            self.sink(device_id,kind,result)
+
+    def _process(self,worker,batch) :
+        pipelines=self._pipelines[worker]
+        events={}
+        for device_id,timestamp,latitude,longitude,sent_at in batch :
+            events.setdefault(device_id,[]).append((timestamp,latitude,longitude))
+        for device_id,device_events in events.items() :
+            if (device_id not in pipelines) : pipelines[device_id]=self.device_pipeline()
+            timestamps,latitudes,longitudes=np.array(device_events,dtype=np.float64).T
+            self._emit(device_id,pipelines[device_id].push(Columnar_trace(timestamps,latitudes,longitudes,copy=False)))
+
+    def _processed(self,batch) :
+        now=time.time()
+        latencies=[now-event[4] for event in batch if event[4] is not None]
+        with self._lock :
+            self.counters['processed_events']+=len(batch)
+            self.latencies.extend(latencies)
+            if (len(self.latencies)>self.max_latencies) : del self.latencies[:len(self.latencies)-self.max_latencies]
+
+    def _work(self,worker) :
+        queue=self._queues[worker]
+        running=True
+        while (running) :
+            batch=[queue.get()]
+            while (len(batch)<self.batch_size) :
+                try :
+                    batch.append(queue.get_nowait())
+                except Empty :
+                    break
+            if (batch[-1] is None) :
+                running=False
+                batch.pop()
+            if (batch) :
+                # a failing stage or sink must not stop the worker (its queue would fill up)
+                try :
+                    self._process(worker,batch)
+                except Exception :
+                    self._count('failed_batches')
+                    logging.getLogger("motaf").warning("batch of %d events failed on worker %d",len(batch),worker,exc_info=True)
+                self._processed(batch)
+        for device_id,pipeline in self._pipelines[worker].items() :
+            try :
+                self._emit(device_id,pipeline.flush())
+            except Exception :
+                self._count('failed_flushes')
+                logging.getLogger("motaf").warning("flush of device %r failed",device_id,exc_info=True)
+
+    def start(self) :
+        """
+        Start the workers and listen on the socket (in background threads).
+        """
+
+        for worker in range(len(self._queues)) :
+            thread=threading.Thread(target=self._work,args=(worker,))
+            thread.daemon=True
+            thread.start()
+            self._workers.append(thread)
+        if (isinstance(self.address,str)) :
+            if (os.path.exists(self.address)) : os.remove(self.address)
+            self._server=_Unix_server(self.address,_Event_handler)
+        else :
+            self._server=_TCP_server(self.address,_Event_handler)
+            self.address=self._server.server_address
+        self._server.service=self
+        self._server_thread=threading.Thread(target=self._server.serve_forever)
+        self._server_thread.daemon=True
+        self._server_thread.start()
+        return self
+
+    def wait_idle(self,timeout=None,interval=0.01) :
+        """
+        Wait until all the received events are processed.
+
+        Returns
+        -------
+        idle : bool
+            False if the timeout expired before
+        """
+
+        deadline=None if timeout is None else time.time()+timeout
+        while (True) :
+            with self._lock :
+                if (self.counters['processed_events']>=self.counters['received_events']) : return True
+            if (deadline is not None and time.time()>deadline) : return False
+            time.sleep(interval)
+
+    def stop(self) :
+        """
+        Stop listening, close the open connections (the events they have not sent
+        yet are lost), process the waiting events and flush the streaming stages
+        of all the devices (their last results are sent to the sink).
+        """
+
+        if (self._server is not None) :
+            self._server.shutdown()
+            # no handler may enqueue an event after the end of the workers
+            with self._lock :
+                handlers=list(self._handlers.items())
+            for thread,request in handlers :
+                try :
+                    request.shutdown(socket.SHUT_RD)
+                except socket.error :
+                    pass
+            for thread,request in handlers :
+                thread.join()
+            self._server.server_close()
+            if (isinstance(self.address,str) and os.path.exists(self.address)) : os.remove(self.address)
+        for queue in self._queues :
+            queue.put(None)
+        for thread in self._workers :
+            thread.join()
+        self._workers=[]
+        if (hasattr(self.sink,'close')) : self.sink.close()
+
+
+def connect(address) :
+    """
+    Return a socket connected to an Ingestion_service listening on address.
+    """
+
+    if (isinstance(address,str)) :
+        client=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    else :
+        client=socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    client.connect(address)
+    return client
@@ -0,0 +1,125 @@
+"""
+Local load generator measuring the throughput and the latency of the ingestion service
+
+usage : python -m library.streaming.load_generator [--devices N] [--events N] [--connections N] [--workers N] [--unix PATH]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from ingestion_service import Ingestion_service,connect
+
+
+def _device_lines(device_id,events_count,random_state) :
+    """
+    Return the event lines of a random walk of a device (one event every 10 seconds).
+    """
+
+    timestamps=1.5e9+10.*np.arange(events_count)
+    latitudes=45.75+np.cumsum(random_state.normal(0,0.00005,events_count))
+    longitudes=4.85+np.cumsum(random_state.normal(0,0.00005,events_count))
+    return ['{{"device_id": "{0}", "timestamp": {1!r}, "latitude": {2!r}, "longitude": {3!r}, "sent_at": %r}}\n'.format(device_id,timestamp,latitude,longitude)
+            for timestamp,latitude,longitude in zip(timestamps.tolist(),latitudes.tolist(),longitudes.tolist())]
+
+def _send(address,device_lines,lines_per_write) :
+    # the devices of a connection are interleaved, the events of a device stay in order
+    client=connect(address)
+    try :
+        lines=[line for step in zip(*device_lines) for line in step]
+        for start in range(0,len(lines),lines_per_write) :
+            now=time.time()
+            client.sendall("".join(line%now for line in lines[start:start+lines_per_write]))
+    finally :
+        client.close()
+
+def run_load(devices=100,events=1000,connections=4,workers=1,unix_socket=None,lines_per_write=64,queue_size=10000,seed=0) :
+    """
+    Start an Ingestion_service (with the default device pipeline and a sink
+    counting the results), send it the events of devices random walks from
+    several connections and measure it.
+
+    Parameters
+    ----------
+    devices : int, optional
+        the number of devices, default value is 100
+
+    events : int, optional
+        the number of events per device, default value is 1000
+
+    connections : int, optional
+        the number of sending connections (each one sends the events of some devices), default value is 4
+
+    workers : int, optional
+        the number of workers of the service, default value is 1
+
+    unix_socket : string, optional
+        the path of a Unix socket, by default the service listens on a local TCP port
+
+    lines_per_write : int, optional
+        the number of events sent at once, default value is 64
+
+    queue_size : int, optional
+        the size of the queues of the service, default value is 10000
+
+    seed : int, optional
+        the seed of the random walks
+
+    Returns
+    -------
+    report : dict
+        the number of events, the elapsed time (from the first sending to the end of the processing),
+        the throughput (events per second), the latency percentiles (p50, p99, max in milliseconds),
+        the number of results of each kind and the counters of the service
+    """
+
+    results={}
+    results_lock=threading.Lock()
+    def sink(device_id,kind,result) :
+        with results_lock :
+            results[kind]=results.get(kind,0)+1
+
+    random_state=np.random.RandomState(seed)
+    device_lines=[_device_lines("device-{0}".format(device),events,random_state) for device in range(devices)]
+    service=Ingestion_service(unix_socket if unix_socket is not None else ('127.0.0.1',0),sink,workers=workers,queue_size=queue_size).start()
+    try :
+        senders=[threading.Thread(target=_send,args=(service.address,device_lines[connection::connections],lines_per_write))
+                 for connection in range(connections) if device_lines[connection::connections]]
+        start=time.time()
+        for sender in senders : sender.start()
+        for sender in senders : sender.join()
+        while (service.counters['received_events']<devices*events) : time.sleep(0.01)
+        service.wait_idle()
+        elapsed=time.time()-start
+    finally :
+        service.stop()
+
+    latencies=np.array(service.latencies)*1000.
+    return {"events":devices*events,
+            "elapsed":elapsed,
+            "throughput":devices*events/elapsed,
+            "latency_p50_ms":float(np.percentile(latencies,50)) if len(latencies) else None,
+            "latency_p99_ms":float(np.percentile(latencies,99)) if len(latencies) else None,
+            "latency_max_ms":float(latencies.max()) if len(latencies) else None,
+            "results":results,
+            "counters":dict(service.counters)}
+
+
+if __name__=='__main__' :
+    parser=argparse.ArgumentParser(description="Measure the throughput and the latency of the ingestion service")
+    parser.add_argument("--devices",type=int,default=100)
+    parser.add_argument("--events",type=int,default=1000,help="events per device")
+    parser.add_argument("--connections",type=int,default=4)
+    parser.add_argument("--workers",type=int,default=1)
+    parser.add_argument("--queue-size",type=int,default=10000)
+    parser.add_argument("--unix",action='store_true',help="use a Unix socket instead of TCP")
+    arguments=parser.parse_args()
+    unix_socket=os.path.join(tempfile.mkdtemp(),"motaf.sock") if arguments.unix else None
+    report=run_load(devices=arguments.devices,events=arguments.events,connections=arguments.connections,
+                    workers=arguments.workers,unix_socket=unix_socket,queue_size=arguments.queue_size)
+    print json.dumps(report,indent=2,sort_keys=True)
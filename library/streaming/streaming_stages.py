@@ -0,0 +1,248 @@
+"""
+Streaming versions of the cleaning, segmentation and stay point detection stages
+"""
+
+import numpy as np
+
+from ..model import Stay_point,timestamp_to_datetime
+from ..batch.chunked_executor import _Halo_buffer
+
+
+class Streaming_filter :
+    """
+    Streaming version of a windowed filter : the events of a trace are pushed by blocks
+    and each event is filtered as soon as all the events of its window are received
+    (immediately for a causal window), the result is the one of the filter on the whole trace.
+
+    Parameters
+    ----------
+    estimator : Mean_filter or Median_filter
+        the filter (see Mean_filter and Median_filter in cleaning)
+    """
+
+    def __init__(self,estimator) :
+        self.estimator=estimator
+        self._buffer=_Halo_buffer(estimator)
+
+    def push(self,block) :
+        """
+        Add the next events of the trace.
+
+        Parameters
+        ----------
+        block : Columnar_trace
+            the next events (ordered by increasing datetime)
+
+        Returns
+        -------
+        chunks : list<Columnar_trace>
+            the newly filtered events
+        """
+
+        return self._buffer.push(block)
+
+    def flush(self) :
+        """
+        Filter the events waiting for their future neighboors (the trace is over).
+        """
+
+        return self._buffer.flush()
+
+
+class Streaming_segmentation :
+    """
+    Streaming version of the segmentation by time : the events are cut in pieces,
+    the pieces of a same segment have the same segment index and are consecutive.
+
+    Parameters
+    ----------
+    estimator : Segmentation_by_time
+        the segmentation (see Segmentation_by_time in segmentation)
+
+    Attributes
+    ----------
+    segment_index : int
+        the index of the current segment (-1 before the first event)
+    """
+
+    def __init__(self,estimator) :
+        self.estimator=estimator
+        self.segment_index=-1
+        self._last_timestamp=None
+
+    def push(self,block) :
+        """
+        Add the next events of the trace.
+
+        Parameters
+        ----------
+        block : Columnar_trace
+            the next events (ordered by increasing datetime)
+
+        Returns
+        -------
+        pieces : list<(int,Columnar_trace)>
+            the pieces of block with their segment index
+        """
+
+        if (len(block)==0) : return []
+        maximum_time_difference=self.estimator.maximum_time_difference
+        timestamps=block.timestamps
+        starts=[0]+list(np.flatnonzero(np.diff(timestamps)>maximum_time_difference)+1)
+        ends=starts[1:]+[len(block)]
+        # the first piece continues the current segment if the gap is small
+        continues=self._last_timestamp is not None and timestamps[0]-self._last_timestamp<=maximum_time_difference
+        pieces=[]
+        for piece_index,(start,end) in enumerate(zip(starts,ends)) :
+            if (piece_index>0 or not continues) : self.segment_index+=1
+            pieces.append((self.segment_index,block.segment(start,end)))
+        self._last_timestamp=timestamps[-1]
+        return pieces
+
+    def flush(self) :
+        return []
+
+
+class Streaming_stay_points :
+    """
+    Streaming version of the stay point detection : the events since the anchor point
+    of the detection are buffered and a stay point is emitted as soon as the moving
+    object leaves it, the stay points are the ones detected on the whole trace.
+
+    Parameters
+    ----------
+    estimator : Stay_points
+        the stay point detection (see Stay_points in poi_detection)
+
+    Attributes
+    ----------
+    stay_points_count : int
+        the number of emitted stay points
+    """
+
+    def __init__(self,estimator) :
+        self.estimator=estimator
+        self.stay_points_count=0
+        self._timestamps=[]
+        self._latitudes=[]
+        self._longitudes=[]
+        # next event (in the buffer) to compare with the anchor (the first buffered event)
+        self._scanned=1
+
+    def push(self,block) :
+        """
+        Add the next events of the trace.
+
+        Parameters
+        ----------
+        block : Columnar_trace
+            the next events (ordered by increasing datetime)
+
+        Returns
+        -------
+        stay_points : list<Stay_point>
+            the newly detected stay points
+        """
+
+        timestamps,latitudes,longitudes=block.to_arrays()
+        self._timestamps.extend(timestamps.tolist())
+        self._latitudes.extend(latitudes.tolist())
+        self._longitudes.extend(longitudes.tolist())
+        return self._scan()
+
+    def _scan(self) :
+        dist_thres,time_thres=self.estimator.dist_thres,self.estimator.time_thres
+        stay_points=[]
+        while (self._scanned<len(self._timestamps)) :
+            j=self._scanned
+            distance=np.hypot(self._latitudes[j]-self._latitudes[0],self._longitudes[j]-self._longitudes[0])
+            if (distance<=dist_thres) :
+                self._scanned+=1
+                continue
+            if (self._timestamps[j]-self._timestamps[0]>=time_thres) :
+                self.stay_points_count+=1
+                stay_points.append(Stay_point(sum(self._latitudes[:j])/j,sum(self._longitudes[:j])/j,
+                                              timestamp_to_datetime(self._timestamps[0]),timestamp_to_datetime(self._timestamps[j]),
+                                              label="stay point {0}".format(self.stay_points_count)))
+                self._drop(j)
+            else :
+                self._drop(1)
+            self._scanned=1
+        return stay_points
+
+    def _drop(self,count) :
+        del self._timestamps[:count]
+        del self._latitudes[:count]
+        del self._longitudes[:count]
+
+    def flush(self) :
+        """
+        Return the last stay points (the trace is over) : as in the detection on the whole
+        trace, the anchors not left before the end are skipped and the next ones are scanned.
+        """
+
+        stay_points=[]
+        while (len(self._timestamps)>1) :
+            self._drop(1)
+            self._scanned=1
+            stay_points.extend(self._scan())
+        return stay_points
+
+
+class Streaming_device_pipeline :
+    """
+    The streaming stages of one moving object (device) : the events are cleaned, then
+    the cleaned events are segmented and used for the stay point detection.
+
+    Parameters
+    ----------
+    cleaning : Streaming_filter, optional
+        the cleaning stage, None to use the raw events
+
+    segmentation : Streaming_segmentation, optional
+        the segmentation stage
+
+    stay_points : Streaming_stay_points, optional
+        the stay point detection stage
+    """
+
+    def __init__(self,cleaning=None,segmentation=None,stay_points=None) :
+        self.cleaning=cleaning
+        self.segmentation=segmentation
+        self.stay_points=stay_points
+
+    def _results(self,chunks,flush=False) :
+        results=[('cleaned',chunk) for chunk in chunks if self.cleaning is not None]
+        for stage,kind in ((self.segmentation,'segment'),(self.stay_points,'stay_point')) :
+            if (stage is None) : continue
+            for chunk in chunks :
+                results.extend((kind,result) for result in stage.push(chunk))
+            if (flush) : results.extend((kind,result) for result in stage.flush())
+        return results
+
+    def push(self,block) :
+        """
+        Add the next events of the device.
+
+        Parameters
+        ----------
+        block : Columnar_trace
+            the next events (ordered by increasing datetime)
+
+        Returns
+        -------
+        results : list<(string,object)>
+            the new results as (kind, result) pairs, kind is 'cleaned' (Columnar_trace),
+            'segment' ((segment index, Columnar_trace)) or 'stay_point' (Stay_point)
+        """
+
+        chunks=self.cleaning.push(block) if self.cleaning is not None else [block]
+        return self._results(chunks)
+
+    def flush(self) :
+        """
+        Return the last results (the stream of the device is over).
+        """
+
+        chunks=self.cleaning.flush() if self.cleaning is not None else []
+        return self._results(chunks,flush=True)
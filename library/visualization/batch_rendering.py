@@ -0,0 +1,186 @@
+"""
+Headless parallel rendering of traces to image files
+"""
+
+import hashlib,json,os,urllib
+from multiprocessing import Pool,cpu_count
+
+from downsampling import downsample_indices
+from visualize_trace import _trace_arrays
+
+
+class Trace_renderer :
+    """
+    Render traces to PNG files with the Agg backend. The renderer owns its figure
+    (pyplot and its global figures are never used) and reuses it from one trace to
+    the next, thus, rendering many traces does not accumulate figures in memory.
+
+    Parameters
+    ----------
+    kind : {'2D','3D'}, optional
+        '2D' : the trace in the (longitude, latitude) plane
+        '3D' : the trace in the (longitude, latitude, time) space
+        default value is '2D'
+
+    max_points : int, optional
+        the pixel budget, each trace is downsampled to at most max_points points
+        (see downsample_indices), None disables the downsampling. Default value is 2000
+
+    size : 2-tuple, optional
+        the size of the image in inches, default value is (4,4)
+
+    dpi : int, optional
+        the resolution of the image, default value is 100
+    """
+
+    def __init__(self,kind='2D',max_points=2000,size=(4,4),dpi=100) :
+        if (kind not in ('2D','3D')) : raise Exception("kind dosen't exists")
+        self.kind=kind
+        self.max_points=max_points
+        self.dpi=dpi
+        # matplotlib is imported by the first renderer only (it is slow to import)
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from mpl_toolkits.mplot3d import Axes3D
+        self.figure=Figure(figsize=size,dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        if (kind=='3D') : self.axes=self.figure.add_subplot(111,projection='3d')
+        else : self.axes=self.figure.add_subplot(111)
+
+    def render_arrays(self,timestamps,latitudes,longitudes,path,title=None) :
+        """
+        Render a trace given by its arrays (see Trace.to_arrays) to a PNG file.
+
+        Parameters
+        ----------
+        timestamps, latitudes, longitudes : numpy.ndarray<float>
+            the columns of the trace
+
+        path : string
+            the path of the image file
+
+        title : string, optional
+            the title of the image
+        """
+
+        axes=self.axes
+        axes.cla()
+        kept=downsample_indices(latitudes,longitudes,self.max_points)
+        if (self.kind=='3D') :
+            time_dimension=timestamps[kept]-timestamps[0] if len(timestamps) else timestamps
+            axes.plot(longitudes[kept],latitudes[kept],time_dimension,'o-',color='b',markersize=2)
+            axes.set_zlabel('Time')
+        else :
+            axes.plot(longitudes[kept],latitudes[kept],'o-',color='b',markersize=2)
+        axes.set_xlabel('Longitude')
+        axes.set_ylabel('Latitude')
+        if (title is not None) : axes.set_title(title)
+        self.figure.savefig(path,dpi=self.dpi)
+
+    def render(self,trace,path,title=None) :
+        """
+        Render a trace to a PNG file.
+
+        Parameters
+        ----------
+        trace : Trace or list<Event>
+            A Trace object (see Trace in Model) or a list of events
+
+        path : string
+            the path of the image file
+
+        title : string, optional
+            the title of the image
+        """
+
+        timestamps,latitudes,longitudes=_trace_arrays(trace)
+        self.render_arrays(timestamps,latitudes,longitudes,path,title=title)
+
+
+def _file_name(identifier) :
+    """
+    Return the file name (without extension) of an identifier : the URL-quoted identifier
+    (no '/', ':' or other special character and no leading '.', thus, the file stays in
+    its directory and is not hidden), a long identifier is truncated and suffixed with
+    its hash (distinct identifiers keep distinct file names).
+    """
+
+    text=identifier.encode('utf-8') if isinstance(identifier,unicode) else str(identifier)
+    name=urllib.quote(text,safe='')
+    if (name.startswith(".")) : name="%2E"+name[1:]
+    if (len(name)>128) : name=name[:96]+"-"+hashlib.sha1(text).hexdigest()
+    return name
+
+# renderer of the current worker process, created once by _initialize_worker
+_worker_renderer=None
+
+def _initialize_worker(kind,max_points,size,dpi) :
+    global _worker_renderer
+    _worker_renderer=Trace_renderer(kind=kind,max_points=max_points,size=size,dpi=dpi)
+
+def _render_task(task) :
+    trace_id,timestamps,latitudes,longitudes,path=task
+    _worker_renderer.render_arrays(timestamps,latitudes,longitudes,path,title=u"{0}".format(trace_id))
+    return trace_id,path
+
+def render_traces(traces,output_directory,kind='2D',processes=None,max_points=2000,size=(4,4),dpi=100,batch_size=256,maxtasksperchild=1000) :
+    """
+    Render many traces to PNG files in parallel, the image of a trace is
+    output_directory/<trace id>.png (the trace identifier is URL-quoted, see _file_name),
+    the list of the [trace id, image file name] pairs is written to
+    output_directory/manifest.json.
+
+    Each worker process creates one renderer (see Trace_renderer) and reuses it for all
+    its traces, the traces are sent by batches and the workers are recycled after
+    maxtasksperchild traces, thus, the memory stays flat whatever the number of traces.
+
+    Parameters
+    ----------
+    traces : dict<id,Trace> or list<Trace>
+        the traces to render, when a list is given the identifier of a trace is its
+        position in the list
+
+    output_directory : string
+        the directory of the images (created if it does not exist)
+
+    kind : {'2D','3D'}, optional
+        the kind of plot (see Trace_renderer), default value is '2D'
+
+    processes : int, optional
+        the number of worker processes, default value is the number of CPUs
+
+    max_points, size, dpi : optional
+        see Trace_renderer
+
+    batch_size : int, optional
+        the number of traces converted and sent to the workers at once, default value is 256
+
+    maxtasksperchild : int, optional
+        the number of traces rendered by a worker before being replaced, default value is 1000
+
+    Returns
+    -------
+    paths : dict<id,string>
+        the path of the image of each trace
+    """
+
+    if (not os.path.isdir(output_directory)) : os.makedirs(output_directory)
+    items=list(traces.items()) if isinstance(traces,dict) else list(enumerate(traces))
+    processes=processes or cpu_count()
+
+    paths={}
+    pool=Pool(processes,initializer=_initialize_worker,initargs=(kind,max_points,size,dpi),maxtasksperchild=maxtasksperchild)
+    try :
+        for start in range(0,len(items),batch_size) :
+            tasks=[]
+            for trace_id,trace in items[start:start+batch_size] :
+                timestamps,latitudes,longitudes=_trace_arrays(trace)
+                tasks.append((trace_id,timestamps,latitudes,longitudes,os.path.join(output_directory,"{0}.png".format(_file_name(trace_id)))))
+            for trace_id,path in pool.imap_unordered(_render_task,tasks,chunksize=max(1,len(tasks)//(4*processes))) :
+                paths[trace_id]=path
+    finally :
+        pool.close()
+        pool.join()
+    with open(os.path.join(output_directory,"manifest.json"),"w") as manifest_file :
+        json.dump([[trace_id,os.path.basename(paths[trace_id])] for trace_id,_ in items if trace_id in paths],manifest_file)
+    return paths
@@ -0,0 +1,274 @@
+"""
+Density heatmap rasterization with precomputed multi-zoom tiles
+"""
+
+import json,os,tempfile
+
+import numpy as np
+
+_METADATA_FILE="metadata.json"
+
+
+def _cell_indices(latitudes,longitudes,extent,resolution) :
+    """
+    Return the (row, column) of the finest grid cell of each position inside the extent,
+    rows increase with the latitude and columns with the longitude.
+    """
+
+    min_latitude,min_longitude,max_latitude,max_longitude=extent
+    latitudes=np.asarray(latitudes,dtype=np.float64)
+    longitudes=np.asarray(longitudes,dtype=np.float64)
+    inside=(latitudes>=min_latitude)&(latitudes<=max_latitude)&(longitudes>=min_longitude)&(longitudes<=max_longitude)
+    rows=((latitudes[inside]-min_latitude)*(resolution/(max_latitude-min_latitude))).astype(np.int64)
+    columns=((longitudes[inside]-min_longitude)*(resolution/(max_longitude-min_longitude))).astype(np.int64)
+    np.minimum(rows,resolution-1,out=rows)
+    np.minimum(columns,resolution-1,out=columns)
+    return rows,columns
+
+def _tile_path(directory,zoom,tile_row,tile_column) :
+    return os.path.join(directory,str(zoom),"{0}_{1}.npy".format(tile_row,tile_column))
+
+def _save_tile(path,tile) :
+    """
+    Write a tile atomically : it is written to a temporary file of its directory then
+    renamed over the tile, thus, a crash never leaves a partially written tile.
+    """
+
+    descriptor,temporary_path=tempfile.mkstemp(suffix=".tmp",dir=os.path.dirname(path))
+    try :
+        with os.fdopen(descriptor,'wb') as temporary_file :
+            np.save(temporary_file,tile)
+    except Exception :
+        os.remove(temporary_path)
+        raise
+    os.rename(temporary_path,path)
+
+def _remove_tiles(directory) :
+    """
+    Remove the tiles of all the zoom levels of a pyramid (the tiles of a previous write).
+    """
+
+    for zoom in os.listdir(directory) :
+        zoom_directory=os.path.join(directory,zoom)
+        if (not zoom.isdigit() or not os.path.isdir(zoom_directory)) : continue
+        for name in os.listdir(zoom_directory) :
+            if (name.endswith(".npy") or name.endswith(".tmp")) : os.remove(os.path.join(zoom_directory,name))
+
+def _read_metadata(directory) :
+    with open(os.path.join(directory,_METADATA_FILE)) as metadata_file :
+        return json.load(metadata_file)
+
+def read_density_tile(directory,zoom,tile_row,tile_column) :
+    """
+    Read a tile of a density pyramid written by Density_raster.write_tiles.
+
+    Parameters
+    ----------
+    directory : string
+        the directory of the pyramid
+
+    zoom : int
+        the zoom level, 0 is the coarsest level (one tile covers the whole extent)
+
+    tile_row, tile_column : int
+        the position of the tile in the zoom level (rows increase with the latitude)
+
+    Returns
+    -------
+    tile : numpy.ndarray<uint32>
+        the tile_size x tile_size counts of the tile (zeros when the tile is empty)
+    """
+
+    path=_tile_path(directory,zoom,tile_row,tile_column)
+    if (os.path.exists(path)) : return np.load(path)
+    tile_size=_read_metadata(directory)["tile_size"]
+    return np.zeros((tile_size,tile_size),dtype=np.uint32)
+
+def update_density_tiles(directory,latitudes,longitudes) :
+    """
+    Add new positions to a density pyramid written by Density_raster.write_tiles.
+    Only the tiles containing new positions are read and rewritten, the raw traces
+    already rasterized are never scanned again. Each tile is replaced atomically :
+    an interrupted update never leaves a corrupt tile (the tiles it did not reach
+    are not updated).
+
+    Parameters
+    ----------
+    directory : string
+        the directory of the pyramid
+
+    latitudes, longitudes : numpy.ndarray<float>
+        the new positions, the positions out of the extent of the pyramid are ignored
+
+    Returns
+    -------
+    updated_tiles : int
+        the number of rewritten tiles (all zoom levels)
+    """
+
+    metadata=_read_metadata(directory)
+    resolution,tile_size,max_zoom=metadata["resolution"],metadata["tile_size"],metadata["max_zoom"]
+    rows,columns=_cell_indices(latitudes,longitudes,metadata["extent"],resolution)
+    cells,counts=np.unique(rows*resolution+columns,return_counts=True)
+    rows,columns=cells//resolution,cells%resolution
+
+    updated_tiles=0
+    for zoom in range(max_zoom,-1,-1) :
+        shift=max_zoom-zoom
+        zoom_rows,zoom_columns=rows>>shift,columns>>shift
+        tile_keys=(zoom_rows//tile_size)*(1<<zoom)+(zoom_columns//tile_size)
+        order=np.argsort(tile_keys,kind='mergesort')
+        boundaries=np.flatnonzero(np.diff(tile_keys[order]))+1
+        for group in np.split(order,boundaries) :
+            if (len(group)==0) : continue
+            tile_row,tile_column=zoom_rows[group[0]]//tile_size,zoom_columns[group[0]]//tile_size
+            tile=read_density_tile(directory,zoom,tile_row,tile_column)
+            np.add.at(tile,(zoom_rows[group]%tile_size,zoom_columns[group]%tile_size),counts[group].astype(np.uint32))
+            _save_tile(_tile_path(directory,zoom,tile_row,tile_column),tile)
+            updated_tiles+=1
+    return updated_tiles
+
+
+class Density_raster :
+    """
+    Density raster of positions over a fixed extent. The positions of many traces
+    (or of many chunks of a trace) are binned and accumulated in a 2D-grid, the grid
+    is then written as a pyramid of zoom-level tiles which can be updated incrementally.
+
+    Parameters
+    ----------
+    extent : 4-tuple
+        (min_latitude, min_longitude, max_latitude, max_longitude) the rasterized area,
+        min_latitude < max_latitude and min_longitude < max_longitude (a single position
+        or a north-south road needs a margin around it)
+
+    max_zoom : int, optional
+        the finest zoom level, the finest grid has tile_size*2^max_zoom cells per side
+        default value is 4
+
+    tile_size : int, optional
+        the number of cells per side of a tile, default value is 256
+
+    Attributes
+    ----------
+    resolution_ : int
+        the number of cells per side of the finest grid
+
+    grid_ : numpy.ndarray<uint32>
+        the counts of the finest grid (rows increase with the latitude)
+
+    Notes
+    -----
+    Rasterization uses np.bincount, its complexity is O(n + resolution^2) per chunk
+    (O(n) for the chunks much smaller than the grid).
+    """
+
+    def __init__(self,extent,max_zoom=4,tile_size=256) :
+        self.extent=tuple(float(bound) for bound in extent)
+        if (not (self.extent[0]<self.extent[2] and self.extent[1]<self.extent[3])) :
+            raise Exception("empty extent, the minimum latitude and longitude must be lower than the maximum ones")
+        self.max_zoom=max_zoom
+        self.tile_size=tile_size
+        self.resolution_=tile_size<<max_zoom
+        self.grid_=np.zeros((self.resolution_,self.resolution_),dtype=np.uint32)
+
+    def add_positions(self,latitudes,longitudes) :
+        """
+        Accumulate positions in the grid.
+
+        Parameters
+        ----------
+        latitudes, longitudes : numpy.ndarray<float>
+            the positions, the positions out of the extent are ignored
+
+        Returns
+        -------
+        self : Density_raster
+        """
+
+        rows,columns=_cell_indices(latitudes,longitudes,self.extent,self.resolution_)
+        cells_count=self.resolution_*self.resolution_
+        if (len(rows)*16<cells_count) :
+            # small chunk, avoid the dense count array of np.bincount
+            np.add.at(self.grid_,(rows,columns),1)
+        else :
+            counts=np.bincount(rows*self.resolution_+columns,minlength=cells_count)
+            self.grid_+=counts.reshape(self.resolution_,self.resolution_).astype(np.uint32)
+        return self
+
+    def add_traces(self,*traces) :
+        """
+        Accumulate the events of traces in the grid.
+
+        Parameters
+        ----------
+        traces : Trace
+            Trace objects (see Trace in Model)
+
+        Returns
+        -------
+        self : Density_raster
+        """
+
+        for trace in traces :
+            timestamps,latitudes,longitudes=trace.to_arrays()
+            self.add_positions(latitudes,longitudes)
+        return self
+
+    def zoom_level(self,zoom) :
+        """
+        Return the grid of a zoom level, each cell is the sum of 2x2 cells of the next level.
+
+        Parameters
+        ----------
+        zoom : int
+            the zoom level between 0 (coarsest) and max_zoom (finest)
+
+        Returns
+        -------
+        grid : numpy.ndarray<uint32>
+            the counts of the zoom level
+        """
+
+        factor=1<<(self.max_zoom-zoom)
+        size=self.resolution_//factor
+        return self.grid_.reshape(size,factor,size,factor).sum(axis=(1,3),dtype=np.uint32)
+
+    def write_tiles(self,directory) :
+        """
+        Write the pyramid of tiles of all the zoom levels, the file of the tile (row, column)
+        of the zoom level z is directory/z/row_column.npy, empty tiles are not written.
+        The tiles already in directory (a previous write) are removed first, thus, the
+        pyramid is exactly the one of the grid.
+
+        Parameters
+        ----------
+        directory : string
+            the directory of the pyramid (created if it does not exist)
+
+        Returns
+        -------
+        written_tiles : int
+            the number of written tiles
+        """
+
+        metadata={"extent":list(self.extent),"max_zoom":self.max_zoom,"tile_size":self.tile_size,"resolution":self.resolution_}
+        if (not os.path.isdir(directory)) : os.makedirs(directory)
+        _remove_tiles(directory)
+        with open(os.path.join(directory,_METADATA_FILE),"w") as metadata_file :
+            json.dump(metadata,metadata_file)
+
+        written_tiles=0
+        grid=self.grid_
+        for zoom in range(self.max_zoom,-1,-1) :
+            zoom_directory=os.path.join(directory,str(zoom))
+            if (not os.path.isdir(zoom_directory)) : os.makedirs(zoom_directory)
+            tiles_count=1<<zoom
+            tiles=grid.reshape(tiles_count,self.tile_size,tiles_count,self.tile_size)
+            for tile_row,tile_column in zip(*np.nonzero(tiles.any(axis=(1,3)))) :
+                _save_tile(_tile_path(directory,zoom,tile_row,tile_column),np.ascontiguousarray(tiles[tile_row,:,tile_column,:]))
+                written_tiles+=1
+            if (zoom>0) :
+                size=grid.shape[0]//2
+                grid=grid.reshape(size,2,size,2).sum(axis=(1,3),dtype=np.uint32)
+        return written_tiles
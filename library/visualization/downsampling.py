@@ -0,0 +1,129 @@
+"""
+Level-of-detail downsampling of traces for rendering
+"""
+
+import numpy as np
+
+
+def _buckets(points_count,buckets_count) :
+    """
+    Return the boundaries of buckets_count buckets of nearly equal size covering
+    the indices [1, points_count-1) (the first and the last points are always kept).
+    """
+
+    return np.linspace(1,points_count-1,buckets_count+1).astype(np.int64)
+
+def lttb_indices(latitudes,longitudes,max_points) :
+    """
+    Return the indices of the points kept by the Largest-Triangle-Three-Buckets
+    downsampling. The events are split in max_points-2 buckets (in time order), each
+    bucket keeps the point forming the largest triangle with the point kept in the
+    previous bucket and the mean point of the next bucket, thus, the spikes and the
+    turns of the trace are preserved.
+
+    Parameters
+    ----------
+    latitudes, longitudes : numpy.ndarray<float>
+        the coordinates of the events (in time order)
+
+    max_points : int
+        the number of kept points (at least 3)
+
+    Returns
+    -------
+    indices : numpy.ndarray<int>
+        the sorted indices of the kept points
+
+    References
+    ----------
+    Steinarsson, S. (2013). Downsampling time series for visual representation.
+    Master's thesis, University of Iceland.
+    """
+
+    points_count=len(latitudes)
+    if (points_count<=max_points or max_points<3) : return np.arange(points_count)
+
+    boundaries=_buckets(points_count,max_points-2)
+    cumulated_latitudes=np.concatenate(([0.],np.cumsum(latitudes)))
+    cumulated_longitudes=np.concatenate(([0.],np.cumsum(longitudes)))
+    # mean point of each bucket, the last point plays the role of the bucket following the last one
+    sizes=np.diff(boundaries)
+    mean_latitudes=np.append((cumulated_latitudes[boundaries[1:]]-cumulated_latitudes[boundaries[:-1]])/sizes,latitudes[-1])
+    mean_longitudes=np.append((cumulated_longitudes[boundaries[1:]]-cumulated_longitudes[boundaries[:-1]])/sizes,longitudes[-1])
+
+    indices=np.empty(max_points,dtype=np.int64)
+    indices[0],indices[-1]=0,points_count-1
+    selected=0
+    for bucket in range(max_points-2) :
+        start,end=boundaries[bucket],boundaries[bucket+1]
+        selected_latitude,selected_longitude=latitudes[selected],longitudes[selected]
+        next_latitude,next_longitude=mean_latitudes[bucket+1],mean_longitudes[bucket+1]
+        areas=np.abs((selected_longitude-next_longitude)*(latitudes[start:end]-selected_latitude)-
+                     (selected_longitude-longitudes[start:end])*(next_latitude-selected_latitude))
+        selected=start+int(np.argmax(areas))
+        indices[bucket+1]=selected
+    return indices
+
+def min_max_indices(latitudes,longitudes,max_points) :
+    """
+    Return the indices of the points kept by the min/max downsampling. The events
+    are split in buckets (in time order) and each bucket keeps its extreme points in
+    latitude and in longitude, thus, the extent of the trace is preserved.
+
+    Parameters
+    ----------
+    latitudes, longitudes : numpy.ndarray<float>
+        the coordinates of the events (in time order)
+
+    max_points : int
+        the maximal number of kept points (at least 6)
+
+    Returns
+    -------
+    indices : numpy.ndarray<int>
+        the sorted indices of the kept points
+    """
+
+    points_count=len(latitudes)
+    if (points_count<=max_points or max_points<6) : return np.arange(points_count)
+
+    buckets_count=(max_points-2)//4
+    bucket_size=int(np.ceil((points_count-2)/float(buckets_count)))
+    padded_size=bucket_size*buckets_count
+    kept=[np.array([0,points_count-1])]
+    for values in (latitudes,longitudes) :
+        padded=np.full(padded_size,np.nan)
+        padded[:points_count-2]=values[1:-1]
+        padded=padded.reshape(buckets_count,bucket_size)
+        offsets=np.arange(buckets_count)*bucket_size+1
+        valid=~np.all(np.isnan(padded),axis=1)
+        kept.append((offsets+np.nanargmin(np.where(valid[:,None],padded,0),axis=1))[valid])
+        kept.append((offsets+np.nanargmax(np.where(valid[:,None],padded,0),axis=1))[valid])
+    return np.unique(np.concatenate(kept))
+
+def downsample_indices(latitudes,longitudes,max_points,method='lttb') :
+    """
+    Return the indices of the points to render.
+
+    Parameters
+    ----------
+    latitudes, longitudes : numpy.ndarray<float>
+        the coordinates of the events (in time order)
+
+    max_points : int or None
+        the pixel budget, i.e. the maximal number of rendered points (None for no downsampling)
+
+    method : {'lttb','minmax'}, optional
+        'lttb' : Largest-Triangle-Three-Buckets (preserves the shape)
+        'minmax' : extreme points of each bucket (preserves the extent)
+
+    Returns
+    -------
+    indices : numpy.ndarray<int>
+        the sorted indices of the kept points
+    """
+
+    if (max_points is None) : return np.arange(len(latitudes))
+    if (method=='lttb') : return lttb_indices(latitudes,longitudes,max_points)
+    elif (method=='minmax') : return min_max_indices(latitudes,longitudes,max_points)
+    else : raise Exception("method dosen't exists")
@@ -1,36 +1,89 @@
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 from itertools import cycle
 
-def plot_trace_2D(*traces) :
+import numpy as np
+
+from downsampling import downsample_indices
+from ..model import datetime_to_timestamp
+
+
+def _trace_arrays(trace) :
+    """
+    Return the (timestamps, latitudes, longitudes) arrays of a trace : a Trace, a
+    Columnar_trace or any sequence of events (e.g. the list<Event> returned by the filters).
+    """
+
+    if (hasattr(trace,'to_arrays')) : return trace.to_arrays()
+    events=list(trace)
+    timestamps=np.fromiter((datetime_to_timestamp(event.datetime) for event in events),dtype=np.float64,count=len(events))
+    latitudes=np.fromiter((event.latitude for event in events),dtype=np.float64,count=len(events))
+    longitudes=np.fromiter((event.longitude for event in events),dtype=np.float64,count=len(events))
+    return timestamps,latitudes,longitudes
+
+def plot_trace_2D(*traces,**kwargs) :
+    """
+    Plot traces in the (longitude, latitude) plane.
+
+    Parameters
+    ----------
+    traces : Trace or list<Event>
+        Trace objects (see Trace in Model) or lists of events (e.g. the result of a filter)
+
+    max_points : int, optional (keyword)
+        the pixel budget, each trace is downsampled to at most max_points points
+        before rendering, None disables the downsampling. Default value is 2000
+
+    method : {'lttb','minmax'}, optional (keyword)
+        the downsampling method (see downsample_indices), default value is 'lttb'
+    """
+
+    max_points=kwargs.get('max_points',2000)
+    method=kwargs.get('method','lttb')
+    # matplotlib is imported on the first plot only (it is slow to import)
+    import matplotlib.pyplot as plt
     plt.figure(1)
     plt.clf()
     colors=cycle('bgrcmy')
     for trace,color in zip(traces,colors) :
-        latitudes,longitudes=zip(*[(event.latitude,event.longitude) for event in trace])
-        plt.plot(longitudes,latitudes, 'o-',color=color)
+        timestamps,latitudes,longitudes=_trace_arrays(trace)
+        kept=downsample_indices(latitudes,longitudes,max_points,method)
+        plt.plot(longitudes[kept],latitudes[kept], 'o-',color=color)
     plt.xlabel("Longitude")
     plt.ylabel("Latitude")
     plt.show()
 
-def plot_trace_3D(*traces) :
+def plot_trace_3D(*traces,**kwargs) :
+    """
+    Plot traces in the (longitude, latitude, time) space, the time is
+    the number of seconds elapsed since the first event of all the traces.
+
+    Parameters
+    ----------
+    traces : Trace or list<Event>
+        Trace objects (see Trace in Model) or lists of events (e.g. the result of a filter)
+
+    max_points : int, optional (keyword)
+        the pixel budget, each trace is downsampled to at most max_points points
+        before rendering, None disables the downsampling. Default value is 2000
+
+    method : {'lttb','minmax'}, optional (keyword)
+        the downsampling method (see downsample_indices), default value is 'lttb'
+    """
+
+    max_points=kwargs.get('max_points',2000)
+    method=kwargs.get('method','lttb')
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D
     fig=plt.figure(1)
     plt.clf()
+    ax=fig.add_subplot(111,projection='3d')
     colors=cycle('bgrcmy')
-    first_event=None
-    
-    for trace in traces :
-        if (not first_event) : first_event=trace[0]
-        elif (first_event.time_difference(trace[0])>0) : first_event=trace[0] 
-        
-    for trace,color in zip(traces,colors) :
-        latitudes,longitudes,time_dimension=[],[],[]
-        for event in trace :
-            latitudes.append(event.latitude)
-            longitudes.append(event.longitude)
-            time_dimension.append(event.time_difference(first_event))
-        ax = fig.gca(projection='3d')
-        ax.plot(longitudes, latitudes , time_dimension,'o-',color=color)
+
+    arrays=[_trace_arrays(trace) for trace in traces]
+    first_timestamp=min(timestamps[0] for timestamps,latitudes,longitudes in arrays if len(timestamps))
+
+    for (timestamps,latitudes,longitudes),color in zip(arrays,colors) :
+        kept=downsample_indices(latitudes,longitudes,max_points,method)
+        ax.plot(longitudes[kept],latitudes[kept],timestamps[kept]-first_timestamp,'o-',color=color)
     ax.set_xlabel('Longitude')
     ax.set_ylabel('Latitude')
     ax.set_zlabel('Time')
@@ -2,10 +2,10 @@ import time
 from library.model import Event,Trace
 from library.visualization.visualize_trace import plot_trace_2D,plot_trace_3D
 from library.data_management.csv_trace_reader import read_trace_from_CSV
-from library.kdd.preprocessing.cleaning import *
-from library.kdd.preprocessing.compression import *
-from library.kdd.preprocessing.segmentation import *
-from library.kdd.mining.poi_detection import *
+from library.kdd.preprocessing.cleaning import Mean_filter,Median_filter
+from library.kdd.preprocessing.compression import RDP_compression
+from library.kdd.preprocessing.segmentation import Segmentation_by_time
+from library.kdd.mining.poi_detection import Stay_points
 import datetime
 
 def get_synthetic_trace() :
@@ -0,0 +1,27 @@
+import datetime
+import io
+import unittest
+
+from library.model import Stay_point
+from library.data_management.columnar_io import write_columnar,read_columnar
+
+
+class Test_columnar_io(unittest.TestCase) :
+
+    def test_stay_point_labels(self) :
+        # a cached result equals a fresh one : the labels keep their type
+        datetime_=datetime.datetime(2020,1,1,12,30,0,123456)
+        stay_points=[Stay_point(45.75,4.85,datetime_,datetime_,label="stay point 1"),
+                     Stay_point(45.76,4.86,datetime_,datetime_,label=u"caf\xe9"),
+                     Stay_point(45.77,4.87,datetime_,datetime_)]
+        columnar_file=io.BytesIO()
+        write_columnar(columnar_file,stay_points)
+        columnar_file.seek(0)
+        result=read_columnar(columnar_file)
+        self.assertEqual([(type(stay_point.label),stay_point.label) for stay_point in result],
+                         [(type(stay_point.label),stay_point.label) for stay_point in stay_points])
+        self.assertEqual([stay_point.starting_time for stay_point in result],[datetime_]*3)
+
+
+if __name__=="__main__" :
+    unittest.main()
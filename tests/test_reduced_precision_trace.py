@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from library.model import Columnar_trace,Reduced_precision_trace
+
+
+class Test_reduced_precision_trace(unittest.TestCase) :
+
+    def test_coordinate_error_bound(self) :
+        random=np.random.RandomState(0)
+        for dtype in ('int32','float32') :
+            # a street, a city, a region and a continent
+            for extent in (0.01,0.5,10.,100.) :
+                latitudes=random.uniform(-80,80)+random.uniform(-extent/2,extent/2,100000)
+                longitudes=random.uniform(-170,170)+random.uniform(-extent/2,extent/2,100000)
+                trace=Reduced_precision_trace(np.arange(100000.),latitudes,longitudes,dtype=dtype)
+                error=max(np.abs(trace.latitudes-latitudes).max(),np.abs(trace.longitudes-longitudes).max())
+                self.assertLessEqual(error,trace.coordinate_error_bound())
+
+    def test_documented_error(self) :
+        # see the Notes of Reduced_precision_trace
+        latitudes=45.75+np.linspace(-0.5,0.5,1001)
+        longitudes=4.85+np.linspace(-0.5,0.5,1001)
+        trace=Reduced_precision_trace(np.arange(1001.),latitudes,longitudes,dtype='int32')
+        self.assertLess(trace.coordinate_error_bound(),5e-8+1e-12)
+        trace=Reduced_precision_trace(np.arange(1001.),latitudes,longitudes,dtype='float32',origin=(45.75,4.85))
+        self.assertLess(trace.coordinate_error_bound(),3e-8+1e-12)
+
+    def test_int32_out_of_range(self) :
+        self.assertRaises(Exception,Reduced_precision_trace,[0.,1.],[0.,0.],[-179.,179.],dtype='int32')
+
+    def test_distances(self) :
+        random=np.random.RandomState(1)
+        latitudes=45+random.uniform(0,0.1,1000)
+        longitudes=4+random.uniform(0,0.1,1000)
+        first,second=random.randint(0,1000,500),random.randint(0,1000,500)
+        for dtype in ('int32','float32') :
+            trace=Reduced_precision_trace(np.arange(1000.),latitudes,longitudes,dtype=dtype)
+            decoded=Columnar_trace(*trace.to_arrays())
+            bound=2*np.sqrt(2)*trace.coordinate_error_bound()
+            for distance,tolerance in (('euclidean',1e-12),('geodesic',1e-6)) :
+                np.testing.assert_allclose(trace.distances(first,second,distance),decoded.distances(first,second,distance),rtol=0,atol=tolerance)
+            exact=Columnar_trace(np.arange(1000.),latitudes,longitudes).distances(first,second,'euclidean')
+            self.assertLessEqual(np.abs(trace.distances(first,second,'euclidean')-exact).max(),bound)
+
+
+if __name__=="__main__" :
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+import numpy as np
+
+from library.model import Columnar_trace
+from library.kdd.preprocessing.cleaning.speed_filter import _speed_filter_mask
+
+
+def _random_trace(random,events_count) :
+    timestamps=np.cumsum(random.uniform(1,5,events_count))
+    latitudes=45+np.cumsum(random.normal(0,1e-4,events_count))
+    longitudes=4+np.cumsum(random.normal(0,1e-4,events_count))
+    # spikes and bursts of up to 4 events
+    for spike in range(random.randint(0,events_count//5+1)) :
+        start,length=random.randint(0,events_count),random.randint(1,5)
+        latitudes[start:start+length]+=random.normal(0,0.02)
+        longitudes[start:start+length]+=random.normal(0,0.02)
+    return timestamps,latitudes,longitudes
+
+
+class Test_speed_filter(unittest.TestCase) :
+
+    def test_spike_removed(self) :
+        timestamps=np.arange(10.)
+        latitudes=45+np.arange(10.)*1e-5
+        longitudes=np.full(10,4.)
+        latitudes[4]+=0.1
+        keep,iterations=_speed_filter_mask(Columnar_trace(timestamps,latitudes,longitudes),30.)
+        self.assertEqual(list(np.flatnonzero(~keep)),[4])
+
+    def test_second_pass_removes_nothing(self) :
+        random=np.random.RandomState(0)
+        for trial in range(200) :
+            timestamps,latitudes,longitudes=_random_trace(random,random.randint(5,300))
+            maximum_acceleration=None if trial%2 else 5.
+            maximum_burst=1+trial%4
+            keep,iterations=_speed_filter_mask(Columnar_trace(timestamps,latitudes,longitudes),30.,maximum_acceleration,maximum_burst=maximum_burst)
+            second_keep,iterations=_speed_filter_mask(Columnar_trace(timestamps[keep],latitudes[keep],longitudes[keep]),30.,maximum_acceleration,maximum_burst=maximum_burst)
+            self.assertTrue(second_keep.all())
+
+
+if __name__=="__main__" :
+    unittest.main()